@@ -0,0 +1,182 @@
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+# Champs image servis sur le site : variantes générées à l'envoi et par la commande generer_variantes
+CHAMPS = {
+    'shop.Produit': ('image', 'image_2', 'image_3'),
+    'shop.Etablissement': ('logo', 'couverture'),
+    'shop.CategorieProduit': ('couverture',),
+    'shop.CategorieEtablissement': ('couverture',),
+    'website.SiteInfo': (
+        'logo', 'arriere_plan_appreciation', 'arriere_plan_appreciation_2',
+        'image_session_pourquoi_nous_choisir', 'image_page_contact', 'image_pied_de_page',
+        'couverture_page_contact', 'couverture_page_panier', 'couverture_page_paiement',
+        'couverture_page_shop', 'couverture_page_about',
+    ),
+}
+DEFAULT_WIDTHS = (160, 320, 640, 1280)
+# extension, format Pillow, type MIME, options d'encodage
+FORMATS = (
+    ('webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+# Au-delà, l'image est refusée avant décodage (bombe de décompression) ; Pillow avertit dès 89 Mpx
+DEFAULT_MAX_PIXELS = 40 * 1000 * 1000
+CACHE_PREFIX = 'images:v2:'
+# Une image sans variante est revérifiée de temps en temps : la commande tourne dans d'autres processus
+CACHE_TIMEOUT_ABSENT = 300
+
+
+def widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def max_pixels():
+    return getattr(settings, 'IMAGE_MAX_PIXELS', DEFAULT_MAX_PIXELS)
+
+
+def _cache():
+    return caches[getattr(settings, 'IMAGES_CACHE_ALIAS', 'default')]
+
+
+def champs():
+    """``(model, field names)`` for every registered image field."""
+    return [(apps.get_model(label), fields) for label, fields in CHAMPS.items()]
+
+
+def derivative_name(name, width, ext):
+    """``produis/images/b-1.jpg`` -> ``produis/images/b-1.w320.webp``, next to the original."""
+    root, _ = posixpath.splitext(name)
+    return '%s.w%s.%s' % (root, width, ext)
+
+
+def _encode(image, fmt, options):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        # Pas de transparence en JPEG : fond blanc plutôt que noir.
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+    buf = BytesIO()
+    image.save(buf, fmt, **options)
+    return buf.getvalue()
+
+
+def open_image(fp):
+    """``Image.open`` with the size checked before decoding; raises Image.DecompressionBombError.
+
+    Pillow itself only refuses images over twice ``Image.MAX_IMAGE_PIXELS``
+    and merely warns below: an upload cannot make a worker decode more than
+    ``IMAGE_MAX_PIXELS`` pixels.
+    """
+    image = Image.open(fp)
+    if image.width * image.height > max_pixels():
+        raise Image.DecompressionBombError(
+            "Image de %d x %d pixels : au-delà de %d" % (image.width, image.height, max_pixels())
+        )
+    return image
+
+
+def _write(storage, name, content):
+    # Sous le nom calculé, à côté de l'original : un stockage qui renomme (base.storage) l'écrit tel quel
+    save = getattr(storage, 'save_derivative', storage.save)
+    return save(name, content)
+
+
+def _remember(name, found, width=None):
+    _cache().set(CACHE_PREFIX + name, (found, width), None if found else CACHE_TIMEOUT_ABSENT)
+
+
+def generate(name, storage=None, force=False):
+    """Write the WebP/JPEG derivatives of ``name`` narrower than the original; returns their widths.
+
+    Never upscales: an image smaller than every width has no derivative and
+    is served as is. Existing derivatives are kept unless ``force``.
+    Unreadable and oversized images get no derivative.
+    """
+    storage = storage or default_storage
+    try:
+        with storage.open(name, 'rb') as original:
+            image = open_image(original)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, UnidentifiedImageError, ValueError, Image.DecompressionBombError):
+        _remember(name, ())
+        return ()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    done = []
+    for width in widths():
+        if width >= image.width:
+            break
+        resized = None
+        for ext, fmt, _, options in FORMATS:
+            target = derivative_name(name, width, ext)
+            if not force and storage.exists(target):
+                continue
+            if resized is None:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+            if force and storage.exists(target):
+                storage.delete(target)
+            _write(storage, target, ContentFile(_encode(resized, fmt, options)))
+        done.append(width)
+    _remember(name, tuple(done), image.width)
+    return tuple(done)
+
+
+def _width(image):
+    """Displayed width of an opened image: EXIF quarter turns swap its sides."""
+    if image.getexif().get(0x0112) in (5, 6, 7, 8):
+        return image.height
+    return image.width
+
+
+def _lookup(name, storage):
+    """``(derivative widths, original width)`` of ``name``, remembered in the cache."""
+    cache = _cache()
+    found = cache.get(CACHE_PREFIX + name)
+    if found is None:
+        widths_found = tuple(w for w in widths() if storage.exists(derivative_name(name, w, FORMATS[0][0])))
+        width = None
+        if widths_found:
+            try:
+                with storage.open(name, 'rb') as original:
+                    # En-tête seulement : Image.open ne décode pas les pixels
+                    width = _width(Image.open(original))
+            except (OSError, UnidentifiedImageError, ValueError, Image.DecompressionBombError):
+                pass
+        _remember(name, widths_found, width)
+        found = (widths_found, width)
+    return found
+
+
+def available(name, storage=None):
+    """Widths with derivatives for ``name``, remembered in the cache (no storage access on a hit)."""
+    return _lookup(name, storage or default_storage)[0]
+
+
+def srcset(fieldfile, ext='webp'):
+    """``srcset`` value for ``fieldfile`` in the given format, empty when it has no derivative.
+
+    The original closes the list with its own width: derivatives are only
+    narrower, so without it a large or high-density screen would never get
+    more than the widest derivative.
+    """
+    if not fieldfile or not fieldfile.name:
+        return ''
+    storage = fieldfile.storage
+    found, width = _lookup(fieldfile.name, storage)
+    candidates = ['%s %sw' % (storage.url(derivative_name(fieldfile.name, w, ext)), w) for w in found]
+    if candidates and width:
+        candidates.append('%s %sw' % (storage.url(fieldfile.name), width))
+    return ', '.join(candidates)
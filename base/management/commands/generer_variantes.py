@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from base import images
+
+
+def _generer(args):
+    name, force = args
+    return name, images.generate(name, force=force)
+
+
+class Command(BaseCommand):
+    help = "Génère les variantes WebP/JPEG des images existantes (produits, établissements, catégories, site)."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Nombre de processus (1 = dans ce processus)")
+        parser.add_argument('--force', action='store_true', help="Régénère les variantes existantes")
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, fields in images.champs():
+            for row in model.objects.values_list(*fields):
+                names.update(name for name in row if name)
+        # Les noms sont lus : les processus fils ne touchent qu'au stockage, pas à la base.
+        connections.close_all()
+        jobs = [(name, options['force']) for name in sorted(names)]
+
+        generated = 0
+        if options['workers'] > 1:
+            with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                results = pool.map(_generer, jobs, chunksize=8)
+                generated = self._report(results)
+        else:
+            generated = self._report(map(_generer, jobs))
+        self.stdout.write(f"{len(names)} image(s) traitée(s), {generated} avec variantes")
+
+    def _report(self, results):
+        generated = 0
+        for name, widths in results:
+            if widths:
+                generated += 1
+            elif self.verbosity > 1:
+                self.stdout.write(f"{name} : aucune variante (image absente, illisible ou déjà petite)")
+        return generated
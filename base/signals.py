@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save, pre_save
+
+from . import images
+
+
+def reperer_envois(sender, instance, **kwargs):
+    # Avant FileField.pre_save : un fichier pas encore « committed » vient d'être envoyé.
+    instance._images_envoyees = [
+        name for name in images.CHAMPS[sender._meta.label]
+        if getattr(instance, name) and not getattr(instance, name)._committed
+    ]
+
+
+def generer_variantes(sender, instance, **kwargs):
+    for name in getattr(instance, '_images_envoyees', ()):
+        fieldfile = getattr(instance, name)
+        images.generate(fieldfile.name, fieldfile.storage)
+    instance._images_envoyees = []
+
+
+def connect():
+    for model, _ in images.champs():
+        pre_save.connect(reperer_envois, sender=model, dispatch_uid='images-pre-%s' % model._meta.label)
+        post_save.connect(generer_variantes, sender=model, dispatch_uid='images-post-%s' % model._meta.label)
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+CHUNK_SIZE = 64 * 1024
+# Lu une fois au chargement : os.umask() n'est pas sûr entre threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Uploads stored once per content under ``cas/<2 hex>/<sha256><ext>``.
+
+    The digest is computed while the upload is written (or, for an upload
+    already spooled to disk, while it is read before being moved), so the
+    content is never read twice. Saving bytes that are already stored just
+    returns the existing name. Names already in that layout are written as
+    is; files derived from a stored one under a computed name (image
+    variants, whatever the original's name) go through save_derivative().
+
+    Stored files can be shared by several rows: delete() must not be used to
+    "clean up" after a model; the content changes the URL, never the file.
+    """
+
+    prefix = 'cas'
+
+    def is_content_addressed(self, name):
+        return name.replace('\\', '/').startswith(self.prefix + '/')
+
+    def headers(self, name):
+        """Extra response headers for ``name``: content-addressed files never change."""
+        if self.is_content_addressed(name):
+            return {'Cache-Control': IMMUTABLE_CACHE_CONTROL}
+        return {}
+
+    def get_available_name(self, name, max_length=None):
+        if self.is_content_addressed(name):
+            # Nom déterminé par le contenu (ou dérivé de celui-ci) : jamais de suffixe aléatoire.
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _hashed_name(self, digest, name):
+        ext = posixpath.splitext(name)[1].lower()
+        return posixpath.join(self.prefix, digest[:2], digest + ext)
+
+    def save_derivative(self, name, content):
+        """Write ``content`` at exactly ``name``, replacing it: the name is computed by the caller."""
+        if self.exists(name):
+            os.remove(self.path(name))
+        return super()._save(name, content)
+
+    def _save(self, name, content):
+        if self.is_content_addressed(name):
+            return self.save_derivative(name, content)
+
+        digest = hashlib.sha256()
+        tmp_dir = self.path(posixpath.join(self.prefix, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+        if hasattr(content, 'temporary_file_path'):
+            # Déjà sur disque (gros envoi) : lecture pour le hash, puis simple déplacement.
+            with open(content.temporary_file_path(), 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            source = content.temporary_file_path()
+            fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+            os.close(fd)
+            file_move_safe(source, tmp_path, allow_overwrite=True)
+        else:
+            fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+
+        final = self._hashed_name(digest.hexdigest(), name)
+        full_path = self.path(final)
+        if os.path.exists(full_path):
+            os.remove(tmp_path)
+            return final
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(os.path.dirname(full_path), self.directory_permissions_mode)
+        os.replace(tmp_path, full_path)
+        # mkstemp crée en 0600 : mêmes droits qu'un fichier écrit par FileSystemStorage
+        mode = self.file_permissions_mode
+        os.chmod(full_path, mode if mode is not None else 0o666 & ~_UMASK)
+        return final
+
+
+def headers(storage, name):
+    """Extra headers the storage asks for when serving ``name`` (none for other backends)."""
+    return storage.headers(name) if hasattr(storage, 'headers') else {}
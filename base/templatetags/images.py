@@ -0,0 +1,27 @@
+from django import template
+
+from base import images
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(fieldfile, ext='webp'):
+    """``<source srcset="{% srcset produit.image %}">`` : variantes WebP (ou ``'jpg'``) de l'image."""
+    return images.srcset(fieldfile, ext)
+
+
+@register.inclusion_tag('picture.html')
+def picture(fieldfile, sizes='100vw', alt='', css_class='', width=None, style=''):
+    """``<picture>`` WebP + JPEG de repli ; l'original reste la source des navigateurs anciens."""
+    return {
+        'src': fieldfile.url if fieldfile else '',
+        'webp': images.srcset(fieldfile, 'webp'),
+        'jpeg': images.srcset(fieldfile, 'jpg'),
+        'sizes': sizes,
+        'alt': alt,
+        'css_class': css_class,
+        'width': width,
+        'style': style,
+    }
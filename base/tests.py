@@ -1,3 +1,205 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from unittest import mock
+from django.urls import reverse
+
+from PIL import Image
+
+from base import images
+from base.storage import ContentAddressedStorage
+from shop.models import CategorieEtablissement
 
 # Create your tests here.
+
+
+def png(width, height, mode='RGB'):
+    buf = BytesIO()
+    Image.new(mode, (width, height), 'red').save(buf, 'PNG')
+    return ContentFile(buf.getvalue())
+
+
+class ImageDerivativeTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media, IMAGE_DERIVATIVE_WIDTHS=(160, 320, 640))
+        self.override.enable()
+        cache.clear()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def test_generate_skips_widths_wider_than_original(self):
+        name = default_storage.save('produis/images/photo.png', png(500, 250, 'RGBA'))
+        self.assertEqual(images.generate(name), (160, 320))
+        with default_storage.open(images.derivative_name(name, 320, 'webp')) as f:
+            self.assertEqual(Image.open(f).size, (320, 160))
+        with default_storage.open(images.derivative_name(name, 160, 'jpg')) as f:
+            self.assertEqual(Image.open(f).format, 'JPEG')
+        self.assertFalse(default_storage.exists(images.derivative_name(name, 640, 'webp')))
+
+    def test_upload_generates_derivatives_and_tag_emits_srcset(self):
+        categorie = CategorieEtablissement.objects.create(
+            nom="Restaurant", description="Test",
+            couverture=SimpleUploadedFile('cover.png', png(800, 400).read()),
+        )
+        html = Template("{% load images %}{% picture c.couverture sizes='50vw' %}").render(Context({'c': categorie}))
+        root = '/media/' + categorie.couverture.name.rsplit('.', 1)[0]
+        original = f'/media/{categorie.couverture.name}'
+        self.assertIn(
+            f'srcset="{root}.w160.webp 160w, {root}.w320.webp 320w, {root}.w640.webp 640w, {original} 800w"', html
+        )
+        self.assertIn(f'{root}.w640.jpg 640w, {original} 800w', html)
+        self.assertIn(f'src="{original}"', html)
+        # Largeur de l'original relue depuis l'en-tête quand le cache est vide
+        cache.clear()
+        self.assertTrue(images.srcset(categorie.couverture).endswith(f'{original} 800w'))
+
+    def test_legacy_original_outside_cas(self):
+        # Fichier envoyé avant le stockage par contenu : nom choisi à l'envoi, pas de hash
+        name = FileSystemStorage(location=self.media).save('produis/images/old.png', png(500, 250))
+        self.assertEqual(images.generate(name), (160, 320))
+        for width in (160, 320):
+            for ext in ('webp', 'jpg'):
+                self.assertTrue(default_storage.exists(images.derivative_name(name, width, ext)))
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'cas')))
+        images.generate(name, force=True)
+        self.assertEqual(len(os.listdir(os.path.join(self.media, 'produis', 'images'))), 5)
+        fieldfile = CategorieEtablissement(couverture=name).couverture
+        self.assertEqual(images.srcset(fieldfile), (
+            '/media/produis/images/old.w160.webp 160w, /media/produis/images/old.w320.webp 320w, '
+            '/media/produis/images/old.png 500w'
+        ))
+
+    def test_oversized_images_are_not_decoded(self):
+        with override_settings(IMAGE_MAX_PIXELS=100 * 100):
+            name = default_storage.save('produis/images/grande.png', png(400, 300))
+            self.assertEqual(images.generate(name), ())
+        # Au-delà du double de la limite de Pillow : DecompressionBombError dès l'ouverture
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            categorie = CategorieEtablissement.objects.create(
+                nom="Restaurant", description="Test",
+                couverture=SimpleUploadedFile('bombe.png', png(400, 300).read()),
+            )
+        self.assertEqual(images.srcset(categorie.couverture), '')
+
+    def test_missing_file_has_no_srcset(self):
+        self.assertEqual(images.generate('absent.jpg'), ())
+        html = Template("{% load images %}{% srcset name %}").render(Context({'name': None}))
+        self.assertEqual(html, '')
+
+    def test_backfill_command(self):
+        name = default_storage.save('media/categories/etablissements/couvertures/old.png', png(400, 400))
+        CategorieEtablissement.objects.create(nom="Hôtel", description="Test", couverture=name)
+        self.assertFalse(default_storage.exists(images.derivative_name(name, 160, 'webp')))
+        call_command('generer_variantes', workers=2, stdout=StringIO())
+        self.assertTrue(default_storage.exists(images.derivative_name(name, 320, 'jpg')))
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.media, base_url='/media/')
+
+    def tearDown(self):
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.storage.save('produis/images/photo.JPG', ContentFile(b'meme contenu'))
+        second = self.storage.save('media/etablissements/logo/autre.jpg', ContentFile(b'meme contenu'))
+        digest = hashlib.sha256(b'meme contenu').hexdigest()
+        self.assertEqual(first, f'cas/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second, first)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'cas', digest[:2])), [f'{digest}.jpg'])
+        self.assertEqual(os.listdir(os.path.join(self.media, 'cas', 'tmp')), [])
+
+    def test_upload_spooled_to_disk_is_moved(self):
+        upload = TemporaryUploadedFile('gros.png', 'image/png', 5, None)
+        upload.write(b'12345')
+        upload.seek(0)
+        name = self.storage.save('produis/images/gros.png', upload)
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'12345')
+        self.assertTrue(name.endswith(hashlib.sha256(b'12345').hexdigest() + '.png'))
+
+    def test_derived_names_are_kept_and_overwritten(self):
+        name = self.storage.save('photo.png', ContentFile(b'original'))
+        variant = images.derivative_name(name, 320, 'webp')
+        self.assertEqual(self.storage.save(variant, ContentFile(b'v1')), variant)
+        self.assertEqual(self.storage.save(variant, ContentFile(b'v2')), variant)
+        with self.storage.open(variant) as f:
+            self.assertEqual(f.read(), b'v2')
+        self.assertEqual(self.storage.headers(name), {'Cache-Control': 'public, max-age=31536000, immutable'})
+        self.assertEqual(self.storage.headers('b-1.jpg'), {})
+
+
+class MediaViewTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media)
+        self.override.enable()
+        self.name = default_storage.save('produis/images/photo.png', ContentFile(b'0123456789'))
+        self.url = reverse('media', args=[self.name])
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def test_full_file_with_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], '"%s"' % hashlib.sha256(b'0123456789').hexdigest())
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        last_modified = self.client.get(self.url)['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(self.client.get(self.url, HTTP_RANGE='bytes=-3').streaming_content), b'789')
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=20-').status_code, 416)
+        # If-Range périmé : fichier entier
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"autre"').status_code, 200)
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect', MEDIA_SENDFILE_PREFIX='/protected/media/')
+    def test_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/media/' + self.name)
+        self.assertEqual(response.content, b'')
+
+    def test_private_and_missing_files(self):
+        os.makedirs(os.path.join(self.media, 'recus', '1'))
+        with open(os.path.join(self.media, 'recus', '1', 'abc.pdf'), 'wb') as f:
+            f.write(b'pdf')
+        for path in ('recus/1/abc.pdf', './recus/1/abc.pdf', 'cas/../recus/1/abc.pdf', 'produis/../recus//1/abc.pdf'):
+            self.assertEqual(self.client.get('/media/' + path).status_code, 404, path)
+        self.assertEqual(self.client.get('/media/./' + self.name).status_code, 200)
+        self.assertEqual(self.client.get(reverse('media', args=['recus/1/abc.pdf'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=['absent.png'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=['../settings.py'])).status_code, 404)
+
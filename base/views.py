@@ -1,6 +1,138 @@
-from django.shortcuts import render
+import mimetypes
+import os
+import posixpath
+import re
 
-# Create your views here.
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
 
+from . import storage
 
 
+CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _etag(path, stat):
+    name = posixpath.basename(path)
+    root = posixpath.splitext(name)[0]
+    if storage.headers(default_storage, path) and re.fullmatch(r'[0-9a-f]{64}', root):
+        # Fichier adressé par son contenu : le hash est déjà un validateur fort.
+        return '"%s"' % root
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def _byte_range(request, size, etag, last_modified):
+    """``(start, end)`` inclusive for a single satisfiable range, None for the whole file.
+
+    Raises ValueError when the range cannot be satisfied. Multiple ranges are
+    answered with the whole file, which RFC 9110 allows.
+    """
+    header = request.META.get('HTTP_RANGE')
+    if not header:
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # bytes=-500 : les 500 derniers octets
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        if last and int(last) < start:
+            # Plage mal formée : ignorée, le fichier entier est envoyé
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or size == 0:
+        raise ValueError(header)
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def media(request, path):
+    """Serve an uploaded file with validators, byte ranges and optional server offload.
+
+    ``FileResponse`` hands the open file to ``wsgi.file_wrapper`` (sendfile
+    on most servers). With ``MEDIA_SENDFILE_HEADER = 'X-Accel-Redirect'``
+    Django only checks the request and nginx sends the bytes from the
+    internal location ``MEDIA_SENDFILE_PREFIX``.
+    """
+    try:
+        full_path = safe_join(default_storage.location, path)
+    except SuspiciousFileOperation:
+        raise Http404("Fichier introuvable")
+    # Chemin normalisé (./, ../, //) : c'est lui qui est contrôlé puis servi
+    path = os.path.relpath(full_path, default_storage.location).replace(os.sep, '/')
+    if path.split('/', 1)[0] in getattr(settings, 'MEDIA_PRIVATE_DIRS', ('recus',)):
+        # Reçus : servis après contrôle d'accès par client.views, jamais publiquement.
+        raise Http404("Fichier introuvable")
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("Fichier introuvable")
+    if not os.path.isfile(full_path):
+        raise Http404("Fichier introuvable")
+
+    etag = _etag(path, stat)
+    last_modified = int(stat.st_mtime)
+    extra = storage.headers(default_storage, path) or {
+        'Cache-Control': 'public, max-age=%s' % getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600),
+    }
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or 'application/octet-stream'
+        sendfile_header = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+        try:
+            byte_range = None if sendfile_header else _byte_range(request, stat.st_size, etag, last_modified)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%s' % stat.st_size
+            return response
+
+        if sendfile_header:
+            # Le serveur frontal gère lui-même Range et envoie le fichier.
+            response = HttpResponse(content_type=content_type)
+            if sendfile_header == 'X-Accel-Redirect':
+                response[sendfile_header] = getattr(settings, 'MEDIA_SENDFILE_PREFIX', '/protected/media/') + path
+            else:
+                response[sendfile_header] = full_path
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(_read_range(full_path, start, length), status=206,
+                                             content_type=content_type)
+            response['Content-Range'] = 'bytes %s-%s/%s' % (start, end, stat.st_size)
+            response['Content-Length'] = str(length)
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+        response['Last-Modified'] = http_date(last_modified)
+    response['ETag'] = etag
+    for header, value in extra.items():
+        response[header] = value
+    return response
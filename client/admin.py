@@ -1,3 +1,13 @@
 from django.contrib import admin
 
+from .models import GenerationRecu
+
+
 # Register your models here.
+class GenerationRecuAdmin(admin.ModelAdmin):
+    list_display = ('id', 'commande', 'etat', 'tentatives', 'disponible_le', 'date_update')
+    list_filter = ('etat',)
+    raw_id_fields = ('commande',)
+
+
+admin.site.register(GenerationRecu, GenerationRecuAdmin)
@@ -0,0 +1,172 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from playwright.sync_api import sync_playwright
+
+
+PDF_OPTIONS = {
+    'format': "A4",
+    'print_background': True,
+    'margin': {"top": "10mm", "right": "10mm", "bottom": "10mm", "left": "10mm"},
+}
+
+
+class PoolSaturated(Exception):
+    """No browser became available before the timeout."""
+
+
+class ChromiumWorker:
+    """A warm Chromium browser and context, owned by a single pool thread.
+
+    Playwright's sync API is bound to the thread that started it, so each
+    worker is created, used and closed from its own thread.
+    """
+
+    def __init__(self, max_renders):
+        self.max_renders = max_renders
+        self.renders = 0
+        self._playwright = sync_playwright().start()
+        try:
+            self._browser = self._playwright.chromium.launch()
+            self._context = self._browser.new_context()
+        except Exception:
+            # Sans cet arrêt, la boucle asyncio de Playwright reste attachée au thread
+            # et toute nouvelle tentative échoue.
+            self._playwright.stop()
+            raise
+
+    def healthy(self):
+        return self._browser.is_connected()
+
+    def render(self, html):
+        if self.renders >= self.max_renders:
+            # Recycler le contexte limite la mémoire accumulée par Chromium.
+            self._context.close()
+            self._context = self._browser.new_context()
+            self.renders = 0
+        page = self._context.new_page()
+        try:
+            page.set_content(html, wait_until="load")
+            pdf_bytes = page.pdf(**PDF_OPTIONS)
+        finally:
+            page.close()
+        self.renders += 1
+        return pdf_bytes
+
+    def close(self):
+        for close in (self._context.close, self._browser.close, self._playwright.stop):
+            try:
+                close()
+            except Exception:
+                pass
+
+
+class _Job:
+
+    def __init__(self, html):
+        self.html = html
+        self.future = Future()
+
+
+class BrowserPool:
+    """Fixed set of threads, each holding a warm browser, fed from a bounded queue."""
+
+    def __init__(self, size=2, max_renders=100, timeout=30, queue_size=None, worker_factory=ChromiumWorker):
+        self.size = size
+        self.max_renders = max_renders
+        self.timeout = timeout
+        self._worker_factory = worker_factory
+        self._jobs = queue.Queue(maxsize=queue_size or size * 10)
+        self._threads = [
+            threading.Thread(target=self._run, name=f"receipt-browser-{i}", daemon=True)
+            for i in range(size)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def render(self, html, timeout=None):
+        """Render ``html`` to PDF bytes, waiting at most ``timeout`` seconds overall."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        job = _Job(html)
+        try:
+            self._jobs.put(job, timeout=timeout)
+        except queue.Full:
+            raise PoolSaturated("receipt renderer queue is full")
+        try:
+            return job.future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            job.future.cancel()
+            raise PoolSaturated("no browser available within %ss" % timeout)
+
+    def shutdown(self):
+        for _ in self._threads:
+            try:
+                self._jobs.put(None, timeout=1)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _run(self):
+        # Lancement anticipé : le premier reçu ne paie pas le démarrage de Chromium.
+        try:
+            worker = self._worker_factory(self.max_renders)
+        except Exception:
+            worker = None
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                if worker is not None and not worker.healthy():
+                    worker.close()
+                    worker = None
+                if worker is None:
+                    worker = self._worker_factory(self.max_renders)
+                job.future.set_result(worker.render(job.html))
+            except Exception as e:
+                job.future.set_exception(e)
+                # Navigateur dans un état inconnu : on repart d'une instance neuve.
+                if worker is not None:
+                    worker.close()
+                    worker = None
+        if worker is not None:
+            worker.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool(
+                    size=getattr(settings, 'RECEIPT_BROWSER_POOL_SIZE', 2),
+                    max_renders=getattr(settings, 'RECEIPT_BROWSER_MAX_RENDERS', 100),
+                    timeout=getattr(settings, 'RECEIPT_BROWSER_TIMEOUT', 30),
+                    queue_size=getattr(settings, 'RECEIPT_BROWSER_QUEUE_SIZE', None),
+                )
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+def render_pdf(html):
+    return get_pool().render(html)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
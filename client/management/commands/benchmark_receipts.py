@@ -0,0 +1,108 @@
+import json
+from argparse import SUPPRESS
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from client import browser_pool
+from client.renderers import get_renderer
+
+
+RENDERERS = {
+    'chromium': 'client.renderers.ChromiumRenderer',
+    'xhtml2pdf': 'client.renderers.XhtmlRenderer',
+    'reportlab': 'client.renderers.ReportLabRenderer',
+}
+
+
+def fake_receipt(lines):
+    """Reçu synthétique en mémoire : le benchmark ne touche pas à la base."""
+    order = SimpleNamespace(
+        id=1, id_paiment="PAY-000001", transaction_id="TXN-000001",
+        prix_total=1500 * lines, date_add=datetime(2024, 1, 1, 12, 0),
+    )
+    lignes = [
+        SimpleNamespace(id=i, quantite=1, prix_unitaire=1500, montant=1500, produit=SimpleNamespace(nom=f"Produit {i}", prix=1500))
+        for i in range(lines)
+    ]
+    return SimpleNamespace(
+        order=order, lignes=lignes, logo="", logo_path=None,
+        detail_url="https://example.com/client/commande-recu-detail/1",
+    )
+
+
+def peak_rss_kb():
+    # ru_maxrss des enfants = plus gros processus attendu (navigateur compris une fois le pool arrêté).
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children)
+
+
+class Command(BaseCommand):
+    help = "Compare latence, pic de RSS et taille des reçus PDF selon le moteur (Chromium, xhtml2pdf, ReportLab)."
+    # Aucun accès à la base : inutile de bloquer sur les vérifications des modèles.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renderers', nargs='+', default=list(RENDERERS), choices=list(RENDERERS))
+        parser.add_argument('--lines', nargs='+', type=int, default=[1, 10, 100], help="Nombre de lignes par commande.")
+        parser.add_argument('--repeat', type=int, default=10, help="Rendus mesurés après le premier (à froid).")
+        parser.add_argument('--child', nargs=2, metavar=('RENDERER', 'LINES'), help=SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['child']:
+            name, lines = options['child']
+            self.stdout.write(json.dumps(self.measure(name, int(lines), options['repeat'])))
+            return
+
+        self.stdout.write(f"{'moteur':<10} {'lignes':>6} {'1er rendu':>10} {'médiane':>9} {'p95':>9} {'RSS max':>9} {'taille':>9}")
+        for name in options['renderers']:
+            for lines in options['lines']:
+                # Un processus neuf par mesure : le pic de RSS n'est pas pollué par le moteur précédent.
+                proc = subprocess.run(
+                    [sys.executable, sys.argv[0], 'benchmark_receipts',
+                     '--child', name, str(lines), '--repeat', str(options['repeat'])],
+                    capture_output=True, text=True,
+                )
+                if proc.returncode:
+                    errors = [line for line in proc.stderr.splitlines() if 'Error' in line] or ['erreur inconnue']
+                    error = errors[-1].strip()
+                    self.stdout.write(f"{name:<10} {lines:>6} indisponible : {error}")
+                    continue
+                r = json.loads(proc.stdout.strip().splitlines()[-1])
+                self.stdout.write(
+                    f"{name:<10} {lines:>6} {r['first_ms']:>8.1f}ms {r['median_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms "
+                    f"{r['peak_rss_kb'] / 1024:>7.1f}Mo {r['size'] / 1024:>7.1f}Ko"
+                )
+
+    def measure(self, name, lines, repeat):
+        if repeat < 1:
+            raise CommandError("--repeat doit être au moins 1")
+        renderer = get_renderer(RENDERERS[name])
+        receipt = fake_receipt(lines)
+
+        start = time.perf_counter()
+        pdf = renderer.render(receipt)
+        first_ms = (time.perf_counter() - start) * 1000
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            renderer.render(receipt)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+
+        browser_pool.shutdown_pool()
+        return {
+            'first_ms': first_ms,
+            'median_ms': statistics.median(timings),
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            'peak_rss_kb': peak_rss_kb(),
+            'size': len(pdf),
+        }
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from client import receipt_queue
+
+
+class Command(BaseCommand):
+    help = "Pré-génère les reçus PDF des commandes en attente (file GenerationRecu)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Traite les reçus disponibles puis s'arrête.")
+        parser.add_argument('--sleep', type=float, default=2, help="Pause en secondes quand la file est vide.")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = receipt_queue.process_pending()
+            if processed:
+                self.stdout.write(f"{processed} reçu(s) traité(s)")
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0009_create_city_and_ville_field'),
+        ('client', '0002_delete_listesouhait'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationRecu',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base_url', models.CharField(max_length=254)),
+                ('etat', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('done', 'Prêt'), ('failed', 'Échec')], default='pending', max_length=10)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('empreinte', models.CharField(blank=True, max_length=64)),
+                ('erreur', models.TextField(blank=True)),
+                ('disponible_le', models.DateTimeField(default=django.utils.timezone.now)),
+                ('date_add', models.DateTimeField(auto_now_add=True)),
+                ('date_update', models.DateTimeField(auto_now=True)),
+                ('commande', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='generation_recu', to='customer.commande')),
+            ],
+            options={
+                'verbose_name': 'Génération de reçu',
+                'verbose_name_plural': 'Générations de reçus',
+                'indexes': [models.Index(fields=['etat', 'disponible_le'], name='client_gene_etat_664092_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,47 @@
 from django.db import models
+from django.utils import timezone
+
 
 # Create your models here.
+class GenerationRecu(models.Model):
+    """Pré-génération du reçu PDF d'une commande, traitée par `manage.py receipt_worker`."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'En attente'),
+        (RUNNING, 'En cours'),
+        (DONE, 'Prêt'),
+        (FAILED, 'Échec'),
+    ]
+
+    commande = models.OneToOneField('customer.Commande', related_name="generation_recu", on_delete=models.CASCADE)
+    base_url = models.CharField(max_length=254)
+    etat = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    tentatives = models.PositiveIntegerField(default=0)
+    empreinte = models.CharField(max_length=64, blank=True)
+    erreur = models.TextField(blank=True)
+    disponible_le = models.DateTimeField(default=timezone.now)
+
+    date_add = models.DateTimeField(auto_now_add=True)
+    date_update = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Génération de reçu'
+        verbose_name_plural = 'Générations de reçus'
+        indexes = [
+            models.Index(fields=['etat', 'disponible_le']),
+        ]
+
+    def __str__(self):
+        return f"Reçu commande {self.commande_id} ({self.etat})"
+
+    @property
+    def is_ready(self):
+        return self.etat == self.DONE
+
+    @property
+    def is_failed(self):
+        return self.etat == self.FAILED
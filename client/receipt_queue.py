@@ -0,0 +1,92 @@
+import traceback
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import GenerationRecu
+from .receipts import Receipt
+
+
+MAX_TENTATIVES = 5
+# Au-delà, une génération restée « en cours » est considérée comme abandonnée (worker arrêté).
+RUNNING_TIMEOUT = timedelta(minutes=10)
+
+
+def enqueue(commande, base_url):
+    """Schedule the receipt of ``commande`` for pre-generation."""
+    job, _ = GenerationRecu.objects.update_or_create(
+        commande=commande,
+        defaults={
+            'base_url': base_url,
+            'etat': GenerationRecu.PENDING,
+            'tentatives': 0,
+            'erreur': '',
+            'disponible_le': timezone.now(),
+        },
+    )
+    return job
+
+
+def mark_done(commande, digest):
+    """Record a receipt rendered outside the worker (download) so the job stops showing as pending or failed."""
+    return GenerationRecu.objects.filter(commande=commande).exclude(etat=GenerationRecu.DONE).update(
+        etat=GenerationRecu.DONE, empreinte=digest, erreur='', date_update=timezone.now(),
+    )
+
+
+def requeue_stale():
+    return GenerationRecu.objects.filter(
+        etat=GenerationRecu.RUNNING,
+        date_update__lt=timezone.now() - RUNNING_TIMEOUT,
+    ).update(etat=GenerationRecu.PENDING, date_update=timezone.now())
+
+
+def claim_next():
+    """Atomically take the oldest available job, or return None."""
+    candidates = GenerationRecu.objects.filter(
+        etat=GenerationRecu.PENDING,
+        disponible_le__lte=timezone.now(),
+    ).order_by('disponible_le', 'id').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        # L'UPDATE conditionnel garantit qu'un seul worker obtient la génération.
+        claimed = GenerationRecu.objects.filter(id=job_id, etat=GenerationRecu.PENDING).update(
+            etat=GenerationRecu.RUNNING,
+            tentatives=F('tentatives') + 1,
+            date_update=timezone.now(),
+        )
+        if claimed:
+            return GenerationRecu.objects.select_related('commande').get(id=job_id)
+    return None
+
+
+def run(job):
+    try:
+        receipt = Receipt(job.commande, job.base_url)
+        receipt.get_or_create()
+    except Exception:
+        job.erreur = traceback.format_exc()
+        if job.tentatives >= MAX_TENTATIVES:
+            job.etat = GenerationRecu.FAILED
+        else:
+            job.etat = GenerationRecu.PENDING
+            job.disponible_le = timezone.now() + timedelta(seconds=30 * 2 ** job.tentatives)
+    else:
+        job.etat = GenerationRecu.DONE
+        job.empreinte = receipt.digest
+        job.erreur = ''
+    job.save()
+    return job
+
+
+def process_pending(limit=None):
+    """Run available jobs until none is left (or ``limit`` is reached)."""
+    processed = 0
+    requeue_stale()
+    while limit is None or processed < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run(job)
+        processed += 1
+    return processed
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
+from django.utils.http import http_date
+from django.utils.module_loading import import_string
+
+from website import nav_cache
+from .renderers import get_renderer
+
+
+RECEIPTS_DIR = 'recus'
+
+
+def get_storage():
+    """Storage holding generated receipts (RECEIPT_STORAGE, or MEDIA_ROOT/recus)."""
+    storage_path = getattr(settings, 'RECEIPT_STORAGE', None)
+    if storage_path:
+        return import_string(storage_path)()
+    return FileSystemStorage(
+        location=os.path.join(settings.MEDIA_ROOT, RECEIPTS_DIR),
+        base_url=settings.MEDIA_URL + RECEIPTS_DIR + '/',
+    )
+
+
+def fingerprint(order, lignes, logo, detail_url, renderer=''):
+    """Hash of everything printed on the receipt; it changes whenever the PDF would."""
+    payload = {
+        'order': [order.id, order.id_paiment, order.transaction_id, order.prix_total, order.date_add.isoformat()],
+        'lignes': [[ligne.id, ligne.produit.nom, ligne.quantite, ligne.prix_unitaire, ligne.montant] for ligne in lignes],
+        'logo': logo,
+        'detail_url': detail_url,
+        'renderer': renderer,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _local_path(field_file):
+    # Les storages distants n'ont pas de chemin disque : seul le moteur HTML affichera le logo.
+    try:
+        return field_file.path
+    except (NotImplementedError, ValueError):
+        return None
+
+
+class Receipt:
+    """Receipt of one order, resolved without a request so workers can build it too.
+
+    ``base_url`` is the site root (``request.build_absolute_uri('/')``); the
+    QR code and logo URLs, and therefore the digest, are derived from it.
+    """
+
+    def __init__(self, order, base_url):
+        self.order = order
+        self.detail_url = urljoin(base_url, reverse("commande-reçu-detail", args=[order.id]))
+        infos = nav_cache.get('site_infos')
+        self.logo = urljoin(base_url, infos.logo.url) if infos else ""
+        self.logo_path = _local_path(infos.logo) if infos else None
+        self.lignes = list(order.produit_commande.avec_montant().order_by('id'))
+        self.renderer = get_renderer()
+        self.digest = fingerprint(order, self.lignes, self.logo, self.detail_url, self.renderer.name)
+        self.filename = f"Recu_{order.transaction_id}.pdf"
+
+    def render(self):
+        return self.renderer.render(self)
+
+    def get_or_create(self):
+        return get_or_create(self.order.id, self.digest, self.render)
+
+
+def path_for(order_id, digest):
+    return f"{order_id}/{digest}.pdf"
+
+
+def get_or_create(order_id, digest, render):
+    """Return the stored path of the receipt, calling ``render()`` only on a miss."""
+    storage = get_storage()
+    path = path_for(order_id, digest)
+    if not storage.exists(path):
+        path = storage.save(path, ContentFile(render()))
+    return storage, path
+
+
+def file_response(storage, path, digest, filename):
+    """Stream a stored receipt with validators, or delegate it to the web server."""
+    last_modified = http_date(storage.get_modified_time(path).timestamp())
+    sendfile_header = getattr(settings, 'RECEIPT_SENDFILE_HEADER', None)
+    if sendfile_header:
+        # X-Accel-Redirect (nginx) attend une URI interne, X-Sendfile (apache) un chemin disque.
+        if sendfile_header == 'X-Accel-Redirect':
+            target = getattr(settings, 'RECEIPT_SENDFILE_PREFIX', '/protected/recus/') + path
+        else:
+            target = storage.path(path)
+        response = HttpResponse(content_type="application/pdf")
+        response[sendfile_header] = target
+    else:
+        response = FileResponse(storage.open(path, 'rb'), content_type="application/pdf")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["ETag"] = f'"{digest}"'
+    response["Last-Modified"] = last_modified
+    response["Cache-Control"] = "private, max-age=0, must-revalidate"
+    return response
+
+
+def purge(order_id=None):
+    """Delete stored receipts of one order, or of every order."""
+    storage = get_storage()
+    if order_id is not None:
+        dirs = [str(order_id)]
+    else:
+        try:
+            dirs, _ = storage.listdir('')
+        except FileNotFoundError:
+            return
+    for directory in dirs:
+        try:
+            _, files = storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        for name in files:
+            storage.delete(f"{directory}/{name}")
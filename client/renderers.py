@@ -0,0 +1,149 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.template.defaultfilters import date as date_filter, floatformat
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.module_loading import import_string
+
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .browser_pool import render_pdf
+from .utils import html_to_pdf, qrcode_data_uri
+
+
+DEFAULT_RENDERER = 'client.renderers.ChromiumRenderer'
+
+
+class ReceiptRenderer:
+    """Turns a receipt into PDF bytes.
+
+    ``receipt`` exposes ``order``, ``lignes`` (annotated with ``montant``),
+    ``detail_url``, ``logo`` (absolute URL) and ``logo_path`` (local file or
+    None). ``name`` is part of the receipt digest: stored PDFs produced by
+    another backend are not reused.
+    """
+
+    name = None
+
+    def render(self, receipt):
+        raise NotImplementedError
+
+
+class HtmlReceiptRenderer(ReceiptRenderer):
+
+    qr_format = 'png'
+
+    def html(self, receipt):
+        return render_to_string("receipt.html", {
+            "order_id": receipt.order,
+            "produits_commande": receipt.lignes,
+            # URI construite ici, sans donnée utilisateur : l'échappement doublerait la taille du SVG.
+            "qr_code": mark_safe(qrcode_data_uri(receipt.detail_url, self.qr_format)),
+            "logo": receipt.logo,
+        })
+
+
+class ChromiumRenderer(HtmlReceiptRenderer):
+    """receipt.html printed by a warm browser of the pool (fidèle au rendu web)."""
+
+    name = 'chromium'
+    # Chromium affiche le SVG : il est retenu dès qu'il est plus court que le PNG.
+    qr_format = 'auto'
+
+    def render(self, receipt):
+        return render_pdf(self.html(receipt))
+
+
+class XhtmlRenderer(HtmlReceiptRenderer):
+    """receipt.html converted by xhtml2pdf, in process."""
+
+    name = 'xhtml2pdf'
+
+    def render(self, receipt):
+        pdf = html_to_pdf(self.html(receipt))
+        if pdf is None:
+            raise RuntimeError("xhtml2pdf could not render receipt %s" % receipt.order.id)
+        return pdf
+
+
+class ReportLabRenderer(ReceiptRenderer):
+    """Same content as receipt.html drawn directly with ReportLab: no HTML, no browser."""
+
+    name = 'reportlab'
+    header_color = colors.HexColor('#007BFF')
+
+    def render(self, receipt):
+        styles = getSampleStyleSheet()
+        order = receipt.order
+        date_add = timezone.localtime(order.date_add) if timezone.is_aware(order.date_add) else order.date_add
+        story = []
+
+        if receipt.logo_path:
+            try:
+                story.append(Image(receipt.logo_path, width=40 * mm, height=20 * mm, kind='proportional'))
+            except (OSError, IOError):
+                # Logo illisible : le reçu reste valable sans lui.
+                pass
+        story += [
+            Paragraph("Reçu de Commande", styles['Title']),
+            Paragraph(f"<b>ID Opération :</b> {escape(order.id_paiment or '')}", styles['Normal']),
+            Paragraph(f"<b>ID Transaction :</b> {escape(order.transaction_id or '')}", styles['Normal']),
+            Paragraph(f"<b>Date de Paiement :</b> {date_filter(date_add, 'd/m/Y H:i')}", styles['Normal']),
+            Paragraph(f"<b>Total Payé :</b> {floatformat(order.prix_total, 0)} F CFA", styles['Normal']),
+            Spacer(1, 8 * mm),
+            Paragraph("Produits de la commande", styles['Heading4']),
+        ]
+
+        rows = [["Produit", "Quantité", "Prix Unitaire", "Total"]]
+        for ligne in receipt.lignes:
+            rows.append([
+                Paragraph(escape(ligne.produit.nom), styles['Normal']),
+                ligne.quantite,
+                f"{floatformat(ligne.prix_unitaire, 0)} F CFA",
+                f"{floatformat(ligne.montant, 0)} F CFA",
+            ])
+        table = Table(rows, colWidths=['40%', '20%', '20%', '20%'], repeatRows=1)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), self.header_color),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LINEBELOW', (0, 1), (-1, -1), 0.25, colors.lightgrey),
+        ]))
+        story += [table, Spacer(1, 8 * mm), Paragraph("Scannez pour vérifier :", styles['Normal'])]
+
+        # QR code vectoriel dessiné par ReportLab, sans passer par une image PNG.
+        qr = QrCodeWidget(receipt.detail_url)
+        x1, y1, x2, y2 = qr.getBounds()
+        size = 50 * mm
+        drawing = Drawing(size, size, transform=[size / (x2 - x1), 0, 0, size / (y2 - y1), 0, 0])
+        drawing.add(qr)
+        story.append(drawing)
+
+        buf = BytesIO()
+        SimpleDocTemplate(
+            buf, pagesize=A4,
+            leftMargin=10 * mm, rightMargin=10 * mm, topMargin=10 * mm, bottomMargin=10 * mm,
+            title=f"Reçu {order.transaction_id or order.id}",
+        ).build(story)
+        return buf.getvalue()
+
+
+_renderers = {}
+
+
+def get_renderer(path=None):
+    """Renderer selected by RECEIPT_RENDERER (one instance per class path)."""
+    path = path or getattr(settings, 'RECEIPT_RENDERER', DEFAULT_RENDERER)
+    if path not in _renderers:
+        _renderers[path] = import_string(path)()
+    return _renderers[path]
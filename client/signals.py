@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from customer.models import Commande
+from website.models import SiteInfo
+from . import receipts
+
+
+@receiver([post_save, post_delete], sender=Commande)
+def purge_order_receipts(sender, instance, created=False, **kwargs):
+    if not created:
+        receipts.purge(instance.pk)
+
+
+@receiver(pre_save, sender=SiteInfo)
+def purge_receipts_on_logo_change(sender, instance, **kwargs):
+    # Le logo est imprimé sur chaque reçu : un nouveau logo rend tous les PDF obsolètes.
+    if instance.pk is not None:
+        previous = SiteInfo.objects.filter(pk=instance.pk).values_list('logo', flat=True).first()
+        if previous == instance.logo.name:
+            return
+    receipts.purge()
@@ -1,3 +1,273 @@
-from django.test import TestCase
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from customer.models import Commande, Customer, ProduitPanier
+from shop.models import CategorieEtablissement, CategorieProduit, Etablissement, Produit
+from . import receipt_queue, receipts, utils
+from .models import GenerationRecu
+from .browser_pool import BrowserPool, PoolSaturated
+from .renderers import ChromiumRenderer, ReportLabRenderer
+
+
+class FakeWorker:
+    instances = 0
+
+    def __init__(self, max_renders):
+        FakeWorker.instances += 1
+        self.max_renders = max_renders
+        self.alive = True
+        self.release = threading.Event()
+        self.release.set()
+
+    def healthy(self):
+        return self.alive
+
+    def render(self, html):
+        self.release.wait()
+        if html == "crash":
+            raise RuntimeError("browser crashed")
+        return html.encode()
+
+    def close(self):
+        self.alive = False
+
+
+class BrowserPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        FakeWorker.instances = 0
+
+    def test_render_reuses_warm_worker(self):
+        pool = BrowserPool(size=1, timeout=5, worker_factory=FakeWorker)
+        self.assertEqual(pool.render("a"), b"a")
+        self.assertEqual(pool.render("b"), b"b")
+        self.assertEqual(FakeWorker.instances, 1)
+        pool.shutdown()
+
+    def test_worker_replaced_after_failure(self):
+        pool = BrowserPool(size=1, timeout=5, worker_factory=FakeWorker)
+        with self.assertRaises(RuntimeError):
+            pool.render("crash")
+        self.assertEqual(pool.render("ok"), b"ok")
+        self.assertEqual(FakeWorker.instances, 2)
+        pool.shutdown()
+
+    def test_saturated_pool_times_out(self):
+        blocked = threading.Event()
+
+        class SlowWorker(FakeWorker):
+            def __init__(self, max_renders):
+                super().__init__(max_renders)
+                self.release = blocked
+
+        pool = BrowserPool(size=1, timeout=5, queue_size=1, worker_factory=SlowWorker)
+        threading.Thread(target=pool.render, args=("busy",), daemon=True).start()
+        with self.assertRaises(PoolSaturated):
+            pool.render("waiting", timeout=0.2)
+        blocked.set()
+        pool.shutdown()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class InvoicePdfViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="client", password="testpass123")
+        self.customer = Customer.objects.create(user=self.user, adresse="Abidjan", contact_1="0101010101")
+        merchant = User.objects.create_user(username="merchant", password="testpass123")
+        categorie_etab = CategorieEtablissement.objects.create(nom="Restaurant", description="Catégorie test")
+        categorie_produit = CategorieProduit.objects.create(nom="Plat", description="Plat du jour", categorie=categorie_etab)
+        etablissement = Etablissement.objects.create(
+            user=merchant,
+            nom="Chez Test",
+            description="Etablissement de test",
+            logo="logo.png",
+            couverture="cover.png",
+            categorie=categorie_etab,
+            nom_du_responsable="Doe",
+            prenoms_duresponsable="John",
+            adresse="Abidjan",
+            pays="CI",
+            contact_1="0101010101",
+            email="test@example.com",
+        )
+        produit = Produit.objects.create(
+            nom="Burger",
+            description="Burger test",
+            description_deal="Deal",
+            prix=1000,
+            categorie=categorie_produit,
+            etablissement=etablissement,
+        )
+        self.commande = Commande.objects.create(customer=self.customer, prix_total=2000, transaction_id="TXN1")
+        ProduitPanier.objects.create(produit=produit, commande=self.commande, quantite=2)
+        self.url = reverse('invoice_pdf', args=[self.commande.id])
+        self.client.login(username="client", password="testpass123")
+
+    @patch('client.renderers.render_pdf', return_value=b"%PDF-test")
+    def test_receipt_rendered_once_then_served_from_storage(self, render_pdf):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(b"".join(second.streaming_content), b"%PDF-test")
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(render_pdf.call_count, 1)
+
+    @patch('client.renderers.render_pdf', return_value=b"%PDF-test")
+    def test_matching_etag_returns_not_modified(self, render_pdf):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    @patch('client.renderers.render_pdf', return_value=b"%PDF-test")
+    def test_order_change_invalidates_receipt(self, render_pdf):
+        self.client.get(self.url)
+        self.commande.prix_total = 1500
+        self.commande.save()
+        self.assertEqual(receipts.get_storage().listdir(str(self.commande.id))[1], [])
+        self.client.get(self.url)
+        self.assertEqual(render_pdf.call_count, 2)
+
+    @patch('client.renderers.render_pdf', return_value=b"%PDF-test")
+    def test_failed_pregeneration_is_reported_then_rendered_on_download(self, render_pdf):
+        job = receipt_queue.enqueue(self.commande, "http://testserver/")
+        job.etat = GenerationRecu.FAILED
+        job.save()
+        # Photo affichée par l'en-tête du compte
+        self.customer.photo = "photo.png"
+        self.customer.save()
+        detail = reverse('commande-detail', args=[self.commande.id])
+        response = self.client.get(detail)
+        self.assertEqual(response.context['recu_etat'], 'echec')
+        self.assertNotContains(response, "en cours de préparation")
+
+        self.assertEqual(b"".join(self.client.get(self.url).streaming_content), b"%PDF-test")
+        self.assertTrue(GenerationRecu.objects.get(id=job.id).is_ready)
+        self.assertEqual(self.client.get(detail).context['recu_etat'], 'pret')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReceiptQueueTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="client", password="testpass123")
+        customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="0101010101")
+        self.commande = Commande.objects.create(customer=customer, prix_total=2000, transaction_id="TXN1")
+
+    @patch('client.renderers.render_pdf', return_value=b"%PDF-test")
+    def test_pending_job_is_rendered_and_marked_done(self, render_pdf):
+        receipt_queue.enqueue(self.commande, "http://testserver/")
+        self.assertEqual(receipt_queue.process_pending(), 1)
+        job = GenerationRecu.objects.get(commande=self.commande)
+        self.assertTrue(job.is_ready)
+        path = receipts.path_for(self.commande.id, job.empreinte)
+        self.assertTrue(receipts.get_storage().exists(path))
+
+    @patch('client.renderers.render_pdf', side_effect=RuntimeError("chromium"))
+    def test_failed_job_is_retried_later(self, render_pdf):
+        receipt_queue.enqueue(self.commande, "http://testserver/")
+        receipt_queue.process_pending()
+        job = GenerationRecu.objects.get(commande=self.commande)
+        self.assertEqual(job.etat, GenerationRecu.PENDING)
+        self.assertEqual(job.tentatives, 1)
+        self.assertGreater(job.disponible_le, timezone.now())
+        self.assertEqual(receipt_queue.process_pending(), 0)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReceiptRendererTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="client", password="testpass123")
+        customer = Customer.objects.create(user=user, adresse="Abidjan", contact_1="0101010101")
+        self.commande = Commande.objects.create(customer=customer, prix_total=2000, transaction_id="TXN<1>&")
+
+    @override_settings(RECEIPT_RENDERER='client.renderers.ReportLabRenderer')
+    def test_reportlab_renders_pdf_without_browser(self):
+        with patch('client.renderers.render_pdf') as render_pdf:
+            pdf = receipts.Receipt(self.commande, "http://testserver/").render()
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        render_pdf.assert_not_called()
+
+    def test_renderer_is_part_of_digest(self):
+        chromium = receipts.Receipt(self.commande, "http://testserver/")
+        with self.settings(RECEIPT_RENDERER='client.renderers.ReportLabRenderer'):
+            reportlab = receipts.Receipt(self.commande, "http://testserver/")
+        self.assertIsInstance(reportlab.renderer, ReportLabRenderer)
+        self.assertNotEqual(chromium.digest, reportlab.digest)
+
+
+@override_settings(QR_CODE_CACHE_BYTES=256 * 1024)
+class QrCodeTests(SimpleTestCase):
+
+    def setUp(self):
+        utils._qr_cache = None
+        self.urls = [f"https://cooldeal.ci/client/commande-re%C3%A7u-detail/{i}" for i in range(50)]
+
+    def test_svg_is_built_without_pil_image(self):
+        with patch('client.utils.qrcode.make', side_effect=AssertionError("PIL")):
+            svg = utils.qrcode_svg(self.urls[0])
+        root = ElementTree.fromstring(svg)
+        self.assertTrue(root.tag.endswith('svg'))
+        self.assertEqual(len(root), 1)
+        self.assertLess(len(utils.qrcode_data_uri(self.urls[0], "svg")), 1600)
+
+    def test_svg_dashes_reproduce_the_matrix(self):
+        qr = utils.qrcode.QRCode(border=0)
+        qr.add_data(self.urls[0])
+        qr.make(fit=True)
+        matrix = qr.get_matrix()
+        path = ElementTree.fromstring(utils.qrcode_svg(self.urls[0]))[0]
+        modules = []
+        for i, run in enumerate(map(int, path.get('stroke-dasharray').split())):
+            modules.extend([i % 2 == 0] * run)
+        # Une unité de descente (blanche) entre deux rangées parcourues en serpentin
+        rows = [modules[y * (len(matrix) + 1):][:len(matrix)] for y in range(len(matrix))]
+        rows = [row if y % 2 == 0 else row[::-1] for y, row in enumerate(rows)]
+        self.assertEqual(rows, [[bool(m) for m in row] for row in matrix])
+
+    def test_cache_is_bounded_by_bytes(self):
+        cache = utils.BytesLRU(max_bytes=10)
+        cache.set('a', b"12345")
+        cache.set('b', b"12345")
+        cache.get('a')
+        cache.set('c', b"123")
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b"12345")
+        self.assertLessEqual(cache.size, 10)
+
+    def test_each_code_is_built_once(self):
+        with patch('client.utils._build_svg', wraps=utils._build_svg) as build:
+            for _ in range(3):
+                for url in self.urls:
+                    utils.qrcode_svg(url)
+        self.assertEqual(build.call_count, len(self.urls))
+        self.assertEqual(len(utils.qr_cache()), len(self.urls))
+
+    def test_generation_throughput(self):
+        started = time.perf_counter()
+        for url in self.urls:
+            utils.qrcode_data_uri(url, "auto")
+        cold = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(20):
+            for url in self.urls:
+                utils.qrcode_data_uri(url, "auto")
+        warm = time.perf_counter() - started
+        # Bornes larges : une régression (PIL pour le SVG, cache ignoré) les dépasse d'un ordre de grandeur.
+        self.assertLess(cold, len(self.urls) * 0.1)
+        self.assertLess(warm, len(self.urls) * 20 * 0.001)
+
+    def test_receipt_uses_the_smaller_format(self):
+        short, long_url = "https://cooldeal.ci/c/1", self.urls[0] + "?" + "x" * 200
+        for url in (short, long_url):
+            uri = utils.qrcode_data_uri(url, "auto")
+            self.assertEqual(len(uri), min(len(utils.qrcode_data_uri(url, "svg")), len(utils.qrcode_data_uri(url))))
+        self.assertEqual(ChromiumRenderer.qr_format, 'auto')
@@ -1,4 +1,10 @@
 from io import BytesIO
+from collections import OrderedDict
+from urllib.parse import quote
+import os
+import threading
+from django.conf import settings
+from django.contrib.staticfiles import finders
 from django.http import HttpResponse
 from django.template.loader import get_template
 
@@ -7,18 +13,141 @@ import qrcode, base64
 from io import BytesIO
 
 
+def link_callback(uri, rel):
+    """Résout les URLs /static/ et /media/ du gabarit en chemins disque pour xhtml2pdf."""
+    if uri.startswith(settings.MEDIA_URL):
+        return os.path.join(settings.MEDIA_ROOT, uri[len(settings.MEDIA_URL):])
+    if uri.startswith(settings.STATIC_URL):
+        path = finders.find(uri[len(settings.STATIC_URL):])
+        if path:
+            return path
+    return uri
+
+
+def html_to_pdf(html):
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html.encode("utf-8")), result, link_callback=link_callback)
+    if pdf.err:
+        return None
+    return result.getvalue()
+
+
 def render_to_pdf(template_src, context_dict={}):
     template = get_template(template_src)
     html = template.render(context_dict)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("utf-8")), result)
-    if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
+    pdf = html_to_pdf(html)
+    if pdf is not None:
+        return HttpResponse(pdf, content_type='application/pdf')
     return None
 
 
-def qrcode_base64(data: str) -> str:
+class BytesLRU:
+    """LRU cache bounded by the total size of its values (str or bytes)."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._data[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+_qr_cache = None
+
+
+def qr_cache():
+    global _qr_cache
+    if _qr_cache is None:
+        _qr_cache = BytesLRU(getattr(settings, 'QR_CODE_CACHE_BYTES', 1024 * 1024))
+    return _qr_cache
+
+
+def _cached_qr(fmt, data, build):
+    cache = qr_cache()
+    value = cache.get((fmt, data))
+    if value is None:
+        value = build(data)
+        cache.set((fmt, data), value)
+    return value
+
+
+def _build_png(data):
     img = qrcode.make(data)
     buf = BytesIO()
     img.save(buf, format="PNG")
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
\ No newline at end of file
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
+
+
+def _build_svg(data):
+    qr = qrcode.QRCode(border=0)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    size = len(matrix)
+    # Un seul trait qui parcourt le symbole en serpentin (aller, descente d'un module, retour) ;
+    # stroke-dasharray alterne les longueurs noires et blanches le long du trait, la descente
+    # comptant comme du blanc. Le coin haut-gauche (motif de repérage) est toujours noir.
+    modules = []
+    for y, row in enumerate(matrix):
+        modules.extend(row if y % 2 == 0 else reversed(row))
+        modules.append(False)
+    runs, current, length = [], True, 0
+    for dark in modules[:-1]:
+        if dark != current:
+            runs.append(length)
+            current, length = dark, 0
+        length += 1
+    runs.append(length)
+    path = "M0 .5" + "v1".join(f"h{size}" if y % 2 == 0 else f"h-{size}" for y in range(size))
+    return (
+        f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='-4 -4 {size + 8} {size + 8}'>"
+        f"<path fill='none' stroke='#000' stroke-dasharray='{' '.join(map(str, runs))}' d='{path}'/></svg>"
+    )
+
+
+def qrcode_base64(data: str) -> str:
+    return _cached_qr('png', data, _build_png)
+
+
+def qrcode_svg(data: str) -> str:
+    return _cached_qr('svg', data, _build_svg)
+
+
+def qrcode_data_uri(data: str, fmt: str = "png") -> str:
+    """QR code ready for an ``<img src>``: base64 PNG, or SVG percent-encoded (no base64 overhead).
+
+    ``"auto"`` returns whichever of the two is shorter for this payload: the
+    SVG grows with the number of runs of modules, the deflated PNG much less.
+    """
+    if fmt == "auto":
+        return min(qrcode_data_uri(data, "svg"), qrcode_data_uri(data, "png"), key=len)
+    if fmt == "svg":
+        return "data:image/svg+xml," + quote(qrcode_svg(data), safe=" /:=.,'-")
+    return "data:image/png;base64," + qrcode_base64(data)
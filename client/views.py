@@ -9,21 +9,17 @@ from django.db.models import Q
 try:
     from cities_light.models import City
 except (ImportError, RuntimeError):
-    from django.db import models as django_models
-    class City(django_models.Model):
-        """Fallback City model used only when django-cities-light is unavailable."""
-        name = django_models.CharField(max_length=100)
-        class Meta:
-            managed = False
+    from customer.models import City
 from django.template.loader import render_to_string
 from django.http import HttpResponse
 from .utils import render_to_pdf
 from .utils import qrcode_base64
-from website.models import SiteInfo
+from django.utils.cache import get_conditional_response
 import qrcode
-from playwright.sync_api import sync_playwright
 import base64
 from io import BytesIO
+from .browser_pool import PoolSaturated
+from . import receipt_queue, receipts
 
 
 # Create your views here.
@@ -106,16 +102,26 @@ def commande_detail(request, commande_id):
         return redirect('index')
 
     # Récupération de la commande sélectionnée
-    commande = get_object_or_404(Commande, id=commande_id, customer=customer)
+    commande = get_object_or_404(Commande.objects.select_related('generation_recu'), id=commande_id, customer=customer)
 
     # Récupération des produits associés à cette commande
     produits_commande = ProduitPanier.objects.filter(commande=commande).select_related('produit')
 
+    # Reçu pré-généré après le paiement : tant qu'il n'est pas prêt, le téléchargement le génère à la demande
+    generation_recu = getattr(commande, 'generation_recu', None)
+    if generation_recu is None or generation_recu.is_ready:
+        recu_etat = 'pret'
+    elif generation_recu.is_failed:
+        recu_etat = 'echec'
+    else:
+        recu_etat = 'preparation'
+
     datas = {
         'user': user,
         'customer': customer,
         'commande': commande,
-        'produits_commande': produits_commande
+        'produits_commande': produits_commande,
+        'recu_etat': recu_etat,
     }
 
     return render(request, 'commande-detail.html', datas)
@@ -224,38 +230,23 @@ def invoice_pdf(request, order_id):
     if not hasattr(request.user, "customer") or order.customer_id != request.user.customer.id:
         return redirect("commande")
 
-    # 1. Générer le QR code en base64
-
-    detail_url = request.build_absolute_uri(
-        reverse("commande-reçu-detail", args=[order.id])  # ou une URL publique de vérif
-    )
-    qr_b64 = qrcode_base64(detail_url)
-
-    # 2. Construire le HTML à partir du template
-    html = render_to_string("receipt.html", {
-        "order_id": order,
-        "produits_commande": order.produit_commande.all(),
-        "qr_code": qr_b64,
-        "logo": request.build_absolute_uri(SiteInfo.objects.latest('date_add').logo.url)
-    }, request=request)
-
-    # 3. Lancer Playwright et générer le PDF
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        page.set_content(html, wait_until="load")  # on imprime directement le HTML rendu
-        pdf_bytes = page.pdf(
-            format="A4",
-            print_background=True,
-            margin={"top": "10mm", "right": "10mm", "bottom": "10mm", "left": "10mm"}
-        )
-        browser.close()
-
-    # 4. Forcer le téléchargement du PDF
-    filename = f"Recu_{order.transaction_id}.pdf"
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
+    # 1. Empreinte du contenu : le reçu déjà généré (ou pré-généré après paiement) sert tant que rien n'a changé
+    receipt = receipts.Receipt(order, request.build_absolute_uri('/'))
+    not_modified = get_conditional_response(request, etag=f'"{receipt.digest}"')
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        storage, path = receipt.get_or_create()
+    except PoolSaturated:
+        response = HttpResponse("Service de reçus momentanément saturé, merci de réessayer.", status=503)
+        response["Retry-After"] = "10"
+        return response
+    # Généré ici (pré-génération en attente ou en échec) : la page de la commande n'annonce plus d'attente
+    receipt_queue.mark_done(order, receipt.digest)
+
+    # 2. Forcer le téléchargement du PDF
+    return receipts.file_response(storage, path, receipt.digest, receipt.filename)
 
 #
 # @login_required
@@ -93,10 +93,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
-
 CRON_CLASSES = [
     "customer.cron.CleanExpiredTokensCronJob",
+    "shop.cron.MaterialiserPrixCronJob",
 ]
 
 
@@ -127,7 +126,6 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'website.context_processors.categories',
                 'website.context_processors.site_infos',
-                'website.context_processors.cities',
                 'website.context_processors.cart',
                 'website.context_processors.galeries',
                 'website.context_processors.horaires',
@@ -148,6 +146,69 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# locmem est propre à chaque worker : pointer NAVIGATION_CACHE_ALIAS vers un cache
+# partagé (Redis, Memcached) pour que l'invalidation par signal soit immédiate partout.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cooldeal',
+    }
+}
+
+NAVIGATION_CACHE_ALIAS = 'default'
+NAVIGATION_CACHE_TIMEOUT = 300
+
+# Nombre de produits par page (pagination par curseur de shop et des catégories)
+SHOP_PAGE_SIZE = 12
+# Durée (s) du total mis en cache de la boîte de réception marchand avec filtre client/produit/statut
+INBOX_COUNT_TIMEOUT = 60
+# Lignes lues par aller-retour (curseur serveur sur PostgreSQL) pendant l'export CSV/XLSX des commandes
+EXPORT_CHUNK_SIZE = 2000
+# Import en masse des produits (CSV + ZIP) : lignes par INSERT, threads pour les images, taille max d'une image
+IMPORT_BATCH_SIZE = 500
+IMPORT_IMAGE_WORKERS = 4
+IMPORT_MAX_IMAGE_SIZE = 10 * 1024 * 1024
+
+# Moteur PDF des reçus : ChromiumRenderer (pool de navigateurs), XhtmlRenderer ou ReportLabRenderer
+RECEIPT_RENDERER = 'client.renderers.ChromiumRenderer'
+
+# Reçus PDF : navigateurs Chromium gardés chauds par worker (voir client/browser_pool.py)
+RECEIPT_BROWSER_POOL_SIZE = 2
+RECEIPT_BROWSER_MAX_RENDERS = 100
+RECEIPT_BROWSER_TIMEOUT = 30
+RECEIPT_BROWSER_QUEUE_SIZE = 20
+
+# Taille maximale (octets) du cache mémoire des QR codes des reçus, par processus
+QR_CODE_CACHE_BYTES = 1024 * 1024
+
+# Reçus générés conservés sous MEDIA_ROOT/recus (ou la classe de storage indiquée ici)
+RECEIPT_STORAGE = None
+# 'X-Accel-Redirect' (nginx, avec RECEIPT_SENDFILE_PREFIX) ou 'X-Sendfile' (apache) ; None = servi par Django
+RECEIPT_SENDFILE_HEADER = None
+RECEIPT_SENDFILE_PREFIX = '/protected/recus/'
+
+STORAGES = {
+    # Envois stockés par contenu (cas/<hash>) : doublons écrits une seule fois, URL immuable
+    'default': {'BACKEND': 'base.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage'},
+}
+# Fichiers envoyés servis par base.views.media ; 'X-Accel-Redirect' délègue l'envoi à nginx
+# (location interne MEDIA_SENDFILE_PREFIX pointant sur MEDIA_ROOT), 'X-Sendfile' à apache
+MEDIA_SENDFILE_HEADER = None
+MEDIA_SENDFILE_PREFIX = '/protected/media/'
+# Cache-Control des fichiers hors cas/ (les fichiers cas/ sont immuables)
+MEDIA_CACHE_MAX_AGE = 3600
+# Sous-dossiers de MEDIA_ROOT jamais servis publiquement (reçus PDF, servis par client.views)
+MEDIA_PRIVATE_DIRS = ('recus',)
+
+# Largeurs (px) des variantes WebP/JPEG des images envoyées (base/images.py, commande generer_variantes)
+IMAGE_DERIVATIVE_WIDTHS = (160, 320, 640, 1280)
+# Images plus grandes (pixels) refusées avant décodage : ni variante ni import
+IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.mysql',
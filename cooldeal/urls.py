@@ -14,10 +14,12 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from base import views as base_views
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,5 +29,6 @@ urlpatterns = [
     path('deals/', include('shop.urls')),
     path('contact/', include('contact.urls')),
     path('client/', include('client.urls')),
-] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) \
- + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Fichiers envoyés : validateurs, Range et X-Accel-Redirect optionnel (base/views.py)
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), base_views.media, name='media'),
+] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
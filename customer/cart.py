@@ -0,0 +1,134 @@
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from shop import sous_commandes, statistiques
+from shop.models import Produit, prix_effectif
+from . import models
+
+
+class CartSummary:
+    """Totaux d'un panier calculés à partir de lignes annotées par ``avec_montant``."""
+
+    def __init__(self, lignes, reduction=0):
+        self.lignes = lignes
+        self.count = len(lignes)
+        self.total = int(sum(ligne.montant for ligne in lignes))
+        self.remise = reduction * self.total
+        self.total_with_coupon = int(self.total - self.remise)
+
+
+class EmptyCart:
+    """Placeholder used in templates while the visitor has no Panier yet.
+
+    It exposes the same attributes the templates read on a real Panier, so
+    rendering a page never needs to create one.
+    """
+
+    id = ''
+    coupon = None
+    total = 0
+    total_with_coupon = 0
+    check_empty = False
+
+    @property
+    def produit_panier(self):
+        return models.ProduitPanier.objects.none()
+
+    @property
+    def summary(self):
+        return CartSummary([])
+
+    def __bool__(self):
+        return False
+
+    def __str__(self):
+        return ""
+
+
+def _lookup_cart(request):
+    session_key = request.session.session_key
+    if not session_key:
+        return None
+    # Le panier référence la session par sa clé : inutile de charger la ligne Session.
+    paniers = models.Panier.objects.filter(session_id_id=session_key)
+    if request.user.is_authenticated:
+        paniers = paniers.filter(customer__user=request.user)
+    return paniers.first()
+
+
+def _create_cart(request):
+    customer = None
+    if request.user.is_authenticated:
+        try:
+            customer = request.user.customer
+        except models.Customer.DoesNotExist:
+            return None
+
+    session = request.session
+    if not session.session_key or not session.exists(session.session_key):
+        session.create()
+
+    panier = models.Panier()
+    panier.session_id_id = session.session_key
+    panier.customer = customer
+    panier.save()
+    return panier
+
+
+def get_cart(request, create=False):
+    """Return the Panier of the current visitor, memoized on the request.
+
+    Nothing is written while ``create`` is False: visitors who only browse
+    get ``None``. Views that modify the cart pass ``create=True`` so the
+    session and the Panier are created on the first write.
+    """
+    if not hasattr(request, '_cached_cart'):
+        request._cached_cart = _lookup_cart(request)
+    if request._cached_cart is None and create:
+        request._cached_cart = _create_cart(request)
+    return request._cached_cart
+
+
+def checkout(customer, panier_id, transaction_id, **paiement):
+    """Turn the Panier ``panier_id`` into a Commande, atomically.
+
+    Returns ``(commande, created)``. A transaction already recorded is a
+    no-op returning the existing Commande, so replayed payment callbacks
+    are harmless; ``(None, False)`` means the Panier does not exist (or the
+    transaction belongs to another customer).
+    """
+    with transaction.atomic():
+        existing = models.Commande.objects.filter(transaction_id=transaction_id).first()
+        if existing is not None:
+            return (existing, False) if existing.customer_id == customer.id else (None, False)
+
+        panier = models.Panier.objects.select_for_update().filter(id=panier_id, customer=customer).first()
+        if panier is None:
+            return None, False
+
+        try:
+            # Savepoint : un callback concurrent a pu insérer la même transaction entre-temps.
+            with transaction.atomic():
+                commande = models.Commande.objects.create(
+                    customer=customer,
+                    transaction_id=transaction_id,
+                    prix_total=panier.total_with_coupon,
+                    **paiement
+                )
+        except IntegrityError:
+            return models.Commande.objects.filter(transaction_id=transaction_id, customer=customer).first(), False
+
+        # Un seul UPDATE : les lignes passent du panier à la commande avec leur prix figé.
+        # Prix calculé à l'instant, comme le total du panier (pas les colonnes matérialisées).
+        prix = Produit.objects.filter(pk=OuterRef('produit_id')).annotate(prix_courant=prix_effectif()).values('prix_courant')[:1]
+        models.ProduitPanier.objects.filter(panier=panier).update(
+            panier=None,
+            commande=commande,
+            prix_paye=Subquery(prix),
+            date_update=timezone.now(),
+        )
+        panier.delete()
+        sous_commandes.ecrire(commande)
+        statistiques.commande_finalisee(commande)
+    return commande, True
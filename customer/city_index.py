@@ -0,0 +1,62 @@
+import bisect
+import threading
+import time
+import unicodedata
+
+from .models import City
+
+
+# Au-delà, l'index est reconstruit même sans signal (modifications faites par un autre worker).
+MAX_AGE = 3600
+
+_lock = threading.Lock()
+_index = ([], [])
+_built_at = None
+
+
+def normalize(value):
+    """Lowercase and strip accents so that 'yamoussoukro' matches 'Yamoussoukro'."""
+    value = unicodedata.normalize('NFKD', value)
+    return ''.join(c for c in value if not unicodedata.combining(c)).casefold().strip()
+
+
+def _build():
+    global _index, _built_at
+    rows = sorted(
+        (normalize(name), pk, name)
+        for pk, name in City.objects.values_list('id', 'name').iterator()
+    )
+    keys = [row[0] for row in rows]
+    entries = [{'id': pk, 'name': name} for _, pk, name in rows]
+    # Remplacement en une affectation : les lecteurs en cours gardent l'ancienne version.
+    _index = (keys, entries)
+    _built_at = time.monotonic()
+
+
+def _ensure_built():
+    if _built_at is not None and time.monotonic() - _built_at < MAX_AGE:
+        return
+    with _lock:
+        if _built_at is None or time.monotonic() - _built_at >= MAX_AGE:
+            _build()
+
+
+def invalidate():
+    global _built_at
+    _built_at = None
+
+
+def search(prefix, limit=20):
+    """Return up to ``limit`` cities whose name starts with ``prefix``."""
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+    _ensure_built()
+    keys, entries = _index
+    start = bisect.bisect_left(keys, prefix)
+    results = []
+    for i in range(start, min(start + limit, len(keys))):
+        if not keys[i].startswith(prefix):
+            break
+        results.append(entries[i])
+    return results
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:29
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+TRANSACTION_ID_MAX_LENGTH = 255
+
+
+def dedoublonner_transactions(apps, schema_editor):
+    # Les callbacks de paiement rejoués ont pu créer plusieurs commandes par transaction :
+    # la plus ancienne garde l'identifiant, les suivantes sont renommées pour passer la contrainte.
+    Commande = apps.get_model('customer', 'Commande')
+    vus = set()
+    trop_longs = []
+    for commande in Commande.objects.exclude(transaction_id=None).order_by('id').only('id', 'transaction_id'):
+        if len(commande.transaction_id) > TRANSACTION_ID_MAX_LENGTH:
+            trop_longs.append(commande.id)
+        elif commande.transaction_id in vus:
+            Commande.objects.filter(id=commande.id).update(
+                transaction_id=f"{commande.transaction_id[:80]}-doublon-{commande.id}"
+            )
+        else:
+            vus.add(commande.transaction_id)
+    if trop_longs:
+        # Arrêt avant l'AlterField : PostgreSQL et MySQL refuseraient de tronquer ces valeurs.
+        raise RuntimeError(
+            "transaction_id de plus de %d caractères (commandes %s) : à corriger avant la migration"
+            % (TRANSACTION_ID_MAX_LENGTH, ', '.join(map(str, trop_longs)))
+        )
+
+
+def figer_prix_commandes(apps, schema_editor):
+    # Les lignes déjà commandées gardent le prix qu'elles affichaient au moment de la migration.
+    ProduitPanier = apps.get_model('customer', 'ProduitPanier')
+    today = date.today()
+    lignes = ProduitPanier.objects.filter(commande__isnull=False, prix_paye=None).select_related('produit')
+    for ligne in lignes.iterator():
+        produit = ligne.produit
+        promo = (
+            produit.date_debut_promo and produit.date_fin_promo
+            and produit.date_debut_promo <= today <= produit.date_fin_promo
+        )
+        ligne.prix_paye = produit.prix_promotionnel if promo else produit.prix
+        ligne.save(update_fields=['prix_paye'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0009_create_city_and_ville_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produitpanier',
+            name='prix_paye',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(dedoublonner_transactions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='commande',
+            name='transaction_id',
+            field=models.CharField(max_length=TRANSACTION_ID_MAX_LENGTH, null=True, unique=True),
+        ),
+        migrations.RunPython(figer_prix_commandes, migrations.RunPython.noop),
+    ]
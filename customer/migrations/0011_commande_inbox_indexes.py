@@ -0,0 +1,25 @@
+# Generated by Django 4.2.9 on 2026-10-17 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0010_commande_transaction_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['date_add', 'id'], name='commande_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produitpanier',
+            index=models.Index(fields=['commande', 'produit'], name='ligne_commande_produit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produitpanier',
+            index=models.Index(fields=['produit', 'commande'], name='ligne_produit_commande_idx'),
+        ),
+    ]
@@ -1,9 +1,13 @@
 from django.db import models
+from django.db.models import ExpressionWrapper, F
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.contrib.sessions.models import Session
 
 from shop import models as Produit
+from shop.models import prix_effectif, promo_active
 from django.utils.timezone import now
+from django.utils.functional import cached_property
 from datetime import timedelta
 
 try:
@@ -100,28 +104,41 @@ class Panier(models.Model):
         """Unicode representation of Panier."""
         return "panier"
 
+    @cached_property
+    def summary(self):
+        """Lignes, sous-total et total après coupon, calculés en une seule requête."""
+        from .cart import CartSummary
+
+        lignes = list(
+            self.produit_panier.avec_montant()
+            .annotate(reduction_coupon=F('panier__coupon__reduction'))
+            .order_by('id')
+        )
+        reduction = (lignes[0].reduction_coupon or 0) if lignes else 0
+        return CartSummary(lignes, reduction)
+
+    def invalidate_summary(self):
+        self.__dict__.pop('summary', None)
+
+    def save(self, *args, **kwargs):
+        self.invalidate_summary()
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.invalidate_summary()
+        super().refresh_from_db(*args, **kwargs)
+
     @property
     def total(self):
-        panier = Panier.objects.get(id=self.id)
-        sum = 0
-        for i in panier.produit_panier.all():
-            sum = sum + i.total
-        return int(sum)
+        return self.summary.total
 
     @property
     def total_with_coupon(self):
-        reduction = 0
-        if self.coupon:
-            reduction = self.coupon.reduction * self.total
-        return int(self.total - reduction)
+        return self.summary.total_with_coupon
 
     @property
     def check_empty(self):
-        panier = Panier.objects.get(id=self.id)
-        if panier.produit_panier.count() > 0:
-            return True
-        else:
-            return False
+        return self.summary.count > 0
 
 
 class Commande(models.Model):
@@ -132,7 +149,8 @@ class Commande(models.Model):
     id_paiment = models.CharField( max_length=50, null=True)
     payment_token = models.CharField(max_length=250, null=True)
     payment_url = models.TextField(null=True)
-    transaction_id = models.TextField(null=True)
+    # Unique : un second callback de paiement pour la même transaction ne crée pas de doublon.
+    transaction_id = models.CharField(max_length=255, null=True, unique=True)
     api_response_id = models.CharField(max_length=50, null=True)
     crypto = models.CharField(max_length=50, null=True)
     prix_total = models.FloatField()
@@ -146,6 +164,11 @@ class Commande(models.Model):
 
         verbose_name = 'Commande'
         verbose_name_plural = 'Commandes'
+        # Parcours par date (tri par curseur sur date_add, id) ; les vues marchand lisent
+        # shop.SousCommande et ses propres index
+        indexes = [
+            models.Index(fields=['date_add', 'id'], name='commande_date_id_idx'),
+        ]
 
     def __str__(self):
         """Unicode representation of UserRessource."""
@@ -160,23 +183,64 @@ class Commande(models.Model):
             return False
 
 
+class ProduitPanierQuerySet(models.QuerySet):
+
+    def avec_montant(self):
+        """Annotate promo_active, prix_unitaire and montant (line total) in SQL.
+
+        Lines of a validated order use the price paid (``prix_paye``).
+        """
+        return self.select_related('produit').annotate(
+            promo_active=promo_active('produit__'),
+            prix_unitaire=Coalesce(F('prix_paye'), prix_effectif('produit__'), output_field=models.FloatField()),
+        ).annotate(
+            montant=ExpressionWrapper(F('prix_unitaire') * F('quantite'), output_field=models.FloatField()),
+        )
+
+
 class ProduitPanier(models.Model):
     produit = models.ForeignKey('shop.Produit', related_name="commande", on_delete=models.CASCADE)
     panier = models.ForeignKey(Panier, related_name="produit_panier", on_delete=models.CASCADE, null=True)
     commande = models.ForeignKey(Commande, related_name="produit_commande", on_delete=models.CASCADE, null=True)
     quantite = models.IntegerField(default=1)
+    # Prix unitaire figé à la validation de la commande ; vide tant que la ligne est dans un panier.
+    prix_paye = models.FloatField(null=True, blank=True)
     date_add = models.DateTimeField(auto_now_add=True)
     date_update = models.DateTimeField(auto_now=True)
     status = models.BooleanField(default=True)
 
+    objects = ProduitPanierQuerySet.as_manager()
+
     class Meta:
         """Meta definition for UserRessource."""
 
         verbose_name = 'Produit Panier/Commande'
         verbose_name_plural = 'Produits Panier/Commande'
+        # Lignes d'une commande par établissement (sous-commandes), commandes d'un produit
+        # (filtre produit de la boîte de réception), sans relire la table
+        indexes = [
+            models.Index(fields=['commande', 'produit'], name='ligne_commande_produit_idx'),
+            models.Index(fields=['produit', 'commande'], name='ligne_produit_commande_idx'),
+        ]
+
+    def _invalidate_panier_summary(self):
+        # Seul le panier déjà chargé sur cette ligne est concerné ; pas de requête supplémentaire.
+        panier = self._state.fields_cache.get('panier')
+        if panier is not None:
+            panier.invalidate_summary()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._invalidate_panier_summary()
+
+    def delete(self, *args, **kwargs):
+        self._invalidate_panier_summary()
+        return super().delete(*args, **kwargs)
 
     @property
     def total(self):
+        if self.prix_paye is not None:
+            return self.prix_paye * self.quantite
         if self.produit.check_promotion:
             return self.produit.prix_promotionnel * self.quantite
         else:
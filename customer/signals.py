@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import city_index
+from .models import City
+
+
+@receiver([post_save, post_delete], sender=City)
+def invalidate_city_index(sender, **kwargs):
+    city_index.invalidate()
@@ -332,6 +332,27 @@ class PanierModelTests(TestCase):
         )
         self.assertTrue(panier.check_empty)
 
+    def test_panier_summary_single_query(self):
+        """Test que les totaux sont calculés en une requête puis mémorisés"""
+        panier = Panier.objects.create(
+            customer=self.customer,
+            session_id=self.session
+        )
+        self.produit.prix_promotionnel = 800
+        self.produit.date_debut_promo = datetime.date.today() - timedelta(days=1)
+        self.produit.date_fin_promo = datetime.date.today() + timedelta(days=1)
+        self.produit.save()
+        ProduitPanier.objects.create(produit=self.produit, panier=panier, quantite=2)
+        ProduitPanier.objects.create(produit=self.produit2, panier=panier, quantite=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(panier.total, 3600)
+            self.assertEqual(panier.total_with_coupon, 3600)
+            self.assertTrue(panier.check_empty)
+            lignes = panier.summary.lignes
+            self.assertEqual([ligne.montant for ligne in lignes], [1600, 2000])
+            self.assertEqual([ligne.promo_active for ligne in lignes], [True, False])
+            self.assertEqual(lignes[0].produit.nom, "Burger")
+
     def test_panier_str(self):
         """Test la représentation string du panier"""
         panier = Panier.objects.create(
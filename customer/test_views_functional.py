@@ -7,10 +7,11 @@ from django.contrib.auth.models import User
 from django.contrib.sessions.models import Session
 from django.urls import reverse
 from django.core import mail
+from django.template.loader import render_to_string
 from django.utils import timezone
 from datetime import timedelta
 
-from customer.models import Customer, Panier, ProduitPanier, CodePromotionnel, PasswordResetToken
+from customer.models import City, Customer, Panier, ProduitPanier, CodePromotionnel, PasswordResetToken
 from shop.models import Produit, CategorieProduit, CategorieEtablissement, Etablissement
 
 
@@ -421,6 +422,116 @@ class CartViewTests(TestCase):
         self.assertFalse(response_data['success'])
 
 
+class LazyCartTests(TestCase):
+    """Tests du panier paresseux fourni par le context processor"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user_merchant = User.objects.create_user(
+            username="merchant",
+            email="merchant@example.com",
+            password="testpass123"
+        )
+        self.categorie_etab = CategorieEtablissement.objects.create(
+            nom="Restaurant",
+            description="Catégorie test"
+        )
+        self.categorie_produit = CategorieProduit.objects.create(
+            nom="Plat",
+            description="Plat du jour",
+            categorie=self.categorie_etab
+        )
+        self.etablissement = Etablissement.objects.create(
+            user=self.user_merchant,
+            nom="Chez Test",
+            description="Etablissement de test",
+            logo="logo.png",
+            couverture="cover.png",
+            categorie=self.categorie_etab,
+            nom_du_responsable="Doe",
+            prenoms_duresponsable="John",
+            adresse="Abidjan",
+            pays="CI",
+            contact_1="0101010101",
+            email="test@example.com",
+        )
+        self.produit = Produit.objects.create(
+            nom="Burger",
+            description="Burger test",
+            description_deal="Super deal",
+            prix=1000,
+            categorie=self.categorie_produit,
+            etablissement=self.etablissement,
+        )
+
+    def test_anonymous_page_view_creates_no_cart(self):
+        """Test qu'une simple visite ne crée ni session ni panier"""
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Panier.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+    def test_add_to_cart_without_panier_creates_cart(self):
+        """Test que le premier ajout crée le panier de la session"""
+        data = {
+            'panier': '',
+            'produit': self.produit.id,
+            'quantite': 2
+        }
+        response = self.client.post(
+            reverse('add_to_cart'),
+            data=json.dumps(data),
+            content_type='application/json'
+        )
+        self.assertTrue(json.loads(response.content)['success'])
+        panier = Panier.objects.get()
+        self.assertEqual(panier.session_id_id, self.client.session.session_key)
+        self.assertEqual(panier.produit_panier.get().quantite, 2)
+
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['cart'].id, panier.id)
+        self.assertEqual(Panier.objects.count(), 1)
+
+
+class CitySearchViewTests(TestCase):
+    """Tests fonctionnels pour la recherche de villes"""
+
+    def setUp(self):
+        self.client = Client()
+        self.abidjan = City.objects.create(name="Abidjan")
+        self.abengourou = City.objects.create(name="Abengourou")
+        City.objects.create(name="Bouaké")
+
+    def test_city_search_by_prefix(self):
+        """Test que seules les villes commençant par le préfixe sont renvoyées"""
+        response = self.client.get(reverse('city_search'), {'q': 'ab'})
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)['results']
+        self.assertEqual([c['name'] for c in results], ["Abengourou", "Abidjan"])
+
+    def test_city_search_ignores_accents(self):
+        """Test que la recherche ignore les accents et la casse"""
+        response = self.client.get(reverse('city_search'), {'q': 'BOUAKE'})
+        results = json.loads(response.content)['results']
+        self.assertEqual([c['name'] for c in results], ["Bouaké"])
+
+    def test_city_search_sees_new_city(self):
+        """Test que l'index est rafraîchi après l'ajout d'une ville"""
+        self.client.get(reverse('city_search'), {'q': 'ab'})
+        City.objects.create(name="Aboisso")
+        response = self.client.get(reverse('city_search'), {'q': 'abo'})
+        results = json.loads(response.content)['results']
+        self.assertEqual([c['name'] for c in results], ["Aboisso"])
+
+    def test_city_search_script(self):
+        """Test que le script partagé cible les champs passés à l'include"""
+        html = render_to_string('recherche-ville.html', {'champ': 'ville_nom', 'cible': 'ville'})
+        self.assertIn("getElementById('ville_nom')", html)
+        self.assertIn("getElementById('ville')", html)
+        self.assertIn(reverse('city_search') + "?q=", html)
+        self.assertIn("setCustomValidity", html)
+
+
 class PasswordResetViewTests(TestCase):
     """Tests fonctionnels pour les vues de réinitialisation de mot de passe"""
 
@@ -13,6 +13,7 @@ urlpatterns = [
     path('cart/add/coupon', views.add_coupon, name="add_coupon"),
     path('cart/delete/product', views.delete_from_cart, name="delete_from_cart"),
     path('cart/udpate/product', views.update_cart, name="update_cart"),
+    path('villes', views.city_search, name="city_search"),
     path('reset-password/', views.request_reset_password, name='request_reset_password'),
     path('reset-password/<str:token>/', views.reset_password, name='reset_password'),
 ]
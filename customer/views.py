@@ -8,11 +8,6 @@ import json
 from django.http import JsonResponse
 from django.contrib.auth.models import User
 
-try:
-    from cities_light.models import City
-except (ImportError, RuntimeError):
-    City = None
-
 from django.core.mail import send_mail
 from django.utils.crypto import get_random_string
 from django.contrib import messages
@@ -20,7 +15,9 @@ from django.urls import reverse
 
 
 from django.contrib.auth.hashers import make_password
-from .models import PasswordResetToken
+from .models import City, PasswordResetToken
+from .cart import get_cart
+from . import city_index
 from django.core.exceptions import ValidationError
 from django.utils.timezone import now
 
@@ -115,7 +112,7 @@ def inscription(request):
     password = request.POST.get('password')
     passwordconf = request.POST.get('passwordconf')
 
-    if City is not None and ville:
+    if ville:
         ville = City.objects.get(id=int(ville))
     else:
         ville = None
@@ -190,8 +187,11 @@ def add_to_cart(request):
     produit = postdata['produit']
     quantite = postdata['quantite']
     isSuccess = False
-    if panier is not None and produit is not None and quantite is not None:
+    if panier:
         panier = models.Panier.objects.get(id=panier)
+    else:
+        panier = get_cart(request, create=True)
+    if panier is not None and produit is not None and quantite is not None:
         produit = shop_models.Produit.objects.get(id=produit)
         try:
             produit_panier = models.ProduitPanier.objects.get(produit=produit, panier=panier)
@@ -251,7 +251,10 @@ def add_coupon(request):
     if panier is not None and coupon is not None :
         try:
             coupon = models.CodePromotionnel.objects.get(code_promo=coupon)
-            panier = models.Panier.objects.get(id=panier)
+            if panier:
+                panier = models.Panier.objects.get(id=panier)
+            else:
+                panier = get_cart(request, create=True)
             panier.coupon = coupon
             panier.save()
             isSuccess = True
@@ -297,6 +300,14 @@ def update_cart(request):
     return JsonResponse(data, safe=False)
 
 
+def city_search(request):
+    query = request.GET.get('q', '')
+    datas = {
+        'results': city_index.search(query),
+    }
+    return JsonResponse(datas, safe=False)
+
+
 # Étape 1 : Vue pour demander l'e-mail
 def request_reset_password(request):
     if request.method == 'POST':
@@ -0,0 +1,26 @@
+from django.db.models import Count, Q
+
+from . import models
+
+
+def arbre():
+    """Active establishment categories, each with ``sous_categories`` and product counts.
+
+    Two queries whatever the size of the catalogue: one for the establishment
+    categories, one for every product category. ``nb_produits`` counts the
+    active products of each node.
+    """
+    racines = list(
+        models.CategorieEtablissement.objects.filter(status=True)
+        .annotate(nb_produits=Count('produit_etab', filter=Q(produit_etab__status=True)))
+    )
+    enfants = {}
+    for categorie in (
+        models.CategorieProduit.objects.filter(categorie__in=[racine.id for racine in racines])
+        .annotate(nb_produits=Count('produit', filter=Q(produit__status=True)))
+        .order_by('id')
+    ):
+        enfants.setdefault(categorie.categorie_id, []).append(categorie)
+    for racine in racines:
+        racine.sous_categories = enfants.get(racine.id, [])
+    return racines
@@ -0,0 +1,103 @@
+import hashlib
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from customer.models import ProduitPanier
+from . import models
+from .statistiques import _bornes
+
+
+ORDERING = ('-date_add', '-id')
+STATUTS = {'payée': True, 'attente': False}
+
+
+def _cache():
+    return caches[getattr(settings, 'INBOX_CACHE_ALIAS', 'default')]
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def filtres(params):
+    """Valid filters of the inbox from the query string; unknown or malformed values are dropped."""
+    cleaned = {
+        'client': (params.get('client') or '').strip(),
+        'produit': (params.get('produit') or '').strip(),
+        'status': params.get('status') if params.get('status') in STATUTS else '',
+        'date_min': _date(params.get('date_min')),
+        'date_max': _date(params.get('date_max')),
+    }
+    return {key: value for key, value in cleaned.items() if value}
+
+
+def commandes(etablissement, selection):
+    """Sub-orders of ``etablissement`` matching ``selection``, one row per order.
+
+    Status and dates are columns of SousCommande, served by its
+    ``(etablissement, [status,] date_add, id)`` indexes in keyset order.
+    The product filter cannot use an index (icontains): the merchant's
+    matching lines are selected once through an uncorrelated ``IN``.
+    """
+    queryset = models.SousCommande.objects.filter(etablissement=etablissement)
+    if 'produit' in selection:
+        lignes = ProduitPanier.objects.filter(
+            produit__etablissement_id=etablissement.id, produit__nom__icontains=selection['produit'],
+        )
+        queryset = queryset.filter(commande_id__in=lignes.values('commande_id'))
+    if 'client' in selection:
+        queryset = queryset.filter(customer__user__first_name__icontains=selection['client'])
+    if 'status' in selection:
+        queryset = queryset.filter(status=STATUTS[selection['status']])
+    if 'date_min' in selection:
+        queryset = queryset.filter(date_add__gte=_bornes(selection['date_min'])[0])
+    if 'date_max' in selection:
+        # Journée de date_max incluse (l'ancien filtre s'arrêtait à minuit)
+        queryset = queryset.filter(date_add__lt=_bornes(selection['date_max'])[1])
+    return queryset.select_related('customer__user')
+
+
+def premiers_produits(etablissement, sous_commandes):
+    """Set ``premier_produit`` (name of the merchant's first line) on a page of sub-orders, in one query."""
+    noms = {}
+    lignes = ProduitPanier.objects.filter(
+        commande_id__in=[sous_commande.commande_id for sous_commande in sous_commandes],
+        produit__etablissement_id=etablissement.id,
+    ).order_by('-id').values_list('commande_id', 'produit__nom')
+    for commande_id, nom in lignes:
+        noms[commande_id] = nom
+    for sous_commande in sous_commandes:
+        sous_commande.premier_produit = noms.get(sous_commande.commande_id)
+
+
+def total(etablissement, selection, queryset):
+    """``(count, approximate)`` for the inbox header.
+
+    Unfiltered or filtered by date only, the count is the sum of the
+    establishment's StatistiqueJour rows (one per day), exact. Any other
+    filter is counted on SousCommande and cached for ``INBOX_COUNT_TIMEOUT``
+    seconds, so it may lag behind new orders.
+    """
+    if not selection.keys() - {'date_min', 'date_max'}:
+        stats = models.StatistiqueJour.objects.filter(etablissement=etablissement)
+        if 'date_min' in selection:
+            stats = stats.filter(jour__gte=selection['date_min'])
+        if 'date_max' in selection:
+            stats = stats.filter(jour__lte=selection['date_max'])
+        return stats.aggregate(total=Coalesce(Sum('nb_commandes'), 0))['total'], False
+
+    signature = repr(sorted((key, str(value)) for key, value in selection.items()))
+    key = 'shop:inbox:%s:%s' % (etablissement.id, hashlib.md5(signature.encode()).hexdigest())
+    cache = _cache()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.order_by().count()
+        cache.set(key, count, getattr(settings, 'INBOX_COUNT_TIMEOUT', 60))
+    return count, True
@@ -0,0 +1,12 @@
+from django_cron import CronJobBase, Schedule
+from shop.models import Produit
+
+class MaterialiserPrixCronJob(CronJobBase):
+    RUN_AT_TIMES = ['00:01']  # Juste après le changement de jour : débuts et fins de promotion
+
+    schedule = Schedule(run_at_times=RUN_AT_TIMES)
+    code = 'shop.materialiser_prix'
+
+    def do(self):
+        count = Produit.objects.materialiser()
+        print(f"{count} produits mis à jour (promotion / prix du jour).")
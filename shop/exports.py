@@ -0,0 +1,194 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import commandes_recues
+
+
+COLONNES = ("Commande", "Date", "Client", "Email", "Statut", "Articles", "Montant")
+CHAMPS = (
+    'commande_id', 'date_add', 'customer__user__first_name', 'customer__user__last_name',
+    'customer__user__email', 'status', 'nb_articles', 'sous_total',
+)
+_EPOQUE_EXCEL = datetime(1899, 12, 30)
+# Caractères de contrôle interdits en XML 1.0
+_XML_INTERDITS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Début de cellule lu comme une formule par les tableurs (nom ou email saisi par le client)
+_FORMULE = ('=', '+', '-', '@', '\t', '\r')
+
+
+def lignes(etablissement, selection):
+    """Rows of the export, newest first: the inbox query read through a server-side cursor.
+
+    ``values_list`` avoids building a model per row; ``iterator`` fetches
+    ``EXPORT_CHUNK_SIZE`` rows at a time (a named cursor on PostgreSQL),
+    so memory does not grow with the number of orders.
+    """
+    queryset = commandes_recues.commandes(etablissement, selection).order_by(*commandes_recues.ORDERING)
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    for commande_id, date_add, prenom, nom, email, status, articles, montant in (
+        queryset.values_list(*CHAMPS).iterator(chunk_size=chunk_size)
+    ):
+        yield (
+            commande_id,
+            timezone.localtime(date_add).replace(tzinfo=None),
+            ' '.join(part for part in (prenom, nom) if part),
+            email or '',
+            "Payée" if status else "En attente",
+            articles,
+            montant,
+        )
+
+
+class _Tampon(io.RawIOBase):
+    """Write-only buffer emptied by the generator after each row; not seekable, so zipfile streams."""
+
+    def __init__(self):
+        self.morceaux = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.morceaux.append(bytes(data))
+        return len(data)
+
+    def vider(self):
+        data = b''.join(self.morceaux)
+        self.morceaux = []
+        return data
+
+
+def _avec_entete(rows):
+    yield COLONNES
+    yield from rows
+
+
+def _valeur_csv(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, str) and value.startswith(_FORMULE):
+        # Apostrophe : le tableur affiche le texte au lieu d'évaluer une formule
+        return "'" + value
+    return value
+
+
+def csv_stream(rows):
+    """CSV bytes of ``rows`` (with header), one chunk per row; BOM so Excel reads UTF-8.
+
+    Text cells that a spreadsheet would evaluate as a formula are prefixed
+    with an apostrophe. The XLSX export writes inline strings, never formulas.
+    """
+    tampon = io.StringIO()
+    writer = csv.writer(tampon)
+    yield '\ufeff'.encode()
+    for row in _avec_entete(rows):
+        writer.writerow([_valeur_csv(value) for value in row])
+        yield tampon.getvalue().encode()
+        tampon.seek(0)
+        tampon.truncate()
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Commandes" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Style 1 : date et heure (format intégré 22)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '</styleSheet>'
+)
+
+
+def _cellule(value):
+    if isinstance(value, bool) or value is None:
+        value = '' if value is None else str(value)
+    if isinstance(value, datetime):
+        return '<c s="1"><v>%r</v></c>' % ((value - _EPOQUE_EXCEL).total_seconds() / 86400)
+    if isinstance(value, (int, float)):
+        return '<c><v>%r</v></c>' % value
+    return '<c t="inlineStr"><is><t xml:space="preserve">%s</t></is></c>' % escape(_XML_INTERDITS.sub('', value))
+
+
+def xlsx_stream(rows):
+    """XLSX bytes of ``rows`` (with header), produced while the rows are read.
+
+    The workbook is written straight into a non-seekable zip stream (sizes
+    go in data descriptors) and each row is sent as soon as it is
+    compressed: nothing is kept in memory or in a temporary file, unlike
+    the "constant memory" modes of the XLSX libraries which still build
+    the archive on disk before it can be sent.
+    """
+    tampon = _Tampon()
+    with zipfile.ZipFile(tampon, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in (
+            ('[Content_Types].xml', _CONTENT_TYPES),
+            ('_rels/.rels', _RELS),
+            ('xl/workbook.xml', _WORKBOOK),
+            ('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS),
+            ('xl/styles.xml', _STYLES),
+        ):
+            archive.writestr(name, content)
+        yield tampon.vider()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for row in _avec_entete(rows):
+                sheet.write(('<row>%s</row>' % ''.join(_cellule(value) for value in row)).encode())
+                # Le compresseur garde quelques Ko avant d'écrire : rien à envoyer pour certaines lignes
+                data = tampon.vider()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield tampon.vider()
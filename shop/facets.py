@@ -0,0 +1,234 @@
+import hashlib
+import threading
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+
+from . import models
+
+
+FACETS = (
+    ('categorie', "Catégories"),
+    ('etablissement', "Établissements"),
+    ('ville', "Villes"),
+    ('prix', "Prix"),
+    ('promo', "Promotions"),
+)
+PRICE_BANDS = (
+    ('0-2000', 0, 2000, "Moins de 2 000 F CFA"),
+    ('2000-5000', 2000, 5000, "2 000 à 5 000 F CFA"),
+    ('5000-10000', 5000, 10000, "5 000 à 10 000 F CFA"),
+    ('10000-25000', 10000, 25000, "10 000 à 25 000 F CFA"),
+    ('25000-', 25000, None, "25 000 F CFA et plus"),
+)
+PROMO = 'oui'
+
+GENERATION_KEY = 'shop:facets:generation'
+# Filet de sécurité si un signal est manqué (écriture en masse, autre base)
+MAX_AGE = 600
+
+
+def _cache():
+    return caches[getattr(settings, 'FACETS_CACHE_ALIAS', 'default')]
+
+
+def generation():
+    return _cache().get(GENERATION_KEY, 0)
+
+
+def invalidate():
+    """Bump the shared generation: every process rebuilds its index, cached counts are ignored."""
+    cache = _cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def _price_band(prix):
+    for value, low, high, _ in PRICE_BANDS:
+        if prix >= low and (high is None or prix < high):
+            return value
+    return None
+
+
+class FacetIndex:
+    """One bitmap (a Python int, bit n = n-th active product) per facet value.
+
+    Built from a single query; counting a combination of filters is then a
+    handful of AND/OR and ``int.bit_count()`` calls, with no SQL.
+    """
+
+    def __init__(self, rows, today):
+        self.today = today
+        self.bitmaps = {name: {} for name, _ in FACETS}
+        self.labels = {name: {} for name, _ in FACETS}
+        self.labels['prix'] = {value: label for value, _, _, label in PRICE_BANDS}
+        self.labels['promo'] = {PROMO: "Promotion en cours"}
+        self.all = 0
+        for position, row in enumerate(rows):
+            (_, categorie_id, categorie, etablissement_id, etablissement, ville_id, ville,
+             prix, promo) = row
+            bit = 1 << position
+            self.all |= bit
+            values = {
+                'categorie': categorie_id,
+                'etablissement': etablissement_id,
+                'ville': ville_id,
+                'prix': _price_band(prix),
+                'promo': PROMO if promo else None,
+            }
+            for name, value in values.items():
+                if value is None:
+                    continue
+                value = str(value)
+                self.bitmaps[name][value] = self.bitmaps[name].get(value, 0) | bit
+            self.labels['categorie'][str(categorie_id)] = categorie
+            self.labels['etablissement'][str(etablissement_id)] = etablissement
+            if ville_id is not None:
+                self.labels['ville'][str(ville_id)] = ville
+
+    @classmethod
+    def build(cls):
+        rows = models.Produit.objects.filter(status=True).avec_prix().order_by('id').values_list(
+            'id', 'categorie_id', 'categorie__nom', 'etablissement_id', 'etablissement__nom',
+            'etablissement__ville_id', 'etablissement__ville__name',
+            'effective_price', 'promo_active',
+        )
+        return cls(rows.iterator(), date.today())
+
+    def _mask(self, name, values):
+        if not values:
+            return self.all
+        mask = 0
+        for value in values:
+            mask |= self.bitmaps[name].get(value, 0)
+        return mask
+
+    def counts(self, selection):
+        """Result count and, per facet, the count of each value given the *other* facets' filters."""
+        masks = {name: self._mask(name, selection.get(name)) for name, _ in FACETS}
+        total = self.all
+        for mask in masks.values():
+            total &= mask
+        counts = {}
+        for name, _ in FACETS:
+            base = self.all
+            for other, mask in masks.items():
+                if other != name:
+                    base &= mask
+            counts[name] = {value: (base & bitmap).bit_count() for value, bitmap in self.bitmaps[name].items()}
+        return total.bit_count(), counts
+
+
+_lock = threading.Lock()
+_index = None
+_index_key = None
+_built_at = None
+
+
+def get_index():
+    global _index, _index_key, _built_at
+    key = (generation(), date.today())
+    if _index is not None and _index_key == key and time.monotonic() - _built_at < MAX_AGE:
+        return _index
+    with _lock:
+        if _index is None or _index_key != key or time.monotonic() - _built_at >= MAX_AGE:
+            _index = FacetIndex.build()
+            _index_key = key
+            _built_at = time.monotonic()
+    return _index
+
+
+def _valid(name, value):
+    if name == 'prix':
+        return value in {band[0] for band in PRICE_BANDS}
+    if name == 'promo':
+        return value == PROMO
+    return value.isdigit()
+
+
+def parse(params):
+    """Selected values per facet from a QueryDict (``?categorie=3&categorie=5&promo=oui``)."""
+    selection = {}
+    for name, _ in FACETS:
+        values = sorted({value for value in params.getlist(name) if _valid(name, value)})
+        if values:
+            selection[name] = values
+    return selection
+
+
+def counts(selection):
+    """Facet counts for ``selection``, cached per filter combination."""
+    cache = _cache()
+    signature = repr(sorted(selection.items()))
+    key = 'shop:facets:%s:%s:%s' % (
+        generation(), date.today().isoformat(), hashlib.md5(signature.encode()).hexdigest(),
+    )
+    result = cache.get(key)
+    if result is None:
+        result = get_index().counts(selection)
+        cache.set(key, result, MAX_AGE)
+    return result
+
+
+def filter_queryset(produits, selection):
+    """Apply ``selection`` in SQL, so pagination keeps using the (date_add, id) indexes."""
+    if 'effective_price' not in produits.query.annotations:
+        produits = produits.avec_prix()
+    if selection.get('categorie'):
+        produits = produits.filter(categorie_id__in=selection['categorie'])
+    if selection.get('etablissement'):
+        produits = produits.filter(etablissement_id__in=selection['etablissement'])
+    if selection.get('ville'):
+        produits = produits.filter(etablissement__ville_id__in=selection['ville'])
+    if selection.get('prix'):
+        bands = Q()
+        for value, low, high, _ in PRICE_BANDS:
+            if value in selection['prix']:
+                band = Q(effective_price__gte=low)
+                if high is not None:
+                    band &= Q(effective_price__lt=high)
+                bands |= band
+        produits = produits.filter(bands)
+    if PROMO in selection.get('promo', ()):
+        produits = produits.filter(promo_active=True)
+    return produits
+
+
+def facettes(selection, params):
+    """Facet blocks for the template: values with their count and a link toggling them."""
+    total, all_counts = counts(selection)
+    index = get_index()
+    blocks = []
+    for name, titre in FACETS:
+        selected = selection.get(name, [])
+        valeurs = []
+        for value, count in all_counts[name].items():
+            if not count and value not in selected:
+                continue
+            query = params.copy()
+            for key in ('apres', 'fragment'):
+                query.pop(key, None)
+            chosen = [v for v in query.getlist(name) if v != value]
+            if value not in selected:
+                chosen.append(value)
+            query.setlist(name, chosen)
+            valeurs.append({
+                'value': value,
+                'label': index.labels[name].get(value, value),
+                'count': count,
+                'selected': value in selected,
+                'query': query.urlencode(),
+            })
+        if name == 'prix':
+            order = [value for value, _, _, _ in PRICE_BANDS]
+            valeurs.sort(key=lambda v: order.index(v['value']))
+        else:
+            valeurs.sort(key=lambda v: (-v['count'], str(v['label'])))
+        if valeurs:
+            blocks.append({'name': name, 'titre': titre, 'valeurs': valeurs})
+    return total, blocks
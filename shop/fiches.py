@@ -0,0 +1,71 @@
+from datetime import date
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import models
+
+
+MARQUEUR_FAVORI = '<!--favori-->'
+
+
+def _cache():
+    return caches[getattr(settings, 'FICHES_CACHE_ALIAS', 'default')]
+
+
+def _version_key(slug):
+    return 'shop:fiches:version:%s' % slug
+
+
+def _version(cache, slug):
+    # Jeton aléatoire plutôt que compteur : une version évincée ne peut pas revenir à une ancienne clé.
+    version = cache.get(_version_key(slug))
+    if version is None:
+        cache.add(_version_key(slug), uuid.uuid4().hex, None)
+        version = cache.get(_version_key(slug))
+    return version
+
+
+def invalidate(slugs):
+    """Drop the cached page of the products published under ``slugs``."""
+    _cache().delete_many([_version_key(slug) for slug in slugs if slug])
+
+
+def invalidate_categories(categorie_ids):
+    """Drop the pages listing products of these categories as neighbours (product added or removed)."""
+    invalidate(models.Produit.objects.filter(categorie_id__in=categorie_ids).values_list('slug', flat=True))
+
+
+def _build(slug):
+    produit = models.Produit.objects.select_related('etablissement').filter(slug=slug).first()
+    if produit is None:
+        return None
+    html = render_to_string('product-details-fiche.html', {
+        'produit': produit,
+        'produits': models.Produit.objects.filter(categorie_id=produit.categorie_id).exclude(id=produit.id)[:3],
+    })
+    avant, apres = html.split(MARQUEUR_FAVORI, 1)
+    return {'id': produit.id, 'categorie_id': produit.categorie_id, 'avant': avant, 'apres': apres}
+
+
+def get(slug):
+    """Anonymous-invariant HTML of the product page split around the favorite button, or None.
+
+    Keyed by slug and the product's version, so a cache hit costs no query
+    and a save only drops that product's page; the key carries the date
+    since the promotional price depends on it. Neighbours listed on the
+    page follow products created or deleted in the category; their own
+    edits show up within ``FICHES_CACHE_TIMEOUT``.
+    """
+    cache = _cache()
+    key = 'shop:fiches:%s:%s:%s' % (slug, _version(cache, slug), date.today().isoformat())
+    fiche = cache.get(key)
+    if fiche is None:
+        fiche = _build(slug)
+        if fiche is None:
+            return None
+        cache.set(key, fiche, getattr(settings, 'FICHES_CACHE_TIMEOUT', 3600))
+    return dict(fiche, avant=mark_safe(fiche['avant']), apres=mark_safe(fiche['apres']))
@@ -0,0 +1,250 @@
+import csv
+import datetime
+import io
+import posixpath
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.text import slugify
+
+from PIL import Image, UnidentifiedImageError
+
+from base import images
+from website import nav_cache
+from . import facets, fiches, search, slugs
+from .models import CategorieProduit, Produit
+
+
+COLONNES = (
+    'nom', 'description', 'description_deal', 'prix', 'prix_promotionnel', 'quantite',
+    'date_debut_promo', 'date_fin_promo', 'categorie', 'image', 'image_2', 'image_3',
+)
+OBLIGATOIRES = ('nom', 'description', 'prix', 'categorie')
+IMAGES = ('image', 'image_2', 'image_3')
+UPLOAD_TO = Produit._meta.get_field('image').upload_to
+IMAGE_PAR_DEFAUT = Produit._meta.get_field('image').default
+
+
+class ImportInvalide(ValueError):
+    """The file itself cannot be read (encoding, columns, archive): nothing is imported."""
+
+
+def _texte(data):
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        pass
+    try:
+        # Export Excel « CSV (séparateur : point-virgule) » sous Windows
+        return data.decode('cp1252')
+    except UnicodeDecodeError:
+        raise ImportInvalide("Encodage du CSV illisible (UTF-8 ou Windows-1252 attendu)")
+
+
+def _lecteur(texte):
+    try:
+        dialect = csv.Sniffer().sniff(texte.split('\n', 1)[0], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(texte), dialect=dialect)
+    colonnes = {(name or '').strip().lower() for name in reader.fieldnames or ()}
+    manquantes = [name for name in OBLIGATOIRES if name not in colonnes]
+    if manquantes:
+        raise ImportInvalide("Colonne(s) manquante(s) : %s" % ', '.join(manquantes))
+    return reader
+
+
+def _nombre(value, champ, entier=False):
+    try:
+        nombre = (int if entier else float)(value.replace(' ', '').replace(',', '.'))
+    except ValueError:
+        raise ValueError("%s invalide : %r" % (champ, value))
+    if nombre < 0:
+        raise ValueError("%s négatif : %r" % (champ, value))
+    return nombre
+
+
+def _date(value, champ):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValueError("%s invalide (AAAA-MM-JJ attendu) : %r" % (champ, value))
+
+
+def _valider(row, categories, archive_noms, trop_volumineux=frozenset()):
+    """Cleaned values of one CSV row; raises ValueError with a message for the merchant."""
+    row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items() if key}
+    for champ in OBLIGATOIRES:
+        if not row.get(champ):
+            raise ValueError("%s obligatoire" % champ)
+    categorie = categories.get(row['categorie'].casefold())
+    if categorie is None:
+        raise ValueError("catégorie inconnue : %r" % row['categorie'])
+    valeurs = {
+        'nom': row['nom'][:254],
+        'description': row['description'],
+        'description_deal': row.get('description_deal', ''),
+        'prix': _nombre(row['prix'], 'prix'),
+        'prix_promotionnel': _nombre(row['prix_promotionnel'], 'prix_promotionnel') if row.get('prix_promotionnel') else 0,
+        'quantite': _nombre(row['quantite'], 'quantite', entier=True) if row.get('quantite') else None,
+        'date_debut_promo': _date(row['date_debut_promo'], 'date_debut_promo') if row.get('date_debut_promo') else None,
+        'date_fin_promo': _date(row['date_fin_promo'], 'date_fin_promo') if row.get('date_fin_promo') else None,
+        'categorie': categorie,
+    }
+    for champ in IMAGES:
+        nom = row.get(champ)
+        if nom and nom in trop_volumineux:
+            raise ValueError("%s trop volumineuse (> %g Mo) : %r" % (champ, _limite() / (1024 * 1024), nom))
+        if nom and nom not in archive_noms:
+            raise ValueError("%s absente de l'archive : %r" % (champ, nom))
+        valeurs[champ] = nom or None
+    return valeurs
+
+
+def _limite():
+    return getattr(settings, 'IMPORT_MAX_IMAGE_SIZE', 10 * 1024 * 1024)
+
+
+def _membres(archive):
+    """Image entries of the archive by name (and by base name); names of the oversized ones apart."""
+    membres, trop_volumineux = {}, set()
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        noms = (info.filename, posixpath.basename(info.filename))
+        if info.file_size > _limite():
+            trop_volumineux.update(noms)
+            continue
+        for nom in noms:
+            membres.setdefault(nom, info)
+    return membres, trop_volumineux - membres.keys()
+
+
+def _enregistrer_image(info, data):
+    """Store one image of the archive and write its variants; returns the stored name or None.
+
+    Images over ``IMAGE_MAX_PIXELS`` (a few KB of PNG can declare
+    gigapixels) are refused before decoding, like unreadable ones.
+    """
+    try:
+        with images.open_image(io.BytesIO(data)) as image:
+            image.verify()
+    except (OSError, UnidentifiedImageError, ValueError, Image.DecompressionBombError):
+        return None
+    name = default_storage.save(posixpath.join(UPLOAD_TO, posixpath.basename(info.filename)), ContentFile(data))
+    images.generate(name, default_storage)
+    return name
+
+
+def _traiter_images(archive, membres, noms):
+    """``{nom dans le CSV: nom stocké ou None}``, images stored and resized in a thread pool.
+
+    Pillow and the file system release the GIL, so threads keep the
+    request process (no fork of a web worker) while using several cores.
+    Each worker reads its entry under a lock (one file handle for the
+    archive), so only the images being processed are held in memory.
+    """
+    workers = getattr(settings, 'IMPORT_IMAGE_WORKERS', 4)
+    infos = {nom: membres[nom] for nom in noms}
+    lecture = threading.Lock()
+
+    def traiter(item):
+        nom, info = item
+        try:
+            with lecture, archive.open(info) as f:
+                # Taille déclarée dans l'archive non fiable (bombe zip) : lecture bornée
+                data = f.read(_limite() + 1)
+        except (zipfile.BadZipFile, OSError, EOFError):
+            return nom, None
+        if len(data) > _limite():
+            return nom, None
+        return nom, _enregistrer_image(info, data)
+
+    if workers > 1 and len(infos) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(pool.map(traiter, infos.items()))
+    return dict(map(traiter, infos.items()))
+
+
+def _slugs(noms):
+    """Unique slugs in the format of Produit.save(), checked in one query for the whole batch."""
+    micro = datetime.datetime.now().microsecond
+    candidats = ['-'.join((slugify(nom), str(micro + i))) for i, nom in enumerate(noms)]
+    pris = set(Produit.objects.filter(slug__in=candidats).values_list('slug', flat=True))
+    resultat = []
+    for i, (nom, slug) in enumerate(zip(noms, candidats)):
+        suffixe = 0
+        while slug in pris:
+            suffixe += 1
+            slug = '-'.join((slugify(nom), str(micro + i), str(suffixe)))
+        pris.add(slug)
+        resultat.append(slug)
+    return resultat
+
+
+def importer(etablissement, fichier_csv, archive=None, batch_size=None):
+    """Create the products of ``fichier_csv`` for ``etablissement``; returns ``(produits, erreurs)``.
+
+    ``erreurs`` lists ``(numéro de ligne, message)``: invalid rows are
+    skipped, valid rows are created. Categories are resolved by name from
+    one query; rows are inserted with ``bulk_create`` in batches of
+    ``IMPORT_BATCH_SIZE`` with what ``Produit.save()`` would compute
+    (slug, categorie_etab, en_promo, prix_actuel). ``bulk_create`` sends no
+    signal, so the search index, slug index and caches are updated here.
+    Raises ImportInvalide when the CSV or the archive cannot be read.
+    """
+    batch_size = batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', 500)
+    reader = _lecteur(_texte(fichier_csv.read()))
+    try:
+        zip_archive = zipfile.ZipFile(archive) if archive else None
+    except zipfile.BadZipFile:
+        raise ImportInvalide("Archive d'images illisible (ZIP attendu)")
+    membres, trop_volumineux = _membres(zip_archive) if zip_archive else ({}, set())
+    categories = {categorie.nom.casefold(): categorie for categorie in CategorieProduit.objects.all()}
+
+    valides, erreurs = [], []
+    try:
+        # Ligne 1 : en-tête
+        for numero, row in enumerate(reader, start=2):
+            try:
+                valides.append((numero, _valider(row, categories, membres, trop_volumineux)))
+            except ValueError as e:
+                erreurs.append((numero, str(e)))
+    except csv.Error as e:
+        raise ImportInvalide("CSV illisible ligne %s : %s" % (reader.line_num, e))
+
+    noms_images = {valeurs[champ] for _, valeurs in valides for champ in IMAGES if valeurs[champ]}
+    stockees = _traiter_images(zip_archive, membres, noms_images) if noms_images else {}
+
+    produits = []
+    for numero, valeurs in valides:
+        illisibles = [valeurs[champ] for champ in IMAGES if valeurs[champ] and not stockees.get(valeurs[champ])]
+        if illisibles:
+            erreurs.append((numero, "image illisible : %s" % ', '.join(map(repr, illisibles))))
+            continue
+        produit = Produit(etablissement=etablissement, categorie_etab_id=etablissement.categorie_id, status=True,
+                          **{key: value for key, value in valeurs.items() if key not in IMAGES})
+        for champ in IMAGES:
+            setattr(produit, champ, stockees[valeurs[champ]] if valeurs[champ] else IMAGE_PAR_DEFAUT)
+        produit.materialiser_prix()
+        produits.append(produit)
+
+    for produit, slug in zip(produits, _slugs([produit.nom for produit in produits])):
+        produit.slug = slug
+    with transaction.atomic():
+        Produit.objects.bulk_create(produits, batch_size=batch_size)
+
+    if produits:
+        search.index_produits([produit.id for produit in produits])
+        for produit in produits:
+            slugs.enregistrer(produit)
+        facets.invalidate()
+        fiches.invalidate_categories({produit.categorie_id for produit in produits})
+        nav_cache.invalidate('categories')
+    erreurs.sort()
+    return produits, erreurs
@@ -0,0 +1,217 @@
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+
+from customer.models import Commande, Customer, ProduitPanier
+from shop import commandes_recues
+from shop.models import Etablissement, Produit, SousCommande
+from shop.pagination import after
+from shop.statistiques import _bornes
+
+
+PRENOMS = ("Awa", "Koffi", "Aya", "Yao", "Mariam", "Ibrahim", "Adjoua", "Kouassi", "Fatou", "Serge")
+MOTS = ("burger", "poulet", "attiéké", "pizza", "massage", "spa", "brunch", "yoga", "hôtel", "cocktail")
+# (libellé, filtres) : chaque combinaison de la boîte de réception
+SCENARIOS = (
+    ("aucun filtre", {}),
+    ("payées", {'status': 'payée'}),
+    ("période", {'date_min': '2026-03-01', 'date_max': '2026-03-31'}),
+    ("payées+période", {'status': 'payée', 'date_min': '2026-03-01', 'date_max': '2026-03-31'}),
+    ("produit", {'produit': 'pizza'}),
+    ("client", {'client': 'awa'}),
+    ("tous", {'client': 'awa', 'produit': 'pizza', 'status': 'payée', 'date_min': '2026-01-01'}),
+)
+
+
+def _valeur(field, values):
+    """Valeur d'insertion de ``field`` : donnée synthétique, défaut du modèle ou valeur neutre."""
+    if field.attname in values:
+        return values[field.attname]
+    if field.has_default():
+        return field.get_default()
+    if field.null:
+        return None
+    if isinstance(field, (models.DateTimeField, models.DateField)):
+        return '2026-01-01 00:00:00'
+    if isinstance(field, (models.IntegerField, models.FloatField, models.BooleanField)):
+        return 0
+    return ''
+
+
+def _ancienne_requete(etablissement_id, selection):
+    """La requête de la boîte de réception avant EXISTS : jointures, DISTINCT, OFFSET."""
+    queryset = Commande.objects.filter(produit_commande__produit__etablissement_id=etablissement_id).distinct()
+    if 'client' in selection:
+        queryset = queryset.filter(customer__user__first_name__icontains=selection['client'])
+    if 'produit' in selection:
+        queryset = queryset.filter(produit_commande__produit__nom__icontains=selection['produit'])
+    if 'status' in selection:
+        queryset = queryset.filter(status=commandes_recues.STATUTS[selection['status']])
+    if 'date_min' in selection:
+        queryset = queryset.filter(date_add__gte=_bornes(selection['date_min'])[0])
+    if 'date_max' in selection:
+        # date_max à minuit, comme l'ancien filtre
+        queryset = queryset.filter(date_add__lte=_bornes(selection['date_max'])[0])
+    return queryset.order_by('-date_add')
+
+
+def _sql(queryset):
+    return queryset.query.sql_with_params()
+
+
+def _ms(seconds):
+    return '-' if seconds is None else f'{seconds * 1000:.1f}ms'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la boîte de réception marchand (sous-commandes + curseur) face à l'ancienne requête "
+        "(jointures DISTINCT + COUNT + OFFSET) sur des lignes de commande synthétiques, "
+        "dans une base SQLite en mémoire (la base du projet n'est pas touchée)."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lignes', type=int, default=1000000, help="Lignes de commande générées.")
+        parser.add_argument('--etablissements', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5, help="Exécutions de chaque requête.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        db = sqlite3.connect(':memory:')
+        self._schema(db)
+
+        start = time.perf_counter()
+        nb_etabs = options['etablissements']
+        nb_lignes = options['lignes']
+        nb_commandes = max(1, nb_lignes * 2 // 5)
+        nb_clients = max(nb_etabs, nb_commandes // 8)
+        nb_produits = nb_etabs * 50
+        debut = datetime(2025, 1, 1)
+
+        self._insert(db, User, ({
+            'id': pk, 'username': f'client{pk}', 'first_name': rng.choice(PRENOMS), 'last_name': f'N{pk}',
+            'date_joined': str(debut),
+        } for pk in range(1, nb_clients + 1)))
+        self._insert(db, Customer, ({'id': pk, 'user_id': pk} for pk in range(1, nb_clients + 1)))
+        self._insert(db, Etablissement, ({'id': pk, 'user_id': pk, 'nom': f'Etab {pk}'} for pk in range(1, nb_etabs + 1)))
+        self._insert(db, Produit, ({
+            'id': pk, 'nom': f'{rng.choice(MOTS)} {pk}', 'prix': rng.randint(1, 100) * 500,
+            'etablissement_id': rng.randint(1, nb_etabs),
+        } for pk in range(1, nb_produits + 1)))
+        # Commandes réparties sur deux ans, à peu près 2,5 lignes chacune
+        self._insert(db, Commande, ({
+            'id': pk, 'customer_id': rng.randint(1, nb_clients), 'prix_total': rng.randint(1, 200) * 500,
+            'status': rng.random() < 0.8,
+            # Stockage SQLite de Django : UTC sans fuseau
+            'date_add': str(debut + timedelta(seconds=pk * 63072000 // nb_commandes)),
+        } for pk in range(1, nb_commandes + 1)))
+        self._insert(db, ProduitPanier, ({
+            'id': pk, 'commande_id': rng.randint(1, nb_commandes), 'produit_id': rng.randint(1, nb_produits),
+            'quantite': rng.randint(1, 3),
+        } for pk in range(1, nb_lignes + 1)))
+        # Sous-commandes telles que checkout() les écrit : une par commande et établissement
+        db.execute(
+            "INSERT INTO shop_souscommande (commande_id, etablissement_id, customer_id, sous_total, nb_articles, "
+            "status, date_add, date_update) "
+            "SELECT l.commande_id, p.etablissement_id, c.customer_id, SUM(l.quantite * p.prix), SUM(l.quantite), "
+            "c.status, c.date_add, c.date_add FROM customer_produitpanier l "
+            "JOIN shop_produit p ON p.id = l.produit_id JOIN customer_commande c ON c.id = l.commande_id "
+            "GROUP BY l.commande_id, p.etablissement_id"
+        )
+        db.commit()
+        db.execute("ANALYZE")
+        self.stdout.write(f"{nb_lignes} lignes, {nb_commandes} commandes générées en {time.perf_counter() - start:.1f}s")
+
+        # L'établissement le plus actif : c'est lui qui paie le COUNT(DISTINCT ...)
+        etab_id = db.execute(
+            "SELECT p.etablissement_id FROM customer_produitpanier l JOIN shop_produit p ON p.id = l.produit_id "
+            "GROUP BY p.etablissement_id ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()[0]
+        etablissement = Etablissement(id=etab_id)
+
+        self.stdout.write(
+            f"{'filtres':<16} {'commandes':>9} {'ancien p.1':>11} {'ancien p.40':>12} {'COUNT DIST.':>12} "
+            f"{'nouveau p.1':>11} {'nouveau p.40':>12} {'COUNT nouv.':>12}"
+        )
+        for label, params in SCENARIOS:
+            selection = commandes_recues.filtres(params)
+            ancienne = _ancienne_requete(etab_id, selection)
+            nouvelle = commandes_recues.commandes(etablissement, selection).order_by(*commandes_recues.ORDERING)
+
+            sql, sql_params = _sql(ancienne[:25])
+            ancien_p1 = self._time(db, sql, sql_params, options['repeat'])
+            sql, sql_params = _sql(ancienne[39 * 25:40 * 25])
+            ancien_p40 = self._time(db, sql, sql_params, options['repeat'])
+            # Paginator.count sur un queryset DISTINCT : COUNT(*) d'une sous-requête DISTINCT
+            sql, sql_params = _sql(ancienne.order_by())
+            ancien_count = self._time(db, f"SELECT COUNT(*) FROM ({sql})", sql_params, options['repeat'])
+
+            sql, sql_params = _sql(nouvelle[:26])
+            nouveau_p1 = self._time(db, sql, sql_params, options['repeat'])
+            # Curseur de la 40e page : la dernière commande de la 39e
+            sql, sql_params = _sql(nouvelle.values_list('date_add', 'id')[39 * 25 - 1:39 * 25])
+            row = db.execute(sql.replace('%s', '?'), sql_params).fetchone()
+            if row:
+                values = [datetime.fromisoformat(row[0]).replace(tzinfo=dt_timezone.utc), row[1]]
+                sql, sql_params = _sql(nouvelle.filter(after(commandes_recues.ORDERING, values))[:26])
+                nouveau_p40 = self._time(db, sql, sql_params, options['repeat'])
+            else:
+                nouveau_p40 = None
+            # Même forme que QuerySet.count() : pas de colonnes ni de jointures de select_related
+            sql, sql_params = _sql(nouvelle.order_by().values('pk'))
+            nouveau_count = self._time(db, f"SELECT COUNT(*) FROM ({sql})", sql_params, options['repeat'])
+            total = db.execute(f"SELECT COUNT(*) FROM ({sql})".replace('%s', '?'), sql_params).fetchone()[0]
+
+            self.stdout.write(
+                f"{label:<16} {total:>9} {_ms(ancien_p1):>11} {_ms(ancien_p40):>12} {_ms(ancien_count):>12} "
+                f"{_ms(nouveau_p1):>11} {_ms(nouveau_p40):>12} {_ms(nouveau_count):>12}"
+            )
+        self.stdout.write(
+            "En-tête : sans filtre ou par date, somme de StatistiqueJour ; avec un autre filtre, "
+            "le COUNT de la nouvelle requête est mis en cache (INBOX_COUNT_TIMEOUT)."
+        )
+
+    @staticmethod
+    def _schema(db):
+        # Tables et index tels que les migrations les créent, sans passer par la base du projet
+        with connection.schema_editor(collect_sql=True, atomic=False) as editor:
+            for model in (User, Customer, Etablissement, Produit, Commande, ProduitPanier, SousCommande):
+                editor.create_model(model)
+        for statement in editor.collected_sql:
+            db.execute(statement)
+
+    @staticmethod
+    def _insert(db, model, rows, batch=50000):
+        fields = [field for field in model._meta.concrete_fields]
+        sql = 'INSERT INTO "%s" (%s) VALUES (%s)' % (
+            model._meta.db_table,
+            ', '.join('"%s"' % field.column for field in fields),
+            ', '.join('?' for _ in fields),
+        )
+        buffer = []
+        for values in rows:
+            buffer.append([_valeur(field, values) for field in fields])
+            if len(buffer) >= batch:
+                db.executemany(sql, buffer)
+                buffer = []
+        if buffer:
+            db.executemany(sql, buffer)
+        db.commit()
+
+    @staticmethod
+    def _time(db, sql, params, repeat):
+        sql = sql.replace('%s', '?')
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.execute(sql, params).fetchall()
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return timings[len(timings) // 2]
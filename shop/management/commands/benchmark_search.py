@@ -0,0 +1,107 @@
+import random
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import search
+
+
+MOTS = (
+    "burger poulet braisé attiéké alloco garba pizza crème brûlée café glacé jus bissap gingembre "
+    "massage spa coiffure tresses manucure hôtel nuitée piscine brunch buffet cocktail cinéma "
+    "karaoké salsa yoga fitness abonnement pressing livraison menu enfant dessert chocolat"
+).split()
+VILLES = ("Abidjan", "Bouaké", "Yamoussoukro", "San-Pédro", "Grand-Bassam")
+REQUETES = ("burger", "poulet braise", "creme", "spa massage", "pizz", "hotel piscine", "bissap", "yoga abidjan")
+
+
+class SqliteCursor:
+    """Adapte un curseur sqlite3 au style de paramètres (%s) des curseurs Django."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        return self.cursor.execute(sql.replace('%s', '?'), params)
+
+    def executemany(self, sql, params):
+        return self.cursor.executemany(sql.replace('%s', '?'), params)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la recherche FTS5 face à un balayage LIKE sur un catalogue synthétique, "
+        "dans une base SQLite en mémoire (la base du projet n'est pas touchée)."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produits', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20, help="Exécutions de chaque requête.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        db = sqlite3.connect(':memory:')
+        cursor = SqliteCursor(db.cursor())
+        backend = search.SqliteBackend()
+        backend.create(cursor)
+        cursor.execute(
+            "CREATE TABLE produit (id INTEGER PRIMARY KEY, nom TEXT, description TEXT, description_deal TEXT, "
+            "categorie TEXT, etablissement TEXT, etablissement_id INTEGER, status INTEGER)"
+        )
+
+        # Vocabulaire synthétique large : les mots réels ci-dessus restent rares, comme dans un vrai catalogue.
+        syllabes = ('ba', 'ko', 'li', 'ma', 'ne', 'ou', 'ra', 'si', 'ta', 'vé', 'zo', 'gui', 'dja', 'fou')
+        vocabulaire = list({''.join(rng.choices(syllabes, k=rng.randint(2, 4))) for _ in range(20000)})
+
+        def texte(k):
+            return ' '.join(rng.choice(MOTS) if rng.random() < 0.02 else rng.choice(vocabulaire) for _ in range(k))
+
+        rows = [
+            (
+                pk,
+                texte(3).capitalize(),
+                texte(40),
+                texte(8),
+                rng.choice(MOTS).capitalize(),
+                f"Chez {rng.choice(vocabulaire).capitalize()} {rng.choice(VILLES)}",
+                rng.randint(1, 2000),
+                rng.random() > 0.1,
+            )
+            for pk in range(1, options['produits'] + 1)
+        ]
+        start = time.perf_counter()
+        backend.upsert(cursor, rows)
+        indexing = time.perf_counter() - start
+        cursor.executemany("INSERT INTO produit VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", rows)
+        db.commit()
+        self.stdout.write(f"{len(rows)} produits indexés en {indexing:.1f}s ({len(rows) / indexing:.0f}/s)")
+
+        self.stdout.write(f"{'requête':<16} {'résultats':>9} {'fts5 (top 50)':>14} {'LIKE (scan)':>12}")
+        columns = ('nom', 'description', 'description_deal', 'categorie', 'etablissement')
+        for query in REQUETES:
+            words = search.terms(query)
+            fts = self._time(lambda: backend.search(cursor, words, limit=50), options['repeat'])
+            # Référence : l'ancienne approche icontains, un LIKE par mot et par colonne.
+            like_sql = "SELECT id FROM produit WHERE status = 1 AND " + ' AND '.join(
+                '(' + ' OR '.join(f"{column} LIKE %s" for column in columns) + ')' for _ in words
+            ) + " LIMIT 50"
+            like_params = [f"%{word}%" for word in words for _ in columns]
+            like = self._time(lambda: cursor.execute(like_sql, like_params).fetchall(), options['repeat'])
+            count = len(backend.search(cursor, words))
+            self.stdout.write(f"{query:<16} {count:>9} {fts * 1000:>12.2f}ms {like * 1000:>10.2f}ms")
+
+    @staticmethod
+    def _time(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return timings[len(timings) // 2]
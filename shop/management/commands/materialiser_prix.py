@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Produit
+
+
+class Command(BaseCommand):
+    help = "Recalcule en_promo / prix_actuel des produits pour aujourd'hui (sans django_cron : à lancer après minuit)."
+    requires_system_checks = []
+
+    def handle(self, *args, **options):
+        count = Produit.objects.materialiser()
+        self.stdout.write(f"{count} produit(s) mis à jour")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop import search
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche des produits (après un import ou des .update() en masse)."
+
+    def handle(self, *args, **options):
+        count = search.rebuild()
+        self.stdout.write(f"{count} produit(s) indexé(s)")
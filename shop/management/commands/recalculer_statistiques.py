@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from shop import sous_commandes, statistiques
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les statistiques journalières des établissements depuis les sous-commandes."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--etablissement', type=int, action='append', dest='etablissements',
+                            help="Limiter à cet établissement (répétable)")
+        parser.add_argument('--sous-commandes', action='store_true',
+                            help="Réécrire d'abord toutes les sous-commandes depuis les lignes de commande")
+
+    def handle(self, *args, **options):
+        if options['sous_commandes']:
+            count = sous_commandes.reconstruire()
+            self.stdout.write(f"{count} sous-commande(s) écrite(s)")
+        count = statistiques.reconstruire(options['etablissements'])
+        self.stdout.write(f"{count} ligne(s) de statistiques écrite(s)")
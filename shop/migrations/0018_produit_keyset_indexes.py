@@ -0,0 +1,25 @@
+# Generated by Django 4.2.9 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_produit_quantite'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['status', '-date_add', '-id'], name='produit_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['categorie', '-date_add', '-id'], name='produit_categorie_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['categorie_etab', '-date_add', '-id'], name='produit_cat_etab_date_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.9 on 2026-10-17 00:20
+
+from django.db import migrations
+
+
+# SQL figé à la création de l'index : la migration ne doit pas dépendre de shop/search.py, qui évoluera.
+SQL = {
+    'sqlite': {
+        'create': [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS shop_produit_fts USING fts5("
+            "nom, description, description_deal, categorie, etablissement, "
+            "etablissement_id UNINDEXED, status UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2')",
+            "INSERT INTO shop_produit_fts (rowid, nom, description, description_deal, categorie, etablissement, "
+            "etablissement_id, status) "
+            "SELECT p.id, p.nom, p.description, p.description_deal, COALESCE(c.nom, ''), COALESCE(e.nom, ''), "
+            "p.etablissement_id, p.status "
+            "FROM shop_produit p "
+            "LEFT JOIN shop_categorieproduit c ON c.id = p.categorie_id "
+            "LEFT JOIN shop_etablissement e ON e.id = p.etablissement_id",
+        ],
+        'drop': ["DROP TABLE IF EXISTS shop_produit_fts"],
+    },
+    'postgresql': {
+        'create': [
+            "CREATE EXTENSION IF NOT EXISTS unaccent",
+            "CREATE TABLE IF NOT EXISTS shop_produit_search ("
+            "produit_id bigint PRIMARY KEY, etablissement_id bigint, status boolean, document tsvector)",
+            "CREATE INDEX IF NOT EXISTS shop_produit_search_document ON shop_produit_search USING GIN (document)",
+            "INSERT INTO shop_produit_search (produit_id, etablissement_id, status, document) "
+            "SELECT p.id, p.etablissement_id, p.status, "
+            "setweight(to_tsvector('french', unaccent(p.nom)), 'A') "
+            "|| setweight(to_tsvector('french', unaccent(p.description)), 'C') "
+            "|| setweight(to_tsvector('french', unaccent(p.description_deal)), 'B') "
+            "|| setweight(to_tsvector('french', unaccent(COALESCE(c.nom, '') || ' ' || COALESCE(e.nom, ''))), 'B') "
+            "FROM shop_produit p "
+            "LEFT JOIN shop_categorieproduit c ON c.id = p.categorie_id "
+            "LEFT JOIN shop_etablissement e ON e.id = p.etablissement_id "
+            "ON CONFLICT (produit_id) DO NOTHING",
+        ],
+        'drop': ["DROP TABLE IF EXISTS shop_produit_search"],
+    },
+}
+
+
+def _execute(schema_editor, action):
+    # Autres bases : pas d'index, la recherche parcourt la table (voir ScanBackend).
+    for sql in SQL.get(schema_editor.connection.vendor, {}).get(action, []):
+        schema_editor.execute(sql)
+
+
+def create_index(apps, schema_editor):
+    _execute(schema_editor, 'create')
+
+
+def drop_index(apps, schema_editor):
+    _execute(schema_editor, 'drop')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_produit_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.9 on 2026-10-17 01:10
+
+from django.db import migrations, models
+
+
+def materialiser(apps, schema_editor):
+    from shop.models import prix_effectif, promo_active
+    Produit = apps.get_model('shop', 'Produit')
+    Produit.objects.update(en_promo=promo_active(), prix_actuel=prix_effectif())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_produit_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produit',
+            name='en_promo',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='prix_actuel',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.RunPython(materialiser, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['status', 'prix_actuel', 'id'], name='produit_status_prix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['en_promo'], name='produit_en_promo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['date_fin_promo'], name='produit_fin_promo_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.9 on 2026-10-17 09:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_produit_prix_materialise'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('nb_commandes', models.PositiveIntegerField(default=0)),
+                ('quantite', models.PositiveIntegerField(default=0)),
+                ('chiffre_affaires', models.FloatField(default=0)),
+                ('nb_clients', models.PositiveIntegerField(default=0)),
+                ('date_update', models.DateTimeField(auto_now=True)),
+                ('etablissement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistiques', to='shop.etablissement')),
+            ],
+            options={
+                'verbose_name': 'Statistique du jour',
+                'verbose_name_plural': 'Statistiques par jour',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='statistiquejour',
+            constraint=models.UniqueConstraint(fields=('etablissement', 'jour'), name='statistique_etab_jour_unique'),
+        ),
+    ]
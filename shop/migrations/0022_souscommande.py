@@ -0,0 +1,67 @@
+# Generated by Django 4.2.9 on 2026-10-17 12:30
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def remplir_sous_commandes(apps, schema_editor):
+    ProduitPanier = apps.get_model('customer', 'ProduitPanier')
+    SousCommande = apps.get_model('shop', 'SousCommande')
+    lignes = ProduitPanier.objects.filter(commande__isnull=False).values(
+        'commande_id', 'produit__etablissement_id', 'commande__customer_id', 'commande__status', 'commande__date_add',
+    ).annotate(
+        total=Sum(F('quantite') * Coalesce('prix_paye', 'produit__prix'), output_field=FloatField()),
+        articles=Sum('quantite'),
+    ).order_by()
+    SousCommande.objects.bulk_create((
+        SousCommande(
+            commande_id=row['commande_id'],
+            etablissement_id=row['produit__etablissement_id'],
+            customer_id=row['commande__customer_id'],
+            sous_total=row['total'] or 0,
+            nb_articles=row['articles'] or 0,
+            status=row['commande__status'],
+            date_add=row['commande__date_add'],
+        )
+        for row in lignes.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0011_commande_inbox_indexes'),
+        ('shop', '0021_statistiquejour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SousCommande',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sous_total', models.FloatField(default=0)),
+                ('nb_articles', models.PositiveIntegerField(default=0)),
+                ('status', models.BooleanField(default=True)),
+                ('date_add', models.DateTimeField()),
+                ('date_update', models.DateTimeField(auto_now=True)),
+                ('commande', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sous_commandes', to='customer.commande')),
+                ('customer', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sous_commandes', to='customer.customer')),
+                ('etablissement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sous_commandes', to='shop.etablissement')),
+            ],
+            options={
+                'verbose_name': 'Sous-commande',
+                'verbose_name_plural': 'Sous-commandes',
+                'indexes': [
+                    models.Index(fields=['etablissement', 'date_add', 'id'], name='sous_commande_etab_date_idx'),
+                    models.Index(fields=['etablissement', 'status', 'date_add', 'id'], name='sous_commande_etab_status_idx'),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='souscommande',
+            constraint=models.UniqueConstraint(fields=('commande', 'etablissement'), name='sous_commande_unique'),
+        ),
+        migrations.RunPython(remplir_sous_commandes, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
 from django.utils.text import slugify
 import datetime
 from django.contrib.sessions.models import Session
@@ -104,6 +105,96 @@ class Etablissement(models.Model):
         return self.nom
 
 
+def promo_en_cours(prefix='', today=None):
+    """Condition « promotion active aujourd'hui » sur les champs Produit (préfixés par ``prefix``)."""
+    today = today or datetime.date.today()
+    return Q(**{prefix + 'date_debut_promo__lte': today, prefix + 'date_fin_promo__gte': today})
+
+
+def promo_active(prefix='', today=None):
+    return Case(
+        When(promo_en_cours(prefix, today), then=Value(True)),
+        default=Value(False),
+        output_field=models.BooleanField(),
+    )
+
+
+def prix_effectif(prefix='', today=None):
+    """Prix promotionnel pendant la promotion, prix normal sinon."""
+    return Case(
+        When(promo_en_cours(prefix, today), then=F(prefix + 'prix_promotionnel')),
+        default=F(prefix + 'prix'),
+        output_field=models.FloatField(),
+    )
+
+
+# Champs dont dépendent en_promo / prix_actuel
+CHAMPS_PRIX = {'prix', 'prix_promotionnel', 'date_debut_promo', 'date_fin_promo'}
+
+
+def colonnes_perimees(today=None):
+    """Rows whose ``en_promo`` no longer matches today's promotion, or never materialized.
+
+    Prices are kept in sync at write time (save(), update(), bulk_update());
+    only a promotion starting or ending overnight can make a row stale until
+    the MaterialiserPrixCronJob task runs. No column comparison: per row.
+    """
+    return (
+        Q(prix_actuel__isnull=True)
+        | Q(en_promo=False) & promo_en_cours(today=today)
+        | Q(en_promo=True) & ~promo_en_cours(today=today)
+    )
+
+
+class ProduitQuerySet(models.QuerySet):
+
+    def avec_prix(self):
+        """Annotate ``promo_active`` and ``effective_price`` for today, usable in filter()/order_by().
+
+        Reads the materialized ``en_promo``/``prix_actuel`` columns (indexed);
+        the rare stale rows get the same values computed in SQL.
+        """
+        perimee = colonnes_perimees()
+        return self.annotate(
+            promo_active=Case(When(perimee, then=promo_active()), default=F('en_promo')),
+            effective_price=Case(
+                When(perimee, then=prix_effectif()), default=F('prix_actuel'), output_field=models.FloatField()
+            ),
+        )
+
+    def update(self, **kwargs):
+        """update() that keeps ``en_promo``/``prix_actuel`` in sync when a price or promotion field changes."""
+        if not CHAMPS_PRIX & kwargs.keys():
+            return super().update(**kwargs)
+        # Les lignes filtrées peuvent ne plus correspondre au filtre après la mise à jour
+        ids = list(self.values_list('pk', flat=True))
+        count = super().update(**kwargs)
+        self.model.objects.filter(pk__in=ids).materialiser()
+        return count
+
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        if CHAMPS_PRIX & set(fields):
+            for obj in objs:
+                obj.materialiser_prix()
+            fields = [*fields, 'en_promo', 'prix_actuel']
+        return super().bulk_update(objs, fields, batch_size=batch_size)
+
+    bulk_update.alters_data = True
+
+    def materialiser(self, today=None):
+        """Write today's promotion state and price into the indexed columns, for changed rows only."""
+        today = today or datetime.date.today()
+        stale = self.annotate(_promo=promo_active(today=today), _prix=prix_effectif(today=today)).filter(
+            Q(prix_actuel__isnull=True) | ~Q(en_promo=F('_promo')) | ~Q(prix_actuel=F('_prix'))
+        )
+        return self.model.objects.filter(pk__in=stale.values('pk')).update(
+            en_promo=promo_active(today=today),
+            prix_actuel=prix_effectif(today=today),
+        )
+
+
 class Produit(models.Model):
     nom = models.CharField(max_length=254)
     description = models.TextField()
@@ -125,18 +216,45 @@ class Produit(models.Model):
     date_update = models.DateTimeField(auto_now=True)
     status = models.BooleanField(default=True)
     slug = models.SlugField(unique=True, editable=False, null=True,  blank=True)
+    # État du jour matérialisé (save() et tâche MaterialiserPrixCronJob) ; lire via Produit.objects.avec_prix()
+    en_promo = models.BooleanField(default=False, editable=False)
+    prix_actuel = models.FloatField(null=True, editable=False)
+
+    objects = ProduitQuerySet.as_manager()
+
+    class Meta:
+        # Pagination par curseur (shop.pagination) : filtre de la page puis (date_add, id)
+        indexes = [
+            models.Index(fields=['status', '-date_add', '-id'], name='produit_status_date_idx'),
+            models.Index(fields=['categorie', '-date_add', '-id'], name='produit_categorie_date_idx'),
+            models.Index(fields=['categorie_etab', '-date_add', '-id'], name='produit_cat_etab_date_idx'),
+            models.Index(fields=['status', 'prix_actuel', 'id'], name='produit_status_prix_idx'),
+            models.Index(fields=['en_promo'], name='produit_en_promo_idx'),
+            models.Index(fields=['date_fin_promo'], name='produit_fin_promo_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug or self.slug is None:
             self.slug = '-'.join((slugify(self.nom), slugify(datetime.datetime.now().microsecond)))
         self.categorie_etab = self.etablissement.categorie
+        self.materialiser_prix()
         super(Produit, self).save(*args, **kwargs)
 
     def __str__(self):
         return self.nom
 
+    def materialiser_prix(self):
+        self.en_promo = self._promotion_du_jour()
+        self.prix_actuel = self.prix_promotionnel if self.en_promo else self.prix
+
     @property
     def check_promotion(self):
+        # Valeur calculée en SQL quand le produit vient de Produit.objects.avec_prix()
+        if hasattr(self, 'promo_active'):
+            return self.promo_active
+        return self._promotion_du_jour()
+
+    def _promotion_du_jour(self):
         result = True
         if self.date_debut_promo:
             if self.date_debut_promo > datetime.date.today():
@@ -166,3 +284,56 @@ class Favorite(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.produit.nom}"
 
+
+class StatistiqueJour(models.Model):
+    """Ventes d'un établissement sur une journée, tenues à jour par shop.statistiques."""
+
+    etablissement = models.ForeignKey(Etablissement, related_name="statistiques", on_delete=models.CASCADE)
+    jour = models.DateField()
+    nb_commandes = models.PositiveIntegerField(default=0)
+    quantite = models.PositiveIntegerField(default=0)
+    chiffre_affaires = models.FloatField(default=0)
+    nb_clients = models.PositiveIntegerField(default=0)
+    date_update = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Statistique du jour'
+        verbose_name_plural = 'Statistiques par jour'
+        constraints = [
+            models.UniqueConstraint(fields=['etablissement', 'jour'], name='statistique_etab_jour_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.etablissement} - {self.jour}"
+
+
+class SousCommande(models.Model):
+    """Part d'une commande revenant à un établissement, écrite à la validation par shop.sous_commandes.
+
+    Client, statut et date sont recopiés de la commande : les vues marchand
+    lisent cette table par ses index sans joindre les lignes.
+    """
+
+    commande = models.ForeignKey('customer.Commande', related_name="sous_commandes", on_delete=models.CASCADE)
+    etablissement = models.ForeignKey(Etablissement, related_name="sous_commandes", on_delete=models.CASCADE)
+    customer = models.ForeignKey('customer.Customer', related_name="sous_commandes", on_delete=models.CASCADE, null=True)
+    sous_total = models.FloatField(default=0)
+    nb_articles = models.PositiveIntegerField(default=0)
+    status = models.BooleanField(default=True)
+    date_add = models.DateTimeField()
+    date_update = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Sous-commande'
+        verbose_name_plural = 'Sous-commandes'
+        constraints = [
+            models.UniqueConstraint(fields=['commande', 'etablissement'], name='sous_commande_unique'),
+        ]
+        # Boîte de réception et tableau de bord : tri par curseur, avec ou sans filtre de statut
+        indexes = [
+            models.Index(fields=['etablissement', 'date_add', 'id'], name='sous_commande_etab_date_idx'),
+            models.Index(fields=['etablissement', 'status', 'date_add', 'id'], name='sous_commande_etab_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.commande_id} - {self.etablissement}"
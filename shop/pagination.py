@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.db.models import Q
+
+
+DEFAULT_ORDERING = ('-date_add', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _json_default(value):
+    # isoformat() complet : DjangoJSONEncoder tronque aux millisecondes et le curseur sauterait des lignes.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def encode_cursor(obj, ordering=DEFAULT_ORDERING):
+    values = [getattr(obj, field.lstrip('-')) for field in ordering]
+    raw = json.dumps(values, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, ordering=DEFAULT_ORDERING):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(token) from e
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor(token)
+    return values
+
+
+def after(ordering, values):
+    """Rows strictly after ``values`` in ``ordering``: (a, b) > (x, y) as a = x AND b > y, or a > x."""
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = '__lt' if field.startswith('-') else '__gt'
+        condition |= equal & Q(**{name + lookup: value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+class KeysetPage:
+    """One page of a queryset positioned by the values of its ordering columns.
+
+    Unlike OFFSET, the cost of a page does not depend on how deep it is:
+    the cursor becomes a ``WHERE`` on the ordering columns, served by the
+    matching indexes of Produit. ``ordering`` must end with a unique column.
+    """
+
+    def __init__(self, queryset, cursor=None, per_page=None, ordering=DEFAULT_ORDERING):
+        self.per_page = per_page or getattr(settings, 'SHOP_PAGE_SIZE', 12)
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            try:
+                queryset = queryset.filter(after(ordering, decode_cursor(cursor, ordering)))
+            except (TypeError, ValueError) as e:
+                # Valeur du curseur inconvertible pour la colonne (date illisible...)
+                raise InvalidCursor(cursor) from e
+        # Une ligne de plus que la page : suffit à savoir s'il reste des produits, sans COUNT.
+        items = list(queryset[:self.per_page + 1])
+        self.has_next = len(items) > self.per_page
+        self.items = items[:self.per_page]
+        self.next_cursor = encode_cursor(self.items[-1], ordering) if self.has_next else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,217 @@
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+
+from . import models
+
+
+MAX_TERMS = 8
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def terms(query):
+    """Accent-free, lowercase words of ``query`` (``« Crème brûlée »`` -> ``['creme', 'brulee']``)."""
+    folded = unicodedata.normalize('NFKD', query or '')
+    folded = ''.join(c for c in folded if not unicodedata.combining(c)).casefold()
+    return _TERM_RE.findall(folded)[:MAX_TERMS]
+
+
+def _rows(produit_model, ids):
+    return produit_model.objects.filter(id__in=ids).values_list(
+        'id', 'nom', 'description', 'description_deal', 'categorie__nom', 'etablissement__nom',
+        'etablissement_id', 'status',
+    )
+
+
+class SqliteBackend:
+    """FTS5 table keyed by the product id, ranked with bm25()."""
+
+    table = 'shop_produit_fts'
+    # Le nom pèse le plus, puis catégorie/établissement, le deal, la description.
+    weights = (10.0, 1.0, 2.0, 4.0, 4.0)
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "nom, description, description_deal, categorie, etablissement, "
+            "etablissement_id UNINDEXED, status UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def delete(self, cursor, ids):
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+            )
+
+    def upsert(self, cursor, rows):
+        rows = list(rows)
+        self.delete(cursor, [row[0] for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {self.table} (rowid, nom, description, description_deal, categorie, etablissement, "
+            "etablissement_id, status) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            [(pk, nom, desc, deal, cat or '', etab or '', etab_id, int(status))
+             for pk, nom, desc, deal, cat, etab, etab_id, status in rows],
+        )
+
+    def search(self, cursor, words, limit=None, etablissement_id=None, actifs=True):
+        # Chaque mot en préfixe ("burg"*), tous requis ; les guillemets neutralisent la syntaxe FTS5.
+        match = ' '.join('"%s"*' % word for word in words)
+        sql = f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s"
+        params = [match]
+        if actifs:
+            sql += " AND status = 1"
+        if etablissement_id is not None:
+            sql += " AND etablissement_id = %s"
+            params.append(etablissement_id)
+        sql += f" ORDER BY bm25({self.table}, {', '.join(str(w) for w in self.weights)}) LIMIT %s"
+        params.append(-1 if limit is None else limit)
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresBackend:
+    """tsvector table with a GIN index, ranked with ts_rank_cd()."""
+
+    table = 'shop_produit_search'
+    config = 'french'
+
+    def create(self, cursor):
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "produit_id bigint PRIMARY KEY, etablissement_id bigint, status boolean, document tsvector)"
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_document ON {self.table} USING GIN (document)")
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def delete(self, cursor, ids):
+        cursor.execute(f"DELETE FROM {self.table} WHERE produit_id = ANY(%s)", [list(ids)])
+
+    def upsert(self, cursor, rows):
+        vector = "setweight(to_tsvector('{0}', unaccent(%s)), '{1}')"
+        cursor.executemany(
+            f"INSERT INTO {self.table} (produit_id, etablissement_id, status, document) VALUES (%s, %s, %s, "
+            + " || ".join(vector.format(self.config, weight) for weight in 'ACBB')
+            + ") ON CONFLICT (produit_id) DO UPDATE SET etablissement_id = EXCLUDED.etablissement_id, "
+            "status = EXCLUDED.status, document = EXCLUDED.document",
+            [(pk, etab_id, status, nom, desc, deal, f"{cat or ''} {etab or ''}")
+             for pk, nom, desc, deal, cat, etab, etab_id, status in rows],
+        )
+
+    def search(self, cursor, words, limit=None, etablissement_id=None, actifs=True):
+        query = ' & '.join('%s:*' % word for word in words)
+        sql = (
+            f"SELECT produit_id FROM {self.table}, to_tsquery('{self.config}', unaccent(%s)) query "
+            "WHERE document @@ query"
+        )
+        params = [query]
+        if actifs:
+            sql += " AND status"
+        if etablissement_id is not None:
+            sql += " AND etablissement_id = %s"
+            params.append(etablissement_id)
+        sql += " ORDER BY ts_rank_cd(document, query) DESC"
+        if limit is not None:
+            sql += " LIMIT %s"
+            params.append(limit)
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+class ScanBackend:
+    """Other databases: no index to maintain, every word matched with icontains."""
+
+    def create(self, cursor):
+        pass
+
+    drop = create
+
+    def delete(self, cursor, ids):
+        pass
+
+    def upsert(self, cursor, rows):
+        pass
+
+    def search(self, cursor, words, limit=None, etablissement_id=None, actifs=True):
+        produits = models.Produit.objects.all()
+        if actifs:
+            produits = produits.filter(status=True)
+        if etablissement_id is not None:
+            produits = produits.filter(etablissement_id=etablissement_id)
+        for word in words:
+            produits = produits.filter(
+                Q(nom__icontains=word) | Q(description__icontains=word)
+                | Q(description_deal__icontains=word) | Q(categorie__nom__icontains=word)
+                | Q(etablissement__nom__icontains=word)
+            )
+        ids = produits.order_by('-date_add').values_list('id', flat=True)
+        return list(ids if limit is None else ids[:limit])
+
+
+BACKENDS = {
+    'sqlite': SqliteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend(conn=None):
+    return BACKENDS.get((conn or connection).vendor, ScanBackend)()
+
+
+def index_produits(ids, produit_model=None, conn=None):
+    """(Re)index the given products; ids that no longer exist are removed."""
+    ids = list(ids)
+    if not ids:
+        return
+    conn = conn or connection
+    backend = get_backend(conn)
+    rows = list(_rows(produit_model or models.Produit, ids))
+    with conn.cursor() as cursor:
+        backend.delete(cursor, list(set(ids) - {row[0] for row in rows}))
+        if rows:
+            backend.upsert(cursor, rows)
+
+
+def remove(ids):
+    with connection.cursor() as cursor:
+        get_backend().delete(cursor, list(ids))
+
+
+def rebuild(produit_model=None, conn=None, batch_size=1000):
+    """Recreate the whole index from the Produit table."""
+    conn = conn or connection
+    produit_model = produit_model or models.Produit
+    backend = get_backend(conn)
+    with conn.cursor() as cursor:
+        backend.drop(cursor)
+        backend.create(cursor)
+    ids = list(produit_model.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(ids), batch_size):
+        index_produits(ids[start:start + batch_size], produit_model, conn)
+    return len(ids)
+
+
+def search_ids(query, limit=50, etablissement_id=None, actifs=True):
+    """Ids of matching products, best match first."""
+    words = terms(query)
+    if not words:
+        return []
+    with connection.cursor() as cursor:
+        return get_backend().search(cursor, words, limit, etablissement_id, actifs)
+
+
+def search(query, limit=50):
+    """Active products matching ``query``, best match first."""
+    ids = search_ids(query, limit)
+    produits = models.Produit.objects.in_bulk(ids)
+    return [produits[pk] for pk in ids if pk in produits]
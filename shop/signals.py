@@ -0,0 +1,108 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from customer.models import Commande, ProduitPanier
+from django.utils import timezone
+
+from . import facets, fiches, models, search, slugs, sous_commandes, statistiques
+
+
+@receiver(post_save, sender=models.Produit)
+def index_produit(sender, instance, **kwargs):
+    search.index_produits([instance.id])
+
+
+@receiver(post_delete, sender=models.Produit)
+def remove_produit(sender, instance, **kwargs):
+    search.remove([instance.id])
+
+
+# Le nom de la catégorie et de l'établissement est recopié dans l'index de chaque produit.
+@receiver(post_save, sender=models.CategorieProduit)
+def reindex_categorie(sender, instance, created, **kwargs):
+    if not created:
+        search.index_produits(instance.produit.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=models.Etablissement)
+def reindex_etablissement(sender, instance, created, **kwargs):
+    if not created:
+        search.index_produits(instance.produits.values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=models.Produit)
+@receiver([post_save, post_delete], sender=models.CategorieProduit)
+@receiver([post_save, post_delete], sender=models.Etablissement)
+def invalidate_facets(sender, **kwargs):
+    facets.invalidate()
+
+
+@receiver(post_save, sender=models.Produit)
+@receiver(post_save, sender=models.CategorieProduit)
+@receiver(post_save, sender=models.CategorieEtablissement)
+@receiver(post_save, sender=models.Etablissement)
+def enregistrer_slug(sender, instance, **kwargs):
+    slugs.enregistrer(instance)
+
+
+@receiver(post_delete, sender=models.Produit)
+@receiver(post_delete, sender=models.CategorieProduit)
+@receiver(post_delete, sender=models.CategorieEtablissement)
+@receiver(post_delete, sender=models.Etablissement)
+def retirer_slug(sender, instance, **kwargs):
+    slugs.retirer(instance)
+
+
+@receiver(post_save, sender=models.Produit)
+def invalidate_fiche(sender, instance, created, **kwargs):
+    if created:
+        fiches.invalidate_categories([instance.categorie_id])
+    else:
+        fiches.invalidate([instance.slug])
+
+
+@receiver(post_delete, sender=models.Produit)
+def invalidate_fiches_voisines(sender, instance, **kwargs):
+    fiches.invalidate([instance.slug])
+    fiches.invalidate_categories([instance.categorie_id])
+
+
+@receiver(post_save, sender=models.Etablissement)
+def invalidate_fiches_etablissement(sender, instance, created, **kwargs):
+    if not created:
+        fiches.invalidate(instance.produits.values_list('slug', flat=True))
+
+
+# Lignes de commande écrites une par une (admin, scripts) ; checkout() met à jour lui-même
+# sous-commandes et statistiques car il déplace les lignes par .update(), sans signal.
+@receiver([post_save, post_delete], sender=ProduitPanier)
+def rafraichir_statistiques(sender, instance, **kwargs):
+    if instance.commande_id is None:
+        return
+    try:
+        commande = instance.commande
+    except Commande.DoesNotExist:
+        return
+    etablissement_id = instance.produit.etablissement_id
+    sous_commandes.ecrire(commande, [etablissement_id])
+    statistiques.rafraichir([etablissement_id], timezone.localdate(commande.date_add))
+
+
+@receiver(post_save, sender=Commande)
+def synchroniser_sous_commandes(sender, instance, created, **kwargs):
+    if not created:
+        sous_commandes.synchroniser(instance)
+
+
+# Commande supprimée (admin, cascade) : ses sous-commandes partent avec elle, les jours
+# concernés sont recomptés une fois la suppression faite.
+@receiver(pre_delete, sender=Commande)
+def noter_etablissements(sender, instance, **kwargs):
+    instance._etablissements_stats = list(
+        models.SousCommande.objects.filter(commande=instance).values_list('etablissement_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Commande)
+def retirer_statistiques(sender, instance, **kwargs):
+    statistiques.rafraichir(getattr(instance, '_etablissements_stats', ()), timezone.localdate(instance.date_add))
@@ -0,0 +1,154 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Value
+
+from . import models
+
+
+# Par ordre de priorité si deux modèles partagent un slug (ordre historique de ``single``)
+KINDS = (
+    ('categorie_produit', models.CategorieProduit),
+    ('categorie_etablissement', models.CategorieEtablissement),
+    ('etablissement', models.Etablissement),
+    ('produit', models.Produit),
+)
+PRIORITY = {kind: position for position, (kind, _) in enumerate(KINDS)}
+MODEL_KINDS = {model: kind for kind, model in KINDS}
+
+GENERATION_KEY = 'shop:slugs:generation'
+# Journal des changements partagé entre processus ; au-delà, reconstruction complète
+CHANGE_TIMEOUT = 3600
+# Filet de sécurité pour les écritures sans signal (bulk_create, .update())
+MAX_AGE = 600
+
+
+def _cache():
+    return caches[getattr(settings, 'SLUGS_CACHE_ALIAS', 'default')]
+
+
+def _change_key(generation):
+    return 'shop:slugs:change:%s' % generation
+
+
+class SlugIndex:
+    """Public slug -> ``(kind, id)`` for every model served under ``/shop/<slug>``."""
+
+    def __init__(self, entries=()):
+        self.entries = {}
+        for slug, kind, pk in entries:
+            self.set(slug, kind, pk)
+
+    @classmethod
+    def build(cls):
+        entries = []
+        for kind, model in KINDS:
+            entries += [(slug, kind, pk) for slug, pk in
+                        model.objects.exclude(slug__isnull=True).values_list('slug', 'id').iterator()]
+        return cls(entries)
+
+    def set(self, slug, kind, pk):
+        current = self.entries.get(slug)
+        if current is None or current == (kind, pk) or PRIORITY[kind] <= PRIORITY[current[0]]:
+            self.entries[slug] = (kind, pk)
+
+    def discard(self, slug, kind, pk):
+        if self.entries.get(slug) == (kind, pk):
+            del self.entries[slug]
+
+    def apply(self, change):
+        action, slug, kind, pk = change
+        if action == 'set':
+            self.set(slug, kind, pk)
+        else:
+            self.discard(slug, kind, pk)
+
+    def get(self, slug):
+        return self.entries.get(slug)
+
+
+_lock = threading.Lock()
+_index = None
+_generation = None
+_built_at = None
+
+
+def get_index():
+    """Process-local index, brought up to date from the shared change log."""
+    global _index, _generation, _built_at
+    cache = _cache()
+    current = cache.get(GENERATION_KEY, 0)
+    if _index is not None and _generation == current and time.monotonic() - _built_at < MAX_AGE:
+        return _index
+    with _lock:
+        if _index is not None and time.monotonic() - _built_at < MAX_AGE and _generation is not None \
+                and _generation <= current:
+            changes = cache.get_many([_change_key(n) for n in range(_generation + 1, current + 1)])
+            if len(changes) == current - _generation:
+                for n in range(_generation + 1, current + 1):
+                    _index.apply(changes[_change_key(n)])
+                _generation = current
+                return _index
+        _index = SlugIndex.build()
+        _generation = current
+        _built_at = time.monotonic()
+    return _index
+
+
+def _publish(change):
+    global _generation
+    cache = _cache()
+    try:
+        generation = cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 0, None)
+        generation = cache.incr(GENERATION_KEY)
+    cache.set(_change_key(generation), change, CHANGE_TIMEOUT)
+    with _lock:
+        # Ce processus applique le changement tout de suite, sans relire le journal.
+        if _index is not None and _generation == generation - 1:
+            _index.apply(change)
+            _generation = generation
+
+
+def enregistrer(instance):
+    # Publié à la validation : un enregistrement annulé ne laisse pas de slug fantôme.
+    if instance.slug:
+        change = ('set', instance.slug, MODEL_KINDS[type(instance)], instance.id)
+        transaction.on_commit(lambda: _publish(change))
+
+
+def retirer(instance):
+    if instance.slug:
+        change = ('del', instance.slug, MODEL_KINDS[type(instance)], instance.id)
+        transaction.on_commit(lambda: _publish(change))
+
+
+def _lookup(slug):
+    """``(kind, id)`` of ``slug`` read from the tables, in one query."""
+    queries = [
+        model.objects.filter(slug=slug).annotate(kind=Value(kind)).values_list('kind', 'id')
+        for kind, model in KINDS
+    ]
+    rows = list(queries[0].union(*queries[1:], all=True))
+    return min(rows, key=lambda row: PRIORITY[row[0]]) if rows else None
+
+
+def resolve(slug):
+    """``(kind, id)`` of the object published under ``slug``, or None.
+
+    Known slugs cost no query. A slug the index misses (written by another
+    process since its snapshot, or without signal) is looked up by slug in
+    the tables and added to this process's index only.
+    """
+    index = get_index()
+    resolved = index.get(slug)
+    if resolved is None:
+        resolved = _lookup(slug)
+        if resolved is not None:
+            with _lock:
+                index.set(slug, *resolved)
+    return resolved
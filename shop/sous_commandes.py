@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Coalesce
+
+from customer.models import ProduitPanier
+from . import models
+
+
+def _agregats(lignes):
+    # Prix figé à la validation ; prix catalogue pour les lignes antérieures à prix_paye.
+    # Les codes promo s'appliquent au total de la commande, pas aux sous-totaux.
+    return lignes.values(
+        'commande_id', 'produit__etablissement_id', 'commande__customer_id', 'commande__status', 'commande__date_add',
+    ).annotate(
+        total=Sum(F('quantite') * Coalesce('prix_paye', 'produit__prix'), output_field=FloatField()),
+        articles=Sum('quantite'),
+    ).order_by()
+
+
+def _sous_commande(row):
+    return models.SousCommande(
+        commande_id=row['commande_id'],
+        etablissement_id=row['produit__etablissement_id'],
+        customer_id=row['commande__customer_id'],
+        sous_total=row['total'] or 0,
+        nb_articles=row['articles'] or 0,
+        status=row['commande__status'],
+        date_add=row['commande__date_add'],
+    )
+
+
+def ecrire(commande, etablissement_ids=None):
+    """(Re)write the sub-orders of ``commande`` (or only these establishments) from its lines."""
+    lignes = ProduitPanier.objects.filter(commande=commande)
+    existantes = models.SousCommande.objects.filter(commande=commande)
+    if etablissement_ids is not None:
+        lignes = lignes.filter(produit__etablissement_id__in=etablissement_ids)
+        existantes = existantes.filter(etablissement_id__in=etablissement_ids)
+    with transaction.atomic():
+        existantes.delete()
+        models.SousCommande.objects.bulk_create([_sous_commande(row) for row in _agregats(lignes)])
+
+
+def synchroniser(commande):
+    """Copy the status of ``commande`` onto its sub-orders (one UPDATE, nothing when unchanged)."""
+    models.SousCommande.objects.filter(commande=commande).exclude(status=commande.status).update(status=commande.status)
+
+
+def reconstruire(batch_size=1000):
+    """Rebuild every sub-order from the order lines; returns the number written."""
+    lignes = ProduitPanier.objects.filter(commande__isnull=False)
+    with transaction.atomic():
+        models.SousCommande.objects.all().delete()
+        rows = [_sous_commande(row) for row in _agregats(lignes).iterator()]
+        models.SousCommande.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
@@ -0,0 +1,90 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from . import models
+
+
+def _bornes(jour):
+    """Start and end (aware) of ``jour`` in the current time zone, so the filter uses the date index."""
+    debut = timezone.make_aware(datetime.combine(jour, time.min))
+    return debut, debut + timedelta(days=1)
+
+
+def _agregats(sous_commandes):
+    # Une sous-commande par commande et établissement : plus de DISTINCT sur les commandes.
+    return sous_commandes.values('etablissement_id', 'jour').annotate(
+        nb_commandes=Count('id'),
+        total_quantite=Sum('nb_articles'),
+        total_ca=Sum('sous_total'),
+        total_clients=Count('customer_id', distinct=True),
+    ).order_by()
+
+
+def _statistique(row):
+    return models.StatistiqueJour(
+        etablissement_id=row['etablissement_id'],
+        jour=row['jour'],
+        nb_commandes=row['nb_commandes'],
+        quantite=row['total_quantite'] or 0,
+        chiffre_affaires=row['total_ca'] or 0,
+        nb_clients=row['total_clients'],
+    )
+
+
+def rafraichir(etablissement_ids, jour):
+    """Recompute the rows of ``jour`` for these establishments from that day's sub-orders only.
+
+    Distinct customers cannot be maintained with ``F() + 1``: recounting
+    one establishment-day is bounded and stays exact whatever the history
+    size. Sub-orders must be written first (shop.sous_commandes).
+    """
+    etablissement_ids = set(etablissement_ids)
+    if not etablissement_ids:
+        return
+    debut, fin = _bornes(jour)
+    sous_commandes = models.SousCommande.objects.filter(
+        etablissement_id__in=etablissement_ids,
+        date_add__gte=debut,
+        date_add__lt=fin,
+    ).annotate(jour=TruncDate('date_add'))
+    with transaction.atomic():
+        models.StatistiqueJour.objects.filter(etablissement_id__in=etablissement_ids, jour=jour).delete()
+        models.StatistiqueJour.objects.bulk_create([_statistique(row) for row in _agregats(sous_commandes)])
+
+
+def commande_finalisee(commande):
+    """Update the stats of every establishment sold in ``commande``."""
+    ids = models.SousCommande.objects.filter(commande=commande).values_list('etablissement_id', flat=True)
+    rafraichir(ids, timezone.localdate(commande.date_add))
+
+
+def reconstruire(etablissement_ids=None, batch_size=1000):
+    """Rebuild the whole table (or these establishments) from the sub-orders."""
+    sous_commandes = models.SousCommande.objects.annotate(jour=TruncDate('date_add'))
+    stats = models.StatistiqueJour.objects.all()
+    if etablissement_ids:
+        sous_commandes = sous_commandes.filter(etablissement_id__in=etablissement_ids)
+        stats = stats.filter(etablissement_id__in=etablissement_ids)
+    with transaction.atomic():
+        stats.delete()
+        rows = [_statistique(row) for row in _agregats(sous_commandes).iterator()]
+        models.StatistiqueJour.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def resume(etablissement, jour=None):
+    """Dashboard figures: today's orders and lifetime totals, from the aggregated rows."""
+    jour = jour or timezone.localdate()
+    stats = models.StatistiqueJour.objects.filter(etablissement=etablissement)
+    totaux = stats.aggregate(
+        total_commandes=Coalesce(Sum('nb_commandes'), 0),
+        articles_vendus=Coalesce(Sum('quantite'), 0),
+        chiffre_affaires=Coalesce(Sum('chiffre_affaires'), 0.0),
+    )
+    aujourdhui = stats.filter(jour=jour).values_list('nb_commandes', 'nb_clients').first() or (0, 0)
+    totaux['commandes_aujourdhui'], totaux['clients_aujourdhui'] = aujourdhui
+    return totaux
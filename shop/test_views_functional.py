@@ -2,7 +2,8 @@
 Tests fonctionnels pour les vues de l'application shop
 """
 import json
-from django.test import TestCase, Client
+import re
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.contrib.sessions.models import Session
@@ -78,6 +79,37 @@ class ShopViewTests(TestCase):
         self.assertIn(self.produit, response.context['produits'])
         self.assertNotIn(produit_inactive, response.context['produits'])
 
+    @override_settings(SHOP_PAGE_SIZE=2)
+    def test_shop_keyset_pagination_and_fragments(self):
+        """Test la pagination par curseur et le fragment « Voir plus »"""
+        for i in range(4):
+            Produit.objects.create(
+                nom=f"Produit {i}",
+                description="Test",
+                description_deal="Deal",
+                prix=500,
+                categorie=self.categorie_produit,
+                etablissement=self.etablissement,
+            )
+        response = self.client.get(reverse('shop'))
+        page = response.context['produits']
+        self.assertEqual(len(page), 2)
+        self.assertTrue(page.has_next)
+
+        vus = [p.id for p in page]
+        cursor = page.next_cursor
+        while cursor:
+            data = self.client.get(reverse('shop'), {'fragment': 1, 'apres': cursor}).json()
+            self.assertIn('single-feature', data['grid'])
+            cursor = data['next']
+            vus += [int(pk) for pk in re.findall(r'data-produit="(\d+)"', data['grid'])]
+        self.assertEqual(sorted(vus), sorted(Produit.objects.values_list('id', flat=True)))
+
+    def test_shop_invalid_cursor(self):
+        """Test qu'un curseur invalide ne casse pas la page"""
+        self.assertEqual(self.client.get(reverse('shop'), {'apres': 'xx'}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('shop'), {'apres': 'xx', 'fragment': 1}).status_code, 400)
+
 
 class ProductDetailViewTests(TestCase):
     """Tests fonctionnels pour la vue product_detail"""
@@ -402,3 +434,34 @@ class PostPaiementDetailsViewTests(TestCase):
         # Vérifier que le panier a été supprimé
         self.assertFalse(Panier.objects.filter(id=self.panier.id).exists())
 
+    def _post_paiement(self, transaction_id='TXN123456'):
+        return self.client.post(
+            reverse('paiement_detail'),
+            data=json.dumps({
+                'transaction_id': transaction_id,
+                'notify_url': 'http://example.com/notify',
+                'return_url': 'http://example.com/return',
+                'panier': self.panier.id
+            }),
+            content_type='application/json'
+        )
+
+    def test_post_paiement_details_duplicate_callback_is_noop(self):
+        """Test qu'un callback rejoué ne crée pas une seconde commande"""
+        self.client.login(username="testuser", password="testpass123")
+        self._post_paiement()
+        response = self._post_paiement()
+        self.assertTrue(json.loads(response.content)['success'])
+        self.assertEqual(Commande.objects.filter(transaction_id='TXN123456').count(), 1)
+
+    def test_post_paiement_details_snapshots_line_prices(self):
+        """Test que le prix payé est figé sur les lignes de la commande"""
+        self.client.login(username="testuser", password="testpass123")
+        self._post_paiement()
+        self.produit.prix = 5000
+        self.produit.save()
+        ligne = ProduitPanier.objects.get(id=self.produit_panier.id)
+        self.assertIsNone(ligne.panier_id)
+        self.assertEqual(ligne.prix_paye, 1000)
+        self.assertEqual(ligne.total, 2000)
+        self.assertEqual(ProduitPanier.objects.avec_montant().get(id=ligne.id).montant, 2000)
@@ -1,8 +1,31 @@
-from django.test import TestCase
+from django.http import QueryDict
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
-from datetime import date
+from datetime import date, timedelta
+from xml.etree import ElementTree
+import csv
+import io
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
 
-from .models import CategorieEtablissement, CategorieProduit, Etablissement, Produit
+from PIL import Image
+
+from base import images
+from customer import cart as customer_cart
+from customer.models import Commande, Customer, Panier, ProduitPanier
+
+from . import commandes_recues, exports, facets, import_produits, models, search, slugs, sous_commandes, statistiques
+from .models import CategorieEtablissement, CategorieProduit, City, Etablissement, Produit
+from .pagination import KeysetPage
 
 
 class ProduitModelTests(TestCase):
@@ -73,3 +96,708 @@ class ProduitModelTests(TestCase):
         )
 
         self.assertFalse(produit.check_promotion)
+
+
+class ProduitSearchTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username="merchant", password="pwd12345")
+        categorie_etab = CategorieEtablissement.objects.create(nom="Restaurant", description="Catégorie test")
+        self.categorie_produit = CategorieProduit.objects.create(
+            nom="Desserts", description="Desserts", categorie=categorie_etab,
+        )
+        self.etablissement = Etablissement.objects.create(
+            user=user,
+            nom="Chez Awa",
+            description="Etablissement de test",
+            logo="logo.png",
+            couverture="cover.png",
+            categorie=categorie_etab,
+            nom_du_responsable="Doe",
+            prenoms_duresponsable="John",
+            adresse="Abidjan",
+            pays="CI",
+            contact_1="0101010101",
+            email="test@example.com",
+        )
+
+    def _produit(self, nom, description="Description", status=True):
+        return Produit.objects.create(
+            nom=nom,
+            description=description,
+            description_deal="Deal",
+            prix=1000,
+            categorie=self.categorie_produit,
+            etablissement=self.etablissement,
+            status=status,
+        )
+
+    def test_accent_insensitive_prefix_search(self):
+        creme = self._produit("Crème brûlée")
+        self.assertEqual(search.search("creme brul"), [creme])
+        self.assertEqual(search.search("CRÈME"), [creme])
+
+    def test_name_ranks_before_description(self):
+        dans_description = self._produit("Tarte", description="Servie avec un burger")
+        dans_nom = self._produit("Burger maison")
+        self.assertEqual(search.search("burger"), [dans_nom, dans_description])
+
+    def test_index_follows_updates_and_deletes(self):
+        produit = self._produit("Pizza")
+        produit.nom = "Calzone"
+        produit.save()
+        self.assertEqual(search.search("pizza"), [])
+        self.assertEqual(search.search("calzone"), [produit])
+        produit.delete()
+        self.assertEqual(search.search("calzone"), [])
+
+    def test_category_and_establishment_names_are_indexed(self):
+        produit = self._produit("Tiramisu")
+        self.assertEqual(search.search("awa"), [produit])
+        self.etablissement.nom = "Chez Koffi"
+        self.etablissement.save()
+        self.assertEqual(search.search("koffi"), [produit])
+
+    def test_inactive_products_only_for_merchant(self):
+        produit = self._produit("Glace", status=False)
+        self.assertEqual(search.search("glace"), [])
+        self.assertEqual(search.search_ids("glace", etablissement_id=self.etablissement.id, actifs=False), [produit.id])
+
+    def test_search_endpoint(self):
+        produit = self._produit("Crêpe")
+        response = self.client.get(reverse('recherche'), {'q': 'crepe', 'format': 'json'})
+        self.assertEqual([r['id'] for r in response.json()['results']], [produit.id])
+        response = self.client.get(reverse('recherche'), {'q': 'crepe'})
+        self.assertEqual(response.context['produits'], [produit])
+
+
+class FacetTests(TestCase):
+
+    def setUp(self):
+        categorie_etab = CategorieEtablissement.objects.create(nom="Restaurant", description="Catégorie test")
+        self.plats = CategorieProduit.objects.create(nom="Plats", description="Plats", categorie=categorie_etab)
+        self.desserts = CategorieProduit.objects.create(nom="Desserts", description="Desserts", categorie=categorie_etab)
+        self.abidjan = City.objects.create(name="Abidjan")
+        self.etablissements = []
+        for username, ville in (("awa", self.abidjan), ("koffi", None)):
+            self.etablissements.append(Etablissement.objects.create(
+                user=User.objects.create_user(username=username, password="pwd12345"),
+                nom=f"Chez {username}",
+                description="Etablissement de test",
+                logo="logo.png",
+                couverture="cover.png",
+                categorie=categorie_etab,
+                nom_du_responsable="Doe",
+                prenoms_duresponsable="John",
+                adresse="Abidjan",
+                pays="CI",
+                contact_1="0101010101",
+                email="test@example.com",
+                ville=ville,
+            ))
+        today = date.today()
+        self._produit(self.plats, self.etablissements[0], 1500)
+        self._produit(self.plats, self.etablissements[1], 8000)
+        self._produit(self.desserts, self.etablissements[0], 3000,
+                      prix_promotionnel=1000, date_debut_promo=today, date_fin_promo=today)
+
+    def _produit(self, categorie, etablissement, prix, **kwargs):
+        return Produit.objects.create(
+            nom="Produit", description="Description", description_deal="Deal",
+            prix=prix, categorie=categorie, etablissement=etablissement, **kwargs
+        )
+
+    def _selection(self, query):
+        return facets.parse(QueryDict(query))
+
+    def test_counts_ignore_own_facet_filter(self):
+        total, counts = facets.counts(self._selection(f"categorie={self.plats.id}"))
+        self.assertEqual(total, 2)
+        # Les autres catégories restent comptées pour pouvoir élargir la sélection.
+        self.assertEqual(counts['categorie'], {str(self.plats.id): 2, str(self.desserts.id): 1})
+        self.assertEqual(counts['ville'], {str(self.abidjan.id): 1})
+        self.assertEqual(counts['prix'], {'0-2000': 1, '5000-10000': 1})
+
+    def test_effective_price_and_promo(self):
+        selection = self._selection("prix=0-2000&promo=oui")
+        total, _ = facets.counts(selection)
+        self.assertEqual(total, 1)
+        produits = facets.filter_queryset(Produit.objects.filter(status=True), selection)
+        self.assertEqual(list(produits.values_list('categorie_id', flat=True)), [self.desserts.id])
+
+    def test_sql_filter_matches_bitmap_count(self):
+        for query in ("", f"ville={self.abidjan.id}", f"etablissement={self.etablissements[0].id}&prix=2000-5000",
+                      "prix=0-2000&prix=5000-10000", "categorie=abc"):
+            selection = self._selection(query)
+            total, _ = facets.counts(selection)
+            self.assertEqual(facets.filter_queryset(Produit.objects.filter(status=True), selection).count(), total)
+
+    def test_counts_follow_product_changes(self):
+        self.assertEqual(facets.counts({})[0], 3)
+        self._produit(self.desserts, self.etablissements[1], 500)
+        self.assertEqual(facets.counts({})[0], 4)
+
+    def test_shop_view_exposes_facets(self):
+        response = self.client.get(reverse('shop'), {'categorie': self.desserts.id})
+        self.assertEqual(response.context['nb_resultats'], 1)
+        self.assertEqual(len(response.context['produits']), 1)
+        self.assertIn('categorie', [f['name'] for f in response.context['facettes']])
+
+    def test_avec_prix_sorts_on_effective_price(self):
+        produits = Produit.objects.filter(status=True).avec_prix().order_by('effective_price')
+        self.assertEqual([p.effective_price for p in produits], [1000, 1500, 8000])
+        self.assertEqual([p.check_promotion for p in produits], [True, False, False])
+
+    def test_promotion_ended_overnight_is_computed_per_row(self):
+        hier = date.today() - timedelta(days=1)
+        # Fin de promotion passée pendant la nuit, avant la tâche : seule la ligne concernée est recalculée
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE shop_produit SET date_fin_promo = %s WHERE prix = 3000", [hier])
+        self.assertEqual(Produit.objects.avec_prix().get(prix=3000).effective_price, 3000)
+        self.assertEqual(Produit.objects.avec_prix().filter(promo_active=True).count(), 0)
+        self.assertEqual(Produit.objects.materialiser(), 1)
+        produit = Produit.objects.get(prix=3000)
+        self.assertEqual((produit.en_promo, produit.prix_actuel), (False, 3000))
+
+    def test_writes_without_save_keep_columns_in_sync(self):
+        # Une ligne en promotion, une sans
+        ids = list(Produit.objects.filter(prix__in=(3000, 8000)).values_list('id', flat=True))
+        Produit.objects.filter(id__in=ids).update(prix=9000)
+        Produit.objects.filter(id__in=ids, prix_promotionnel__gt=0).update(prix_promotionnel=100)
+        produits = list(Produit.objects.filter(id__in=ids).order_by('id'))
+        produits[0].date_fin_promo = date.today() - timedelta(days=1)
+        Produit.objects.bulk_update(produits, ['date_fin_promo'])
+        with self.assertNumQueries(1):
+            Produit.objects.filter(id__in=ids).update(status=True)
+        self.assertEqual(Produit.objects.materialiser(), 0)
+        self.assertEqual(
+            sorted(Produit.objects.filter(id__in=ids).values_list('prix_actuel', flat=True)),
+            sorted(p.prix_promotionnel if p.en_promo else p.prix for p in produits),
+        )
+
+    @override_settings(SHOP_PAGE_SIZE=2)
+    def test_shop_sorted_by_price_across_pages(self):
+        response = self.client.get(reverse('shop'), {'tri': 'prix-desc'})
+        prix = [p.effective_price for p in response.context['produits']]
+        data = self.client.get(reverse('shop'), {
+            'tri': 'prix-desc', 'fragment': 1, 'apres': response.context['produits'].next_cursor,
+        }).json()
+        self.assertEqual(prix, [8000, 1500])
+        self.assertIn('data-produit', data['grid'])
+        self.assertIsNone(data['next'])
+
+
+class SlugIndexTests(TestCase):
+
+    def setUp(self):
+        self.restaurant = CategorieEtablissement.objects.create(nom="Restaurant", description="Test")
+        self.plats = CategorieProduit.objects.create(nom="Plats", description="Plats", categorie=self.restaurant)
+        self.etablissement = Etablissement.objects.create(
+            user=User.objects.create_user(username="awa", password="pwd12345"),
+            nom="Chez Awa", description="Etablissement de test", logo="logo.png", couverture="cover.png",
+            categorie=self.restaurant, nom_du_responsable="Doe", prenoms_duresponsable="John",
+            adresse="Abidjan", pays="CI", contact_1="0101010101", email="test@example.com",
+        )
+        self.produit = Produit.objects.create(
+            nom="Garba", description="Description", description_deal="Deal", prix=1500,
+            categorie=self.plats, etablissement=self.etablissement,
+        )
+
+    def test_resolve_every_public_slug(self):
+        self.assertEqual(slugs.resolve(self.plats.slug), ('categorie_produit', self.plats.id))
+        self.assertEqual(slugs.resolve(self.restaurant.slug), ('categorie_etablissement', self.restaurant.id))
+        self.assertEqual(slugs.resolve(self.etablissement.slug), ('etablissement', self.etablissement.id))
+        self.assertEqual(slugs.resolve(self.produit.slug), ('produit', self.produit.id))
+        self.assertIsNone(slugs.resolve("inconnu"))
+
+    def test_index_follows_saves_and_deletes_without_rebuild(self):
+        slugs.resolve(self.plats.slug)
+        with mock.patch.object(slugs.SlugIndex, 'build', side_effect=AssertionError("rebuild")):
+            with self.captureOnCommitCallbacks(execute=True):
+                desserts = CategorieProduit.objects.create(nom="Desserts", description="Desserts", categorie=self.restaurant)
+            with self.assertNumQueries(0):
+                self.assertEqual(slugs.resolve(desserts.slug), ('categorie_produit', desserts.id))
+            slug = desserts.slug
+            with self.captureOnCommitCallbacks(execute=True):
+                desserts.delete()
+            self.assertIsNone(slugs.resolve(slug))
+
+    def test_other_process_replays_change_log(self):
+        slugs.resolve(self.plats.slug)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produit.save()
+        with mock.patch.object(slugs, '_index', slugs.SlugIndex()), \
+                mock.patch.object(slugs, '_generation', slugs._generation - 1), self.assertNumQueries(0):
+            # Index d'un autre processus en retard d'un changement : rejoue le dernier slug publié
+            self.assertEqual(slugs.resolve(self.produit.slug), ('produit', self.produit.id))
+
+    def test_rolled_back_save_is_not_published(self):
+        slugs.resolve(self.plats.slug)
+        generation = slugs._generation
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                desserts = CategorieProduit.objects.create(nom="Desserts", description="Desserts", categorie=self.restaurant)
+                transaction.set_rollback(True)
+        self.assertEqual(slugs._generation, generation)
+        self.assertIsNone(slugs.resolve(desserts.slug))
+
+    def test_stale_snapshot_falls_back_to_table(self):
+        slugs.resolve(self.plats.slug)
+        # Instantané d'un autre processus pris avant la création du produit
+        with mock.patch.object(slugs, '_index', slugs.SlugIndex()):
+            with self.assertNumQueries(1):
+                self.assertEqual(slugs.resolve(self.produit.slug), ('produit', self.produit.id))
+            with self.assertNumQueries(0):
+                self.assertEqual(slugs.resolve(self.produit.slug), ('produit', self.produit.id))
+            self.assertRedirects(self.client.get(reverse('categorie', args=[self.produit.slug])),
+                                 reverse('product_detail', args=[self.produit.slug]))
+        self.assertEqual(slugs._lookup(self.plats.slug), ('categorie_produit', self.plats.id))
+
+    def test_single_view_resolves_slug(self):
+        response = self.client.get(reverse('categorie', args=[self.plats.slug]))
+        self.assertEqual(response.context['categorie'], self.plats)
+        self.assertEqual(len(response.context['produits']), 1)
+        self.assertRedirects(self.client.get(reverse('categorie', args=[self.produit.slug])),
+                             reverse('product_detail', args=[self.produit.slug]))
+        self.assertRedirects(self.client.get(reverse('categorie', args=["inconnu"])), reverse('shop'))
+
+
+class FicheProduitTests(TestCase):
+
+    def setUp(self):
+        self.restaurant = CategorieEtablissement.objects.create(nom="Restaurant", description="Test")
+        self.plats = CategorieProduit.objects.create(nom="Plats", description="Plats", categorie=self.restaurant)
+        self.user = User.objects.create_user(username="awa", password="pwd12345")
+        self.etablissement = Etablissement.objects.create(
+            user=self.user,
+            nom="Chez Awa", description="Etablissement de test", logo="logo.png", couverture="cover.png",
+            categorie=self.restaurant, nom_du_responsable="Doe", prenoms_duresponsable="John",
+            adresse="Abidjan", pays="CI", contact_1="0101010101", email="test@example.com",
+        )
+        self.produit = Produit.objects.create(
+            nom="Garba", description="Description", description_deal="Deal", prix=1500,
+            categorie=self.plats, etablissement=self.etablissement,
+        )
+        self.url = reverse('product_detail', args=[self.produit.slug])
+
+    def test_cached_page_does_not_query_products(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, "Garba")
+        self.assertFalse([q['sql'] for q in queries if 'shop_produit' in q['sql']])
+
+    def test_product_and_establishment_saves_refresh_page(self):
+        self.client.get(self.url)
+        self.produit.nom = "Garba complet"
+        self.produit.save()
+        self.assertContains(self.client.get(self.url), "Garba complet")
+        self.etablissement.description = "Nouvelle description"
+        self.etablissement.save()
+        self.assertContains(self.client.get(self.url), "Nouvelle description")
+
+    def test_favorite_overlay_is_per_user(self):
+        self.client.get(self.url)
+        self.client.login(username="awa", password="pwd12345")
+        models.Favorite.objects.create(user=self.user, produit=self.produit)
+        self.assertContains(self.client.get(self.url), "zmdi-favorite\"")
+        self.client.logout()
+        self.assertNotContains(self.client.get(self.url), "zmdi-favorite\"")
+
+    def test_save_only_drops_own_page(self):
+        voisin = Produit.objects.create(
+            nom="Alloco", description="Description", description_deal="Deal", prix=1000,
+            categorie=self.plats, etablissement=self.etablissement,
+        )
+        autre = Etablissement.objects.create(
+            user=User.objects.create_user(username="ama", password="pwd12345"),
+            nom="Chez Ama", description="Autre", logo="logo.png", couverture="cover.png",
+            categorie=self.restaurant, nom_du_responsable="Doe", prenoms_duresponsable="Jane",
+            adresse="Abidjan", pays="CI", contact_1="0101010101", email="ama@example.com",
+        )
+        url_voisin = reverse('product_detail', args=[voisin.slug])
+        self.client.get(self.url)
+        self.client.get(url_voisin)
+        self.produit.nom = "Garba complet"
+        self.produit.save()
+        autre.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url_voisin)
+        # Le menu des catégories (nav_cache) suit l'établissement ; la fiche du voisin reste en cache
+        self.assertFalse([q['sql'] for q in queries if 'FROM "shop_produit"' in q['sql']])
+        self.assertContains(self.client.get(self.url), "Garba complet")
+
+    def test_page_lookup_does_not_write_slug_log(self):
+        cache.clear()
+        with mock.patch.object(slugs, '_publish', side_effect=AssertionError("journal")), \
+                self.captureOnCommitCallbacks() as callbacks:
+            self.assertContains(self.client.get(self.url), "Garba")
+            self.assertEqual(self.client.get(reverse('product_detail', args=["inconnu"])).status_code, 404)
+        self.assertEqual(callbacks, [])
+
+
+class CommandesMixin:
+    """Deux établissements avec un plat chacun, deux clients ; commandes passées par le checkout."""
+
+    def setUp(self):
+        restaurant = CategorieEtablissement.objects.create(nom="Restaurant", description="Test")
+        plats = CategorieProduit.objects.create(nom="Plats", description="Plats", categorie=restaurant)
+        self.produits = []
+        for username, prix in (("awa", 1000), ("koffi", 2500)):
+            etablissement = Etablissement.objects.create(
+                user=User.objects.create_user(username=username, password="pwd12345"),
+                nom=f"Chez {username}", description="Etablissement de test", logo="logo.png",
+                couverture="cover.png", categorie=restaurant, nom_du_responsable="Doe",
+                prenoms_duresponsable="John", adresse="Abidjan", pays="CI", contact_1="0101010101",
+                email="test@example.com",
+            )
+            self.produits.append(Produit.objects.create(
+                nom="Plat", description="Description", description_deal="Deal", prix=prix,
+                categorie=plats, etablissement=etablissement,
+            ))
+        self.customers = [
+            Customer.objects.create(user=User.objects.create_user(username=f"client{i}", password="pwd12345",
+                                                                  first_name=prenom),
+                                    adresse="Rue", contact_1="0101010101")
+            for i, prenom in enumerate(("Mariam", "Yao"))
+        ]
+
+    def _commander(self, customer, transaction_id, *lignes):
+        panier = Panier.objects.create(customer=customer)
+        for produit, quantite in lignes:
+            ProduitPanier.objects.create(produit=produit, panier=panier, quantite=quantite)
+        return customer_cart.checkout(customer, panier.id, transaction_id)[0]
+
+
+class StatistiquesTests(CommandesMixin, TestCase):
+
+    def _stats(self):
+        return sorted(models.StatistiqueJour.objects.values_list(
+            'etablissement_id', 'nb_commandes', 'quantite', 'chiffre_affaires', 'nb_clients'))
+
+    def test_checkout_updates_daily_rows(self):
+        awa, koffi = self.produits
+        self._commander(self.customers[0], "TXN-1", (awa, 2), (koffi, 1))
+        self._commander(self.customers[0], "TXN-2", (awa, 1))
+        self._commander(self.customers[1], "TXN-3", (awa, 1))
+        self.assertEqual(self._stats(), [
+            (awa.etablissement_id, 3, 4, 4000.0, 2),
+            (koffi.etablissement_id, 1, 1, 2500.0, 1),
+        ])
+
+    def test_deleted_order_leaves_daily_rows(self):
+        awa, koffi = self.produits
+        self._commander(self.customers[0], "TXN-1", (awa, 2))
+        commande = self._commander(self.customers[1], "TXN-2", (awa, 1), (koffi, 1))
+        commande.delete()
+        self.assertEqual(self._stats(), [(awa.etablissement_id, 1, 2, 2000.0, 1)])
+        # Suppression en cascade depuis le client
+        self.customers[0].delete()
+        self.assertEqual(self._stats(), [])
+
+    def test_rebuild_matches_incremental_rows(self):
+        awa, koffi = self.produits
+        self._commander(self.customers[0], "TXN-1", (awa, 2), (koffi, 1))
+        # Ligne ajoutée hors checkout : le signal met aussi la journée à jour
+        commande = Commande.objects.create(customer=self.customers[1], prix_total=2500, transaction_id="TXN-2")
+        ProduitPanier.objects.create(produit=koffi, commande=commande, quantite=1)
+        incremental = self._stats()
+        self.assertEqual(statistiques.reconstruire(), 2)
+        self.assertEqual(self._stats(), incremental)
+
+    def test_dashboard_reads_aggregated_rows(self):
+        awa, _ = self.produits
+        self._commander(self.customers[0], "TXN-1", (awa, 3))
+        self.client.login(username="awa", password="pwd12345")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_commandes'], 1)
+        self.assertEqual(response.context['commandes_aujourdhui'], 1)
+        self.assertEqual(response.context['chiffre_affaires'], 3000)
+        self.assertEqual(len(response.context['dernieres_commandes']), 1)
+        self.assertFalse([q['sql'] for q in queries if 'COUNT(DISTINCT' in q['sql']])
+
+
+class SousCommandeTests(CommandesMixin, TestCase):
+
+    def test_checkout_writes_one_row_per_establishment(self):
+        awa, koffi = self.produits
+        commande = self._commander(self.customers[0], "TXN-1", (awa, 2), (awa, 1), (koffi, 1))
+        self.assertEqual(sorted(commande.sous_commandes.values_list(
+            'etablissement_id', 'sous_total', 'nb_articles', 'customer_id', 'status')), [
+            (awa.etablissement_id, 3000.0, 3, self.customers[0].id, True),
+            (koffi.etablissement_id, 2500.0, 1, self.customers[0].id, True),
+        ])
+
+    def test_lines_and_status_changes_are_copied(self):
+        awa, koffi = self.produits
+        commande = self._commander(self.customers[0], "TXN-1", (awa, 1))
+        ProduitPanier.objects.create(produit=koffi, commande=commande, quantite=2, prix_paye=2000)
+        commande.status = False
+        commande.save()
+        self.assertEqual(sorted(commande.sous_commandes.values_list('etablissement_id', 'sous_total', 'status')), [
+            (awa.etablissement_id, 1000.0, False),
+            (koffi.etablissement_id, 4000.0, False),
+        ])
+        rows = sorted(commande.sous_commandes.values_list('etablissement_id', 'sous_total', 'nb_articles'))
+        self.assertEqual(sous_commandes.reconstruire(), 2)
+        self.assertEqual(sorted(commande.sous_commandes.values_list('etablissement_id', 'sous_total', 'nb_articles')), rows)
+
+    def test_detail_shows_only_merchant_lines(self):
+        awa, koffi = self.produits
+        commande = self._commander(self.customers[0], "TXN-1", (awa, 1), (awa, 2), (koffi, 1))
+        self.client.login(username="awa", password="pwd12345")
+        response = self.client.get(reverse('commande-reçu-detail', args=[commande.id]))
+        self.assertEqual({ligne.produit_id for ligne in response.context['lignes']}, {awa.id})
+        self.assertEqual(response.context['sous_commande'].sous_total, 3000)
+
+        autre = self._commander(self.customers[1], "TXN-2", (koffi, 1))
+        response = self.client.get(reverse('commande-reçu-detail', args=[autre.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_detail_keeps_free_lines_at_zero(self):
+        awa, _ = self.produits
+        commande = self._commander(self.customers[0], "TXN-1", (awa, 1))
+        commande.produit_commande.update(prix_paye=0)
+        self.client.login(username="awa", password="pwd12345")
+        response = self.client.get(reverse('commande-reçu-detail', args=[commande.id]))
+        self.assertContains(response, "<td>0,0€</td>", count=2)
+        self.assertNotContains(response, "<td>1000,0€</td>")
+
+
+class CommandesRecuesTests(CommandesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def _inbox(self, **params):
+        self.client.login(username="awa", password="pwd12345")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('commande-reçu'), params)
+        self.assertFalse([q['sql'] for q in queries if 'DISTINCT' in q['sql']])
+        return response
+
+    def test_lists_merchant_orders_once(self):
+        awa, koffi = self.produits
+        premiere = self._commander(self.customers[0], "TXN-1", (awa, 1), (awa, 2), (koffi, 1))
+        self._commander(self.customers[1], "TXN-2", (koffi, 1))
+        response = self._inbox()
+        self.assertEqual([c.commande_id for c in response.context['commandes']], [premiere.id])
+        self.assertEqual(response.context['commandes'].items[0].premier_produit, "Plat")
+        # Sans filtre ou par date seulement, le total est la somme exacte des statistiques du jour
+        self.assertEqual((response.context['total'], response.context['total_approximatif']), (1, False))
+        etablissement = awa.etablissement
+        today = timezone.localdate()
+        with self.assertNumQueries(1):
+            self.assertEqual(commandes_recues.total(etablissement, {'date_min': today}, None), (1, False))
+        self.assertEqual(commandes_recues.total(etablissement, {'date_max': today - timedelta(days=1)}, None), (0, False))
+        # Le statut n'est pas dans les statistiques : compté puis mis en cache
+        attente = commandes_recues.commandes(etablissement, {'status': 'attente'})
+        self.assertEqual(commandes_recues.total(etablissement, {'status': 'attente'}, attente), (0, True))
+        with self.assertNumQueries(0):
+            commandes_recues.total(etablissement, {'status': 'attente'}, attente)
+
+    def test_filters(self):
+        awa, _ = self.produits
+        mariam = self._commander(self.customers[0], "TXN-1", (awa, 1))
+        yao = self._commander(self.customers[1], "TXN-2", (awa, 1))
+        yao.status = False
+        yao.save()
+        today = timezone.localdate().isoformat()
+
+        def ids(**params):
+            return [c.commande_id for c in self._inbox(**params).context['commandes']]
+
+        self.assertEqual(ids(client="mari"), [mariam.id])
+        self.assertEqual(ids(status="attente"), [yao.id])
+        self.assertEqual(ids(produit="plat", status="payée"), [mariam.id])
+        self.assertEqual(ids(produit="burger"), [])
+        # date_max inclut toute la journée ; une date illisible est ignorée
+        self.assertEqual(ids(date_min=today, date_max=today), [yao.id, mariam.id])
+        self.assertEqual(ids(date_max="hier"), [yao.id, mariam.id])
+        self.assertEqual(ids(date_max=(timezone.localdate() - timedelta(days=1)).isoformat()), [])
+
+    def test_keyset_pages_and_cached_total(self):
+        awa, _ = self.produits
+        commandes = [self._commander(self.customers[0], f"TXN-{i}", (awa, 1)) for i in range(3)]
+        etablissement = awa.etablissement
+        selection = commandes_recues.filtres(QueryDict('client=mariam'))
+        queryset = commandes_recues.commandes(etablissement, selection)
+        page = KeysetPage(queryset, per_page=2, ordering=commandes_recues.ORDERING)
+        suite = KeysetPage(queryset, page.next_cursor, per_page=2, ordering=commandes_recues.ORDERING)
+        self.assertEqual([c.commande_id for c in page] + [c.commande_id for c in suite],
+                         [c.id for c in reversed(commandes)])
+        self.assertFalse(suite.has_next)
+
+        self.assertEqual(commandes_recues.total(etablissement, selection, queryset), (3, True))
+        self._commander(self.customers[0], "TXN-3", (awa, 1))
+        with self.assertNumQueries(0):
+            self.assertEqual(commandes_recues.total(etablissement, selection, queryset), (3, True))
+
+
+class ExportCommandesTests(CommandesMixin, TestCase):
+
+    def _export(self, **params):
+        self.client.login(username="awa", password="pwd12345")
+        response = self.client.get(reverse('commande-reçu-export'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_honors_inbox_filters(self):
+        awa, koffi = self.produits
+        payee = self._commander(self.customers[0], "TXN-1", (awa, 2), (koffi, 1))
+        attente = self._commander(self.customers[1], "TXN-2", (awa, 1))
+        attente.status = False
+        attente.save()
+
+        rows = list(csv.reader(io.StringIO(self._export(format='csv').decode('utf-8-sig'))))
+        self.assertEqual(rows[0], list(exports.COLONNES))
+        self.assertEqual([row[0] for row in rows[1:]], [str(attente.id), str(payee.id)])
+        self.assertEqual(rows[2][2:], ["Mariam", "", "Payée", "2", "2000.0"])
+
+        rows = list(csv.reader(io.StringIO(self._export(status='attente').decode('utf-8-sig'))))
+        self.assertEqual([row[0] for row in rows[1:]], [str(attente.id)])
+
+    def test_csv_neutralizes_formulas(self):
+        awa, _ = self.produits
+        user = self.customers[0].user
+        user.first_name, user.last_name, user.email = '=HYPERLINK("http://x")', "-2+3", "@SUM(A1)"
+        user.save()
+        self._commander(self.customers[0], "TXN-1", (awa, 1))
+        rows = list(csv.reader(io.StringIO(self._export(format='csv').decode('utf-8-sig'))))
+        self.assertEqual(rows[1][2:4], ["'=HYPERLINK(\"http://x\") -2+3", "'@SUM(A1)"])
+
+    def test_xlsx_is_a_valid_workbook(self):
+        awa, _ = self.produits
+        commande = self._commander(self.customers[0], "TXN-1", (awa, 3))
+        with zipfile.ZipFile(io.BytesIO(self._export(format='xlsx'))) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        ns = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = sheet.findall('x:sheetData/x:row', ns)
+        self.assertEqual(len(rows), 2)
+        cells = rows[1].findall('x:c', ns)
+        self.assertEqual(cells[0].find('x:v', ns).text, str(commande.id))
+        self.assertEqual(cells[1].get('s'), "1")
+        self.assertEqual(cells[4].find('x:is/x:t', ns).text, "Payée")
+        self.assertEqual(float(cells[6].find('x:v', ns).text), 3000)
+
+    def test_rows_are_read_in_chunks(self):
+        awa, _ = self.produits
+        for i in range(3):
+            self._commander(self.customers[0], f"TXN-{i}", (awa, 1))
+        with override_settings(EXPORT_CHUNK_SIZE=2), CaptureQueriesContext(connection) as queries:
+            rows = list(exports.lignes(awa.etablissement, {}))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(queries), 1)
+
+
+class ImportProduitsTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media, IMAGE_DERIVATIVE_WIDTHS=(160,))
+        self.override.enable()
+        cache.clear()
+        restaurant = CategorieEtablissement.objects.create(nom="Restaurant", description="Test")
+        CategorieProduit.objects.create(nom="Plats", description="Plats", categorie=restaurant)
+        self.etablissement = Etablissement.objects.create(
+            user=User.objects.create_user(username="awa", password="pwd12345"),
+            nom="Chez Awa", description="Etablissement de test", logo="logo.png",
+            couverture="cover.png", categorie=restaurant, nom_du_responsable="Doe",
+            prenoms_duresponsable="John", adresse="Abidjan", pays="CI", contact_1="0101010101",
+            email="test@example.com",
+        )
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _zip(self, **fichiers):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as archive:
+            for name, data in fichiers.items():
+                archive.writestr('photos/' + name, data)
+        return SimpleUploadedFile('images.zip', buf.getvalue(), content_type='application/zip')
+
+    def _png(self):
+        buf = io.BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(buf, 'PNG')
+        return buf.getvalue()
+
+    def test_view_imports_valid_rows_and_reports_errors(self):
+        fichier = SimpleUploadedFile('produits.csv', (
+            "nom;description;prix;categorie;image\n"
+            "Garba géant;Poisson et attiéké;2500;plats;garba.png\n"
+            "Alloco;Bananes;deux mille;Plats;\n"
+            "Pizza;Margherita;5000;Desserts;\n"
+            "Burger;Boeuf;4000;Plats;absente.png\n"
+        ).encode('utf-8'), content_type='text/csv')
+        self.client.login(username="awa", password="pwd12345")
+        response = self.client.post(reverse('import-articles'), {
+            'fichier': fichier, 'images': self._zip(**{'garba.png': self._png(), 'notes.txt': b'texte'}),
+        })
+
+        self.assertEqual([ligne for ligne, _ in response.context['erreurs']], [3, 4, 5])
+        produit = Produit.objects.get()
+        self.assertEqual((produit.etablissement_id, produit.categorie_etab_id), (self.etablissement.id, self.etablissement.categorie_id))
+        self.assertEqual(produit.prix_actuel, 2500)
+        self.assertTrue(produit.slug.startswith("garba-geant-"))
+        self.assertTrue(produit.image.name.startswith("cas/"))
+        self.assertEqual(produit.image_2.name, "b-1.jpg")
+        self.assertTrue(default_storage.exists(images.derivative_name(produit.image.name, 160, 'webp')))
+        # bulk_create n'envoie pas de signal : index de recherche et des slugs mis à jour par l'import
+        self.assertEqual(search.search_ids("garba"), [produit.id])
+        self.assertEqual(slugs.resolve(produit.slug), ('produit', produit.id))
+
+    def test_batches_slugs_and_promotions(self):
+        today = date.today()
+        fichier = io.BytesIO((
+            "nom,description,prix,prix_promotionnel,date_debut_promo,date_fin_promo,categorie\n"
+            "Menu,Midi,3000,2000,%s,%s,Plats\n"
+            "Menu,Soir,3500,,,,Plats\n"
+            "Menu,Nuit,4000,,,,Plats\n" % (today - timedelta(days=1), today + timedelta(days=1))
+        ).encode('utf-8'))
+        with CaptureQueriesContext(connection) as queries:
+            produits, erreurs = import_produits.importer(self.etablissement, fichier, batch_size=2)
+        self.assertEqual(erreurs, [])
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "shop_produit"')]), 2)
+        self.assertEqual(len({produit.slug for produit in produits}), 3)
+        promo = Produit.objects.get(description="Midi")
+        self.assertEqual((promo.en_promo, promo.prix_actuel), (True, 2000))
+        self.assertEqual(Produit.objects.avec_prix().get(description="Soir").effective_price, 3500)
+
+    def test_unreadable_file_imports_nothing(self):
+        with self.assertRaises(import_produits.ImportInvalide):
+            import_produits.importer(self.etablissement, io.BytesIO(b"nom,prix\nMenu,3000\n"))
+        with self.assertRaises(import_produits.ImportInvalide):
+            import_produits.importer(
+                self.etablissement, io.BytesIO(b"nom,description,prix,categorie\n"), io.BytesIO(b"pas un zip"),
+            )
+        # Ni UTF-8 ni Windows-1252 (0x81 n'y est pas défini)
+        with self.assertRaises(import_produits.ImportInvalide):
+            import_produits.importer(self.etablissement, io.BytesIO(b"nom,description,prix,categorie\n\x81,a,1,Plats\n"))
+        self.assertFalse(Produit.objects.exists())
+
+    def test_oversized_images_are_reported_per_row(self):
+        fichier = io.BytesIO(b"nom,description,prix,categorie,image\nGarba,Poisson,2500,Plats,garba.png\n")
+        # Limite du site, puis celle de Pillow (DecompressionBombError à l'ouverture)
+        reglages = (override_settings(IMAGE_MAX_PIXELS=100 * 100), mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000))
+        for reglage in reglages:
+            with self.subTest(reglage=reglage), reglage:
+                fichier.seek(0)
+                produits, erreurs = import_produits.importer(
+                    self.etablissement, fichier, self._zip(**{'garba.png': self._png()}),
+                )
+                self.assertEqual(produits, [])
+                self.assertEqual(erreurs, [(2, "image illisible : 'garba.png'")])
+
+    @override_settings(IMPORT_MAX_IMAGE_SIZE=1024 * 1024)
+    def test_images_over_size_limit_are_reported(self):
+        fichier = io.BytesIO(b"nom,description,prix,categorie,image\nGarba,Poisson,2500,Plats,garba.png\n")
+        archive = self._zip(**{'garba.png': b"\0" * (1024 * 1024 + 1)})
+        produits, erreurs = import_produits.importer(self.etablissement, fichier, archive)
+        self.assertEqual(produits, [])
+        self.assertEqual(erreurs, [(2, "image trop volumineuse (> 1 Mo) : 'garba.png'")])
+
@@ -1,46 +1,112 @@
 from django.shortcuts import redirect, render,  get_object_or_404
 from . import models
 from customer import models as customer_models
+from customer import cart as customer_cart
 from django.contrib.auth.decorators import login_required
 import json
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
 try:
     from cities_light.models import City
 except (ImportError, RuntimeError):
-    City = None
+    from .models import City
 
 from django.contrib import messages
 from .models import Produit, Favorite, Etablissement, CategorieProduit
-from customer.models import Commande
+from client import receipt_queue
+from . import commandes_recues, exports, facets, fiches, import_produits, search, slugs, statistiques
+from .pagination import InvalidCursor, KeysetPage
 
-from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+
+# Tri de la boutique : ordre de pagination par curseur, la dernière colonne est unique
+TRIS = (
+    ('', "Plus récents", ('-date_add', '-id')),
+    ('prix', "Prix croissant", ('effective_price', 'id')),
+    ('prix-desc', "Prix décroissant", ('-effective_price', '-id')),
+)
 
 
 # Create your views here.
-def shop(request):
-    produits = models.Produit.objects.filter(status=True)
-    datas = {
-        'produits' : produits
-    }
+def _liste_produits(request, produits, datas, ordering=('-date_add', '-id')):
+    # Page par curseur sur ``ordering`` ; ?fragment=1 renvoie les produits suivants pour « Voir plus »
+    try:
+        page = KeysetPage(produits, request.GET.get('apres'), ordering=ordering)
+    except InvalidCursor:
+        if request.GET.get('fragment'):
+            return JsonResponse({'error': "Curseur invalide"}, status=400)
+        page = KeysetPage(produits, ordering=ordering)
+
+    if request.GET.get('fragment'):
+        context = {'produits': page}
+        return JsonResponse({
+            'grid': render_to_string('shop-produits-grid.html', context, request),
+            'list': render_to_string('shop-produits-list.html', context, request),
+            'next': page.next_cursor,
+        })
+
+    datas['produits'] = page
     return render(request, 'shop.html', datas)
 
 
+def shop(request):
+    # Filtres à facettes : résultats en SQL, compteurs depuis l'index bitmap (shop/facets.py)
+    selection = facets.parse(request.GET)
+    produits = facets.filter_queryset(models.Produit.objects.filter(status=True).avec_prix(), selection)
+    tri = request.GET.get('tri', '')
+    ordering = dict((value, order) for value, _, order in TRIS).get(tri, TRIS[0][2])
+    datas = {}
+    if not request.GET.get('fragment'):
+        datas['nb_resultats'], datas['facettes'] = facets.facettes(selection, request.GET)
+        datas['tris'] = []
+        for value, label, _ in TRIS:
+            query = request.GET.copy()
+            for key in ('apres', 'fragment', 'tri'):
+                query.pop(key, None)
+            if value:
+                query['tri'] = value
+            datas['tris'].append({'label': label, 'query': query.urlencode(), 'selected': value == tri})
+    return _liste_produits(request, produits, datas, ordering)
+
+
+def recherche(request):
+    query = request.GET.get('q', '').strip()
+    produits = search.search(query)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'results': [
+            {
+                'id': produit.id,
+                'nom': produit.nom,
+                'prix': produit.prix,
+                'prix_promotionnel': produit.prix_promotionnel if produit.check_promotion else None,
+                'url': reverse('product_detail', args=[produit.slug]),
+            }
+            for produit in produits
+        ]})
+    return render(request, 'shop.html', {'produits': produits, 'recherche': query})
+
+
 def product_detail(request, slug):
-    produit = get_object_or_404(Produit, slug=slug)
-    produits = Produit.objects.filter(categorie=produit.categorie).exclude(id=produit.id)[:3]
+    # Fiche commune en cache (shop/fiches.py) ; seul l'état du favori est calculé par visiteur
+    fiche = fiches.get(slug)
+    if fiche is None:
+        raise Http404("Produit introuvable")
 
-    
     is_favorited = False
     if request.user.is_authenticated:
-        is_favorited = Favorite.objects.filter(user=request.user, produit=produit).exists()
+        is_favorited = Favorite.objects.filter(user=request.user, produit_id=fiche['id']).exists()
 
     datas = {
-        'produit': produit,
-        'produits': produits,
-        'is_favorited': is_favorited, 
+        'fiche': fiche,
+        # Paresseux : aucune requête tant que rien ne les lit (la fiche en cache n'en a pas besoin)
+        'produit': SimpleLazyObject(lambda: Produit.objects.get(pk=fiche['id'])),
+        'produits': Produit.objects.filter(categorie_id=fiche['categorie_id']).exclude(id=fiche['id'])[:3],
+        'is_favorited': is_favorited,
     }
     return render(request, 'product-details.html', datas)
 
@@ -87,21 +153,27 @@ def paiement_success(request):
 
 
 def single(request, slug):
-    try:
-        try:
-            categorie = models.CategorieProduit.objects.get(slug=slug)
-            produits = categorie.produit.all()
-        except:
-            categorie = models.CategorieEtablissement.objects.get(slug=slug)
-            produits = categorie.produit_etab.all()
-    except:
+    # Type et id lus dans l'index des slugs (shop/slugs.py) : une seule requête, par clé primaire
+    kind, pk = slugs.resolve(slug) or (None, None)
+    if kind == 'produit':
+        return redirect('product_detail', slug=slug)
+    if kind == 'etablissement':
+        return redirect('%s?etablissement=%s' % (reverse('shop'), pk))
+    if kind == 'categorie_produit':
+        categorie = models.CategorieProduit.objects.filter(pk=pk).first()
+        produits = categorie.produit.all() if categorie else None
+    elif kind == 'categorie_etablissement':
+        categorie = models.CategorieEtablissement.objects.filter(pk=pk).first()
+        produits = categorie.produit_etab.all() if categorie else None
+    else:
+        categorie = None
+    if categorie is None:
         return redirect('shop')
 
     datas = {
-        'produits' : produits,
         'categorie' : categorie
     }
-    return render(request, 'shop.html', datas)
+    return _liste_produits(request, produits, datas)
 
 
 def post_paiement_details(request):
@@ -119,11 +191,11 @@ def post_paiement_details(request):
     _ = isSuccess
     if user and panier is not None and transaction_id is not None and notify_url is not None and return_url is not None :
         try:
-            panier = customer_models.Panier.objects.get(id=panier, customer=user.customer)
+            customer = user.customer
         except:
-            panier = None
+            customer = None
 
-        if panier:
+        if customer:
             data = {
                 'amount': 100,
                 'currency': "XOF",
@@ -136,24 +208,23 @@ def post_paiement_details(request):
             }
 
             try:
-
-                commande = customer_models.Commande()
-                commande.customer = request.user.customer
-                commande.payment_url = 'payment_url'
-                commande.id_paiment = transaction_id
-                commande.transaction_id = transaction_id
-                commande.api_response_id = 'api_response_id'
-                commande.payment_token = 'payment_token'
-                commande.prix_total = panier.total_with_coupon
-                commande.save()
-
-                for i in customer_models.ProduitPanier.objects.filter(panier=panier):
-                    i.panier = None
-                    i.commande = commande
-                    i.save()
-                isSuccess = True
-                message = "Commande validée"
-                panier.delete()
+                # Transaction unique et idempotente : un callback rejoué renvoie la commande existante
+                commande, created = customer_cart.checkout(
+                    customer, panier, transaction_id,
+                    payment_url='payment_url',
+                    id_paiment=transaction_id,
+                    api_response_id='api_response_id',
+                    payment_token='payment_token',
+                )
+                if commande is None:
+                    isSuccess = False
+                    message = "Une erreur s'est produite"
+                else:
+                    isSuccess = True
+                    message = "Commande validée"
+                    if created:
+                        # Le reçu est pré-généré par `manage.py receipt_worker`, pas pendant la requête
+                        receipt_queue.enqueue(commande, request.build_absolute_uri('/'))
 
             except Exception as _:
                 isSuccess = False
@@ -180,30 +251,19 @@ def dashboard(request):
     
     total_articles = Produit.objects.filter(etablissement=etablissement).count()
 
-    
-    today = timezone.now().date()
-    commandes_aujourdhui = Commande.objects.filter(
-        produit_commande__produit__etablissement=etablissement,
-        date_add__date=today
-    ).distinct().count()
-
-    
-    total_commandes = Commande.objects.filter(produit_commande__produit__etablissement=etablissement).distinct().count()
-
-    
     derniers_articles = Produit.objects.filter(etablissement=etablissement).order_by("-date_add")[:5]
 
-    
-    dernieres_commandes = Commande.objects.filter(produit_commande__produit__etablissement=etablissement).distinct().order_by("-date_add")[:5]
+    # Sous-commandes de l'établissement, lues dans l'ordre de l'index (etablissement, date_add, id)
+    dernieres_commandes = etablissement.sous_commandes.order_by("-date_add", "-id")[:5]
 
     context = {
         "etablissement": etablissement,
         "total_articles": total_articles,
-        "commandes_aujourdhui": commandes_aujourdhui,
-        "total_commandes": total_commandes,
         "derniers_articles": derniers_articles,
         "dernieres_commandes": dernieres_commandes,
     }
+    # Compteurs lus dans les lignes agrégées par jour (shop/statistiques.py)
+    context.update(statistiques.resume(etablissement))
 
     return render(request, "dashboard.html", context)
 
@@ -247,6 +307,35 @@ def ajout_article(request):
         "etablissement": etablissement,  
     })
 
+@login_required
+def import_articles(request):
+    # Import en masse (CSV + ZIP d'images) : lignes invalides signalées, les autres créées (shop/import_produits.py)
+    etablissement = get_object_or_404(Etablissement, user=request.user)
+    erreurs = []
+
+    if request.method == "POST":
+        fichier = request.FILES.get("fichier")
+        if not fichier:
+            messages.error(request, "Veuillez choisir un fichier CSV.")
+        else:
+            try:
+                produits, erreurs = import_produits.importer(etablissement, fichier, request.FILES.get("images"))
+            except import_produits.ImportInvalide as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(request, "%d article(s) importé(s)." % len(produits))
+                if not erreurs:
+                    return redirect("article-detail")
+
+    return render(request, "import-articles.html", {
+        "etablissement": etablissement,
+        "categories": CategorieProduit.objects.all(),
+        "colonnes": import_produits.COLONNES,
+        "obligatoires": import_produits.OBLIGATOIRES,
+        "erreurs": erreurs,
+    })
+
+
 @login_required
 def article_detail(request):
     etablissement = get_object_or_404(Etablissement, user=request.user)
@@ -257,7 +346,9 @@ def article_detail(request):
     category_filter = request.GET.get("category", "")
 
     if search_query:
-        articles = articles.filter(nom__icontains=search_query)
+        articles = articles.filter(id__in=search.search_ids(
+            search_query, limit=None, etablissement_id=etablissement.id, actifs=False,
+        ))
 
     if category_filter:
         articles = articles.filter(categorie__nom=category_filter)
@@ -323,47 +414,70 @@ def supprimer_article(request, article_id):
 
 @login_required
 def commande_reçu(request):
+    # Boîte de réception : sous-commandes de l'établissement, page par curseur (shop/commandes_recues.py)
     etablissement = get_object_or_404(Etablissement, user=request.user)
-    commandes_list = Commande.objects.filter(produit_commande__produit__etablissement=etablissement).distinct().order_by('-date_add')
-
-    # 📌 Filtrage par client
-    client = request.GET.get("client")
-    if client:
-        commandes_list = commandes_list.filter(customer__user__first_name__icontains=client).order_by('-date_add')
+    selection = commandes_recues.filtres(request.GET)
+    commandes_list = commandes_recues.commandes(etablissement, selection)
 
-    # 📌 Filtrage par produit
-    produit = request.GET.get("produit")
-    if produit:
-        commandes_list = commandes_list.filter(produit_commande__produit__nom__icontains=produit).order_by('-date_add')
+    try:
+        commandes = KeysetPage(commandes_list, request.GET.get('apres'), per_page=25,
+                               ordering=commandes_recues.ORDERING)
+    except InvalidCursor:
+        commandes = KeysetPage(commandes_list, per_page=25, ordering=commandes_recues.ORDERING)
+    commandes_recues.premiers_produits(etablissement, commandes)
+    total, approximatif = commandes_recues.total(etablissement, selection, commandes_list)
+
+    query = request.GET.copy()
+    query.pop('apres', None)
+    premier = query.urlencode()
+    if commandes.has_next:
+        query['apres'] = commandes.next_cursor
+
+    return render(request, "commande-reçu.html", {
+        "commandes": commandes,
+        "etablissement": etablissement,
+        "total": total,
+        "total_approximatif": approximatif,
+        "premiere_page": premier if request.GET.get('apres') else None,
+        "filtres_query": premier,
+        "page_suivante": query.urlencode() if commandes.has_next else None,
+    })
 
-    # 📌 Filtrage par statut
-    status = request.GET.get("status")
-    if status == "payée":
-        commandes_list = commandes_list.filter(status=True).order_by('-date_add')
-    elif status == "attente":
-        commandes_list = commandes_list.filter(status=False).order_by('-date_add')
 
-    # 📌 Filtrage par date
-    date_min = request.GET.get("date_min")
-    date_max = request.GET.get("date_max")
-    if date_min:
-        commandes_list = commandes_list.filter(date_add__gte=date_min).order_by('-date_add')
-    if date_max:
-        commandes_list = commandes_list.filter(date_add__lte=date_max).order_by('-date_add')
+EXPORTS = {
+    'csv': (exports.csv_stream, 'text/csv; charset=utf-8'),
+    'xlsx': (exports.xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
 
-    paginator = Paginator(commandes_list, 25)
-    page_number = request.GET.get("page")
-    commandes = paginator.get_page(page_number)
 
-    return render(request, "commande-reçu.html", {"commandes": commandes, "etablissement": etablissement})
+@login_required
+def commande_reçu_export(request):
+    # Mêmes filtres que la boîte de réception ; lignes envoyées au fil de la lecture (shop/exports.py)
+    etablissement = get_object_or_404(Etablissement, user=request.user)
+    format_ = request.GET.get('format') if request.GET.get('format') in EXPORTS else 'csv'
+    writer, content_type = EXPORTS[format_]
+    rows = exports.lignes(etablissement, commandes_recues.filtres(request.GET))
+    response = StreamingHttpResponse(writer(rows), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="commandes-%s.%s"' % (timezone.localdate().isoformat(), format_)
+    return response
 
 
 @login_required
 def commande_reçu_detail(request, commande_id):
     etablissement = get_object_or_404(Etablissement, user=request.user)
-    commande = get_object_or_404(Commande, id=commande_id, produit_commande__produit__etablissement=etablissement)
-
-    return render(request, "commande-reçu-detail.html", {"commande": commande,"etablissement": etablissement,})
+    sous_commande = get_object_or_404(
+        models.SousCommande.objects.select_related('commande__customer__user'),
+        commande_id=commande_id, etablissement=etablissement,
+    )
+    # Seules les lignes de cet établissement : les autres marchands de la commande ne sont pas affichés
+    lignes = sous_commande.commande.produit_commande.filter(produit__etablissement=etablissement).select_related('produit')
+
+    return render(request, "commande-reçu-detail.html", {
+        "commande": sous_commande.commande,
+        "sous_commande": sous_commande,
+        "lignes": lignes,
+        "etablissement": etablissement,
+    })
 
 
 @login_required(login_url='login')
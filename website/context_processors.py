@@ -1,84 +1,31 @@
-from shop import models
-from . import models as config_models
-from customer import models as customer_models
-from django.contrib.sessions.models import Session
-
-try:
-    from cities_light.models import City
-except (ImportError, RuntimeError):
-    from django.db import models as django_models
-    # Modèle City simple pour les tests quand cities_light n'est pas disponible
-    # Utilise la même structure de table que cities_light pour compatibilité
-    class City(django_models.Model):
-        """Fallback City model used only when django-cities-light is unavailable."""
-        name = django_models.CharField(max_length=200, db_index=True)
-
-        class Meta:
-            db_table = 'cities_light_city'
-            managed = True  # Changé à True pour permettre les migrations et tests
-
-        def __str__(self):
-            return self.name
+from . import nav_cache
+from customer import cart as customer_cart
+from django.utils.functional import SimpleLazyObject
 
 
 def categories(request):
-    cat = models.CategorieEtablissement.objects.filter(status=True)
+    cat = nav_cache.get('categories')
 
     return {'cat':cat}
 
 
 def site_infos(request):
-    try:
-        infos = config_models.SiteInfo.objects.latest('date_add')
-    except:
-        infos = None
+    infos = nav_cache.get('site_infos')
     return {'infos':infos}
 
 
-def cities(request):
-
-    cities = City.objects.all()
-
-    return {'cities': cities}
-
-
 def galeries(request):
-    galerie = config_models.Galerie.objects.filter(status=True)[:6]
+    galerie = nav_cache.get('galeries')
 
     return {'galeries':galerie}
 
 
 def horaires(request):
-    horaire = config_models.Horaire.objects.filter(status=True)
+    horaire = nav_cache.get('horaires')
 
     return {'horaires':horaire}
 
 
 def cart(request):
-    carts = ""
-    try:
-        if not request.session.exists(request.session.session_key):
-            request.session.create()
-        session_id = Session.objects.get(session_key=request.session.session_key)
-        if request.user.is_authenticated:
-            try:
-                customer = customer_models.Customer.objects.get(user=request.user)
-                carts = customer_models.Panier.objects.get(customer=customer, session_id=session_id)
-            except Exception as e:
-
-                customer = customer_models.Customer.objects.get(user=request.user)
-                carts = customer_models.Panier()
-                carts.session_id = session_id
-                carts.customer = customer
-                carts.save()
-        else:
-            try:
-                carts = customer_models.Panier.objects.get(session_id=session_id)
-            except Exception as e:
-
-                carts = customer_models.Panier()
-                carts.session_id = session_id
-                carts.save()
-    except:
-        pass
-    return {'cart':carts}
\ No newline at end of file
+    # Évalué seulement si le template lit `cart` ; aucune écriture en base ici.
+    return {'cart': SimpleLazyObject(lambda: customer_cart.get_cart(request) or customer_cart.EmptyCart())}
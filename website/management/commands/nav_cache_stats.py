@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from website import nav_cache
+
+
+class Command(BaseCommand):
+    help = "Affiche les hits/misses du cache de navigation (catégories, infos, galeries, horaires)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Remet les compteurs à zéro après affichage.")
+
+    def handle(self, *args, **options):
+        for name, counters in nav_cache.stats().items():
+            self.stdout.write(f"{name}: {counters['hits']} hits, {counters['misses']} misses")
+        if options['reset']:
+            nav_cache.reset_stats()
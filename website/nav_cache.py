@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from shop import categories as shop_categories
+from . import models
+
+
+# Incrémenter quand la forme des snapshots change pour ignorer les anciennes entrées.
+SNAPSHOT_VERSION = 2
+KEY_PREFIX = 'website:nav:v%s' % SNAPSHOT_VERSION
+BLOCKS = ('categories', 'site_infos', 'galeries', 'horaires')
+
+_MISSING = object()
+
+
+def _cache():
+    return caches[getattr(settings, 'NAVIGATION_CACHE_ALIAS', 'default')]
+
+
+def _key(name):
+    return '%s:%s' % (KEY_PREFIX, name)
+
+
+def _counter_key(name, kind):
+    return '%s:stats:%s:%s' % (KEY_PREFIX, name, kind)
+
+
+def _count(cache, name, kind):
+    key = _counter_key(name, kind)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _build_categories():
+    # Arbre complet avec sous-catégories et compteurs : plus aucune requête dans les menus
+    return shop_categories.arbre()
+
+
+def _build_site_infos():
+    try:
+        return models.SiteInfo.objects.latest('date_add')
+    except models.SiteInfo.DoesNotExist:
+        return None
+
+
+def _build_galeries():
+    return list(models.Galerie.objects.filter(status=True)[:6])
+
+
+def _build_horaires():
+    return list(models.Horaire.objects.filter(status=True))
+
+
+_BUILDERS = {
+    'categories': _build_categories,
+    'site_infos': _build_site_infos,
+    'galeries': _build_galeries,
+    'horaires': _build_horaires,
+}
+
+
+def get(name):
+    """Return the snapshot of a navigation block, building it on a miss."""
+    cache = _cache()
+    value = cache.get(_key(name), _MISSING)
+    if value is _MISSING:
+        _count(cache, name, 'misses')
+        value = _BUILDERS[name]()
+        cache.set(_key(name), value, getattr(settings, 'NAVIGATION_CACHE_TIMEOUT', None))
+    else:
+        _count(cache, name, 'hits')
+    return value
+
+
+def invalidate(*names):
+    _cache().delete_many([_key(name) for name in names or BLOCKS])
+
+
+def stats():
+    """Hit/miss counters per block, shared by every process using the cache."""
+    cache = _cache()
+    return {
+        name: {
+            'hits': cache.get(_counter_key(name, 'hits'), 0),
+            'misses': cache.get(_counter_key(name, 'misses'), 0),
+        }
+        for name in BLOCKS
+    }
+
+
+def reset_stats():
+    _cache().delete_many([_counter_key(name, kind) for name in BLOCKS for kind in ('hits', 'misses')])
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shop import models as shop_models
+from . import models, nav_cache
+
+
+@receiver([post_save, post_delete], sender=shop_models.CategorieEtablissement)
+@receiver([post_save, post_delete], sender=shop_models.CategorieProduit)
+@receiver([post_save, post_delete], sender=shop_models.Produit)
+def invalidate_categories(sender, **kwargs):
+    nav_cache.invalidate('categories')
+
+
+@receiver([post_save, post_delete], sender=models.SiteInfo)
+def invalidate_site_infos(sender, **kwargs):
+    nav_cache.invalidate('site_infos')
+
+
+@receiver([post_save, post_delete], sender=models.Galerie)
+def invalidate_galeries(sender, **kwargs):
+    nav_cache.invalidate('galeries')
+
+
+@receiver([post_save, post_delete], sender=models.Horaire)
+def invalidate_horaires(sender, **kwargs):
+    nav_cache.invalidate('horaires')
@@ -1,5 +1,11 @@
 from django.test import TestCase
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from . import nav_cache
+from .models import Horaire
+from shop.models import CategorieEtablissement, CategorieProduit
 
 # Create your tests here.
 
@@ -24,3 +30,43 @@ class AboutViewTests(TestCase):
    def test_about_uses_correct_template(self):
        response = self.client.get(reverse('about'))
        self.assertTemplateUsed(response, 'about-us.html')
+
+
+class NavigationCacheTests(TestCase):
+
+   def setUp(self):
+       nav_cache.invalidate()
+       nav_cache.reset_stats()
+
+   def test_second_render_hits_cache_without_queries(self):
+       self.client.get(reverse('about'))
+       with CaptureQueriesContext(connection) as queries:
+           for name in nav_cache.BLOCKS:
+               nav_cache.get(name)
+       self.assertEqual(len(queries), 0)
+       self.assertEqual(nav_cache.stats()['categories'], {'hits': 1, 'misses': 1})
+
+   def test_save_invalidates_snapshot(self):
+       self.assertEqual(nav_cache.get('horaires'), [])
+       horaire = Horaire.objects.create(titre="Lundi", description="8h - 18h", status=True)
+       self.assertEqual(nav_cache.get('horaires'), [horaire])
+       horaire.delete()
+       self.assertEqual(nav_cache.get('horaires'), [])
+
+   def test_category_tree_is_built_in_two_queries(self):
+       restaurant = CategorieEtablissement.objects.create(nom="Restaurant", description="Test")
+       for nom in ("Plats", "Desserts", "Boissons"):
+           CategorieProduit.objects.create(nom=nom, description=nom, categorie=restaurant)
+       CategorieEtablissement.objects.create(nom="Hôtel", description="Test")
+       with CaptureQueriesContext(connection) as queries:
+           arbre = nav_cache.get('categories')
+       self.assertEqual(len(queries), 2)
+       self.assertEqual([c.nom for c in arbre[0].sous_categories], ["Plats", "Desserts", "Boissons"])
+       self.assertEqual([c.nb_produits for c in arbre[0].sous_categories], [0, 0, 0])
+       self.assertEqual(arbre[1].sous_categories, [])
+
+   def test_category_change_invalidates_tree(self):
+       restaurant = CategorieEtablissement.objects.create(nom="Restaurant", description="Test")
+       self.assertEqual(nav_cache.get('categories')[0].sous_categories, [])
+       CategorieProduit.objects.create(nom="Plats", description="Plats", categorie=restaurant)
+       self.assertEqual([c.nom for c in nav_cache.get('categories')[0].sous_categories], ["Plats"])